@@ -0,0 +1,313 @@
+import argparse
+import copy
+import glob
+import json
+import os
+import pickle
+import platform
+import tempfile
+import cv2
+import numpy as np
+import sys
+# Repo root from this file, so the script runs from any directory and with or without -m
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+from utils import VideoSink
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from is_ball import IsBall
+from pass_stats_tracker import MatchStats
+from player_heatmap import HeatmapAccumulator
+from tactical_analysis.pass_network import PassNetwork
+from tactical_analysis.space_occupancy_analyzer import SpaceOccupancyAnalyzer
+from pipeline import StageProfiler
+from pipeline.stages import assign_player_teams, assign_ball_possession, build_frame_renderer
+
+FULL_MATCH_MINUTES = 90
+FRAME_SIZES = ((1280, 720), (1920, 1080), (3840, 2160))
+TEAM_SHIRT_COLORS = ((40, 40, 200), (230, 230, 230))  # BGR
+REFEREE_SHIRT_COLOR = (0, 220, 230)
+
+
+def find_stubs(stub_dir=os.path.join(REPO_ROOT, 'stubs')):
+    # name -> (track stub, camera movement stub) for every pair in stub_dir
+    stubs = {}
+    for track_path in sorted(glob.glob(os.path.join(stub_dir, 'track_stubs*.pkl'))):
+        name = os.path.basename(track_path)[len('track_stubs'):-len('.pkl')].lstrip('_') or 'default'
+        suffix = '' if name == 'default' else f'_{name}'
+        camera_path = os.path.join(stub_dir, f'camera_movement_stub{suffix}.pkl')
+        if os.path.exists(camera_path):
+            stubs[name] = (track_path, camera_path)
+    return stubs
+
+
+def load_stub(track_path, camera_path):
+    with open(track_path, 'rb') as f:
+        tracks = pickle.load(f)
+    with open(camera_path, 'rb') as f:
+        camera_movement_per_frame = pickle.load(f)
+    num_frames = min(len(camera_movement_per_frame), *(len(object_tracks) for object_tracks in tracks.values()))
+    tracks = {object: object_tracks[:num_frames] for object, object_tracks in tracks.items()}
+    return tracks, camera_movement_per_frame[:num_frames]
+
+
+def scale_tracks(tracks, camera_movement_per_frame, num_frames):
+    # Repeat the stub until it is num_frames long; every frame is a copy, since the stages write into the tracks
+    stub_frames = len(camera_movement_per_frame)
+    scaled = {object: [copy.deepcopy(object_tracks[frame_num % stub_frames]) for frame_num in range(num_frames)]
+              for object, object_tracks in tracks.items()}
+    return scaled, [list(camera_movement_per_frame[frame_num % stub_frames]) for frame_num in range(num_frames)]
+
+
+def infer_frame_size(tracks):
+    # Smallest broadcast resolution that contains every box of the stub
+    max_x = max_y = 0
+    for object_tracks in tracks.values():
+        for frame in object_tracks:
+            for track_info in frame.values():
+                max_x, max_y = max(max_x, track_info['bbox'][2]), max(max_y, track_info['bbox'][3])
+    for width, height in FRAME_SIZES:
+        if max_x <= width and max_y <= height:
+            return width, height
+    return FRAME_SIZES[-1]
+
+
+class SyntheticVideo:
+    """
+    Broadcast-sized frames drawn from the stub tracks: a noisy pitch with line
+    texture, players in two shirt colours, referees and the ball, so that the
+    colour-based stages (team assignment, ball validation) and the renderer see
+    realistic crops and frame sizes. Seeded, so every run sees the same pixels.
+    """
+    def __init__(self, frame_size=(1920, 1080), seed=0):
+        width, height = frame_size
+        rng = np.random.default_rng(seed)
+        background = np.empty((height, width, 3), dtype=np.uint8)
+        background[:] = (60, 140, 60)
+        background = cv2.add(background, rng.integers(0, 25, (height, width, 3), dtype=np.uint8))
+        for x in range(0, width, width // 8):
+            cv2.line(background, (x, 0), (x + width // 10, height), (235, 235, 235), 3)
+        self.background = background
+
+    def draw_person(self, frame, bbox, shirt_color):
+        x1, y1, x2, y2 = map(int, bbox)
+        middle = (y1 + y2) // 2
+        cv2.rectangle(frame, (x1, y1), (x2, middle), shirt_color, cv2.FILLED)
+        cv2.rectangle(frame, (x1, middle), (x2, y2), (30, 30, 30), cv2.FILLED)
+
+    def frames(self, tracks, start_frame, end_frame):
+        frames = []
+        for frame_num in range(start_frame, end_frame):
+            frame = self.background.copy()
+            for track_id, player in tracks['players'][frame_num].items():
+                self.draw_person(frame, player['bbox'], TEAM_SHIRT_COLORS[track_id % 2])
+            for referee in tracks['referees'][frame_num].values():
+                self.draw_person(frame, referee['bbox'], REFEREE_SHIRT_COLOR)
+            for ball in tracks['ball'][frame_num].values():
+                x1, y1, x2, y2 = map(int, ball['bbox'])
+                cv2.circle(frame, ((x1 + x2) // 2, (y1 + y2) // 2), max((x2 - x1) // 2, 2), (255, 255, 255), cv2.FILLED)
+            frames.append(frame)
+        return frames
+
+
+def benchmark_stub(tracks, camera_movement_per_frame, video, fps=24, chunk_size=100, encode_dir=None):
+    """
+    Runs every post-detection stage of main.py on the tracks, in the same order,
+    and returns the StageProfiler. Stages that need pixels see synthetic frames
+    in chunks of chunk_size; drawing them is timed as its own stage.
+    """
+    profiler = StageProfiler()
+    num_frames = len(camera_movement_per_frame)
+    chunks = [(start, min(start + chunk_size, num_frames)) for start in range(0, num_frames, chunk_size)]
+
+    def synthetic_chunks():
+        for start, end in chunks:
+            with profiler.stage('synthetic_frames', frames=end - start):
+                frames = video.frames(tracks, start, end)
+            yield start, frames
+
+    tracker = Tracker(None)
+    with profiler.stage('kalman_positions', frames=num_frames):
+        tracker.add_position_to_tracks(tracks)
+
+    camera_movement_estimator = CameraMovementEstimator(video.background)
+    with profiler.stage('camera_adjustment', frames=num_frames):
+        camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+
+    with profiler.stage('view_transform', frames=num_frames):
+        ViewTransformer().add_transformed_position_to_tracks(tracks)
+
+    is_ball = IsBall(frame_rate=fps)
+    ball_candidates = []
+    for start, frames in synthetic_chunks():
+        with profiler.stage('ball_validation', frames=len(frames)):
+            ball_candidates.append(is_ball.get_candidate_stats(frames, tracks['ball'], start))
+    with profiler.stage('ball_validation', frames=0):
+        is_ball.filter_ball_tracks(tracks['ball'],
+                                   np.concatenate([frame_nums for frame_nums, _ in ball_candidates]),
+                                   np.concatenate([color_stats for _, color_stats in ball_candidates]))
+
+    with profiler.stage('ball_interpolation', frames=num_frames):
+        tracks['ball'] = tracker.interpolate_ball_positions(tracks['ball'])
+
+    speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+    with profiler.stage('speed_and_distance', frames=num_frames):
+        speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+
+    team_assigner = TeamAssigner()
+    for start, frames in synthetic_chunks():
+        with profiler.stage('team_assignment', frames=len(frames)):
+            assign_player_teams(team_assigner, frames, tracks['players'], start)
+
+    with profiler.stage('ball_possession', frames=num_frames):
+        team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner())
+
+    with profiler.stage('pass_stats', frames=num_frames):
+        match_stats = MatchStats.from_tracks(tracks, team_ball_control)
+
+    with profiler.stage('pass_network', frames=num_frames):
+        PassNetwork().construct_pass_network(tracks['players'], tracks['ball'])
+
+    with profiler.stage('pitch_control', frames=num_frames):
+        SpaceOccupancyAnalyzer(frame_rate=fps).analyze_pitch_control(tracks['players'])
+
+    with profiler.stage('heatmaps', frames=num_frames):
+        heatmap = HeatmapAccumulator().add_tracks(tracks['players'])
+        for team in sorted(heatmap.teams):
+            heatmap.get_layer(team=team)
+        heatmap.get_layer()
+
+    renderer = build_frame_renderer(tracks, camera_movement_per_frame, tracker,
+                                    camera_movement_estimator, speed_and_distance_estimator, match_stats)
+    sink = VideoSink(os.path.join(encode_dir, 'benchmark.avi'), fps) if encode_dir else None
+    for start, frames in synthetic_chunks():
+        with profiler.stage('render', frames=len(frames)):
+            for frame_num, frame in enumerate(frames, start=start):
+                renderer.render_frame(frame, frame_num)
+        if sink is not None:
+            with profiler.stage('encode', frames=len(frames)):
+                for frame in frames:
+                    sink.write(frame)
+    if sink is not None:
+        sink.release()
+    return profiler
+
+
+def summarize(profiler, num_frames, fps=24):
+    # Per-stage totals over all chunks, with throughput and the time a full match would take
+    full_match_frames = FULL_MATCH_MINUTES * 60 * fps
+    stages = {}
+    for record in profiler.stages:
+        stage = stages.setdefault(record['name'], {'frames': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+        stage['frames'] += record['frames'] or 0
+        stage['wall_seconds'] += record['wall_seconds']
+        stage['cpu_seconds'] += record['cpu_seconds']
+    for stage in stages.values():
+        stage['fps'] = stage['frames'] / stage['wall_seconds'] if stage['wall_seconds'] > 0 else None
+        stage['full_match_seconds'] = full_match_frames / stage['fps'] if stage['fps'] else 0.0
+    total_seconds = sum(stage['wall_seconds'] for name, stage in stages.items() if name != 'synthetic_frames')
+    return {
+        'frames': num_frames,
+        'wall_seconds': total_seconds,
+        'fps': num_frames / total_seconds if total_seconds > 0 else None,
+        'full_match_seconds': full_match_frames * total_seconds / num_frames,
+        'peak_rss_mb': max((record['peak_rss_mb'] or 0) for record in profiler.stages),
+        'stages': stages,
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance=0.1, min_seconds=0.05):
+    # (stub, stage, baseline fps, fps) for every stage more than tolerance slower than the baseline;
+    # stages shorter than min_seconds are compared but too noisy to be reported
+    regressions = []
+    for name, result in results['stubs'].items():
+        baseline_stages = baseline.get('stubs', {}).get(name, {}).get('stages', {})
+        for stage, summary in result['stages'].items():
+            baseline_fps = baseline_stages.get(stage, {}).get('fps')
+            if stage == 'synthetic_frames' or not baseline_fps or not summary['fps']:
+                continue
+            summary['baseline_fps'] = baseline_fps
+            summary['speedup'] = summary['fps'] / baseline_fps
+            if summary['fps'] < baseline_fps * (1 - tolerance) and summary['wall_seconds'] >= min_seconds:
+                regressions.append((name, stage, baseline_fps, summary['fps']))
+    return regressions
+
+
+def print_results(results):
+    for name, result in results['stubs'].items():
+        print(f"\n{name}: {result['frames']} frames at {result['frame_size'][0]}x{result['frame_size'][1]}")
+        print(f"{'stage':<22}{'wall s':>9}{'cpu s':>9}{'fps':>10}{'90 min s':>10}{'vs base':>9}")
+        for stage, summary in result['stages'].items():
+            fps = f"{summary['fps']:.1f}" if summary['fps'] else '-'
+            speedup = f"{summary['speedup']:.2f}x" if 'speedup' in summary else '-'
+            print(f"{stage:<22}{summary['wall_seconds']:>9.2f}{summary['cpu_seconds']:>9.2f}{fps:>10}{summary['full_match_seconds']:>10.1f}{speedup:>9}")
+        print(f"{'total':<22}{result['wall_seconds']:>9.2f}{'':>9}{result['fps']:>10.1f}{result['full_match_seconds']:>10.1f}")
+
+
+def run_benchmarks(stub_names=None, stub_dir=os.path.join(REPO_ROOT, 'stubs'), minutes=None, fps=24, frame_size=None, chunk_size=100, encode=True, seed=0):
+    """
+    Replays the track and camera movement stubs through the post-detection
+    stages. No model file or input video is needed. With minutes, each stub is
+    repeated to that match length so memory and throughput are measured at scale.
+    """
+    stubs = find_stubs(stub_dir)
+    results = {'config': {'minutes': minutes, 'fps': fps, 'chunk_size': chunk_size, 'encode': encode, 'seed': seed},
+               'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+                           'processor': platform.processor() or platform.machine(), 'cpu_count': os.cpu_count()},
+               'stubs': {}}
+    for name in stub_names or sorted(stubs):
+        if name not in stubs:
+            raise ValueError(f"No track/camera movement stub pair named {name!r} in {stub_dir} (found: {', '.join(stubs)})")
+        tracks, camera_movement_per_frame = load_stub(*stubs[name])
+        size = frame_size or infer_frame_size(tracks)
+        num_frames = int(minutes * 60 * fps) if minutes else len(camera_movement_per_frame)
+        tracks, camera_movement_per_frame = scale_tracks(tracks, camera_movement_per_frame, num_frames)
+
+        print(f"Benchmarking {name}: {num_frames} frames at {size[0]}x{size[1]}")
+        with tempfile.TemporaryDirectory() as encode_dir:
+            profiler = benchmark_stub(tracks, camera_movement_per_frame, SyntheticVideo(size, seed), fps, chunk_size,
+                                      encode_dir if encode else None)
+        results['stubs'][name] = dict(summarize(profiler, num_frames, fps), frame_size=list(size))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the post-detection stages on the track stubs")
+    parser.add_argument('--stubs', nargs='*', default=['08fd33_4_demo'], help="stub names to replay, e.g. 08fd33_4_demo fener (none given: all)")
+    parser.add_argument('--stub-dir', default=os.path.join(REPO_ROOT, 'stubs'), help="directory with track_stubs*.pkl and camera_movement_stub*.pkl")
+    parser.add_argument('--minutes', type=float, default=None, help=f"repeat each stub to this match length ({FULL_MATCH_MINUTES} for a full match)")
+    parser.add_argument('--fps', type=int, default=24, help="frame rate of the replayed video")
+    parser.add_argument('--frame-size', type=int, nargs=2, default=None, metavar=('WIDTH', 'HEIGHT'), help="synthetic frame size (default: inferred from the stub boxes)")
+    parser.add_argument('--chunk-size', type=int, default=100, help="synthetic frames held in memory at once")
+    parser.add_argument('--no-encode', action='store_true', help="skip encoding the rendered frames")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic frames")
+    parser.add_argument('--threads', type=int, default=None, help="OpenCV threads (fix it for comparable runs)")
+    parser.add_argument('--output', default=None, help="write the results as JSON to this path")
+    parser.add_argument('--baseline', default='benchmarks/baseline.json', help="results JSON to compare against, if it exists")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="relative fps drop reported as a regression")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    results = run_benchmarks(args.stubs or None, args.stub_dir, args.minutes, args.fps,
+                             tuple(args.frame_size) if args.frame_size else None, args.chunk_size, not args.no_encode, args.seed)
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+    print_results(results)
+
+    for path in filter(None, (args.output, args.baseline if args.save_baseline else None)):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to {path}")
+
+    for name, stage, baseline_fps, fps in regressions:
+        print(f"Regression: {name} {stage} {fps:.1f} fps (baseline {baseline_fps:.1f} fps)")
+    sys.exit(1 if regressions else 0)
@@ -4,19 +4,27 @@ import numpy as np
 import os
 import sys 
 sys.path.append('../')
-from utils import measure_distance,measure_xy_distance
+from utils import measure_distance,measure_xy_distance, draw_transparent_rect
 
 class CameraMovementEstimator():
-    def __init__(self,frame):
+    def __init__(self,frame, fast=False, pyramid_level=1, robust_method='median', min_tracked_fraction=0.5, min_features=10):
         self.minimum_distance = 5
 
+        # Fast mode: flow on a downscaled pyramid level, robust global motion,
+        # features re-seeded only when tracking quality drops
+        self.fast = fast
+        self.pyramid_level = pyramid_level
+        self.robust_method = robust_method
+        self.min_tracked_fraction = min_tracked_fraction
+        self.min_features = min_features
+
         self.lk_params = dict(
             winSize = (15,15),
             maxLevel = 2,
             criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,10,0.03)
         )
 
-        first_frame_grayscale = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        first_frame_grayscale = frame if frame.ndim == 2 else cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
         mask_features = np.zeros_like(first_frame_grayscale)
         mask_features[:,0:20] = 1
         mask_features[:,900:1050] = 1
@@ -29,9 +37,17 @@ class CameraMovementEstimator():
             mask = mask_features
         )
 
-    def add_adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
+        scale = 2 ** pyramid_level
+        self.fast_features = dict(self.features,
+            minDistance = max(1, self.features['minDistance'] // scale),
+            mask = mask_features[::scale, ::scale].copy()
+        )
+
+        self.reset_camera_movement()
+
+    def add_adjust_positions_to_tracks(self, tracks, camera_movement_per_frame, start_frame=0):
         for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
+            for frame_num, track in enumerate(object_tracks[start_frame:], start=start_frame):
                 for track_id, track_info in track.items():
                     position = track_info['position']
                     camera_movement = camera_movement_per_frame[frame_num]
@@ -51,60 +67,134 @@ class CameraMovementEstimator():
                     
 
 
-    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None):
-        # Read the stub 
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path,'rb') as f:
-                return pickle.load(f)
+    def reset_camera_movement(self):
+        self.old_gray = None
+        self.old_features = None
+
+    def update_camera_movement(self, frame):
+        # Estimate the movement for a single BGR or grayscale frame, keeping the optical flow state between calls
+        if self.fast:
+            return self.update_camera_movement_fast(frame)
+
+        frame_gray = frame if frame.ndim == 2 else cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        if self.old_gray is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+            return [0,0]
+
+        new_features, _,_ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_gray,self.old_features,None,**self.lk_params)
+
+        max_distance = 0
+        camera_movement_x, camera_movement_y = 0,0
 
-        camera_movement = [[0,0]]*len(frames)
+        for i, (new,old) in enumerate(zip(new_features,self.old_features)):
+            new_features_point = new.ravel()
+            old_features_point = old.ravel()
 
-        old_gray = cv2.cvtColor(frames[0],cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray,**self.features)
+            distance = measure_distance(new_features_point,old_features_point)
+            if distance>max_distance:
+                max_distance = distance
+                camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
 
-        for frame_num in range(1,len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num],cv2.COLOR_BGR2GRAY)
-            new_features, _,_ = cv2.calcOpticalFlowPyrLK(old_gray,frame_gray,old_features,None,**self.lk_params)
+        camera_movement = [0,0]
+        if max_distance > self.minimum_distance:
+            camera_movement = [camera_movement_x,camera_movement_y]
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
 
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0,0
+        self.old_gray = frame_gray
+        return camera_movement
+
+    def downscale_gray(self, frame):
+        # A grayscale frame already at the pyramid level's size (e.g. VideoDecoder's small_gray
+        # with scale=0.5 ** pyramid_level) is used as it is
+        frame_gray = frame if frame.ndim == 2 else cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        small_height, small_width = self.fast_features['mask'].shape
+        if frame_gray.shape == (small_height, small_width):
+            return frame_gray
+        return cv2.resize(frame_gray, (small_width, small_height), interpolation=cv2.INTER_AREA)
+
+    def estimate_global_motion(self, old_points, new_points):
+        # Robust camera movement (old - new) from all tracked feature pairs
+        if self.robust_method == 'ransac' and len(old_points) >= 3:
+            transform, _ = cv2.estimateAffinePartial2D(new_points, old_points, method=cv2.RANSAC, ransacReprojThreshold=1.0)
+            if transform is not None:
+                mapped = new_points @ transform[:, :2].T + transform[:, 2]
+                return np.median(mapped - new_points, axis=0)
+        return np.median(old_points - new_points, axis=0)
+
+    def update_camera_movement_fast(self, frame):
+        frame_small = self.downscale_gray(frame)
+        if self.old_gray is None or self.old_features is None or len(self.old_features) == 0:
+            self.old_gray = frame_small
+            self.old_features = cv2.goodFeaturesToTrack(frame_small,**self.fast_features)
+            return [0,0]
+
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(self.old_gray,frame_small,self.old_features,None,**self.lk_params)
+        tracked = status.ravel() == 1
+        old_points = self.old_features.reshape(-1, 2)[tracked]
+        new_points = new_features.reshape(-1, 2)[tracked]
+
+        camera_movement = [0,0]
+        if len(new_points) > 0:
+            movement = self.estimate_global_motion(old_points, new_points) * (2 ** self.pyramid_level)
+            if np.hypot(movement[0], movement[1]) > self.minimum_distance:
+                camera_movement = [float(movement[0]), float(movement[1])]
+
+        # Keep following the tracked features, re-seed only when too many were lost
+        if tracked.mean() < self.min_tracked_fraction or len(new_points) < self.min_features:
+            self.old_features = cv2.goodFeaturesToTrack(frame_small,**self.fast_features)
+        else:
+            self.old_features = new_points.reshape(-1, 1, 2)
+
+        self.old_gray = frame_small
+        return camera_movement
+
+    def get_cache_params(self):
+        # Everything besides the video that changes the camera movement
+        features = {key: value for key, value in self.features.items() if key != 'mask'}
+        params = dict(minimum_distance=self.minimum_distance, lk_params=self.lk_params, features=features, fast=self.fast)
+        if self.fast:
+            params.update(pyramid_level=self.pyramid_level, downscale='area', robust_method=self.robust_method,
+                          min_tracked_fraction=self.min_tracked_fraction, min_features=self.min_features)
+        return params
+
+    def get_camera_movement(self,frames,read_from_stub=False, stub_path=None, cache=None, cache_key=None):
+        if cache is not None and cache_key is not None:
+            camera_movement = cache.load_camera_movement(cache_key)
+            if camera_movement is not None:
+                return camera_movement
+
+        # Read the stub 
+        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+            with open(stub_path,'rb') as f:
+                return pickle.load(f)
 
-            for i, (new,old) in enumerate(zip(new_features,old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+        self.reset_camera_movement()
+        camera_movement = [self.update_camera_movement(frame) for frame in frames]
 
-                distance = measure_distance(new_features_point,old_features_point)
-                if distance>max_distance:
-                    max_distance = distance
-                    camera_movement_x,camera_movement_y = measure_xy_distance(old_features_point, new_features_point ) 
-            
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x,camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray,**self.features)
+        if cache is not None and cache_key is not None:
+            cache.save_camera_movement(cache_key, camera_movement)
 
-            old_gray = frame_gray.copy()
-        
         if stub_path is not None:
             with open(stub_path,'wb') as f:
                 pickle.dump(camera_movement,f)
 
         return camera_movement
     
-    def draw_camera_movement(self,frames, camera_movement_per_frame):
-        output_frames=[]
-
-        for frame_num, frame in enumerate(frames):
-            frame= frame.copy()
+    def draw_frame_camera_movement(self, frame, camera_movement):
+        # Draw the camera movement panel of one frame in place
+        draw_transparent_rect(frame,(0,0),(500,100),(255,255,255),0.6)
 
-            overlay = frame.copy()
-            cv2.rectangle(overlay,(0,0),(500,100),(255,255,255),-1)
-            alpha =0.6
-            cv2.addWeighted(overlay,alpha,frame,1-alpha,0,frame)
+        x_movement, y_movement = camera_movement
+        frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+        frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+        return frame
 
-            x_movement, y_movement = camera_movement_per_frame[frame_num]
-            frame = cv2.putText(frame,f"Camera Movement X: {x_movement:.2f}",(10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
-            frame = cv2.putText(frame,f"Camera Movement Y: {y_movement:.2f}",(10,60), cv2.FONT_HERSHEY_SIMPLEX,1,(0,0,0),3)
+    def draw_camera_movement(self,frames, camera_movement_per_frame, start_frame=0):
+        output_frames=[]
 
+        for frame_num, frame in enumerate(frames, start=start_frame):
+            frame = self.draw_frame_camera_movement(frame.copy(), camera_movement_per_frame[frame_num])
             output_frames.append(frame) 
 
-        return output_frames
\ No newline at end of file
+        return output_frames
@@ -0,0 +1 @@
+from .frame_renderer import FrameRenderer
\ No newline at end of file
@@ -0,0 +1,28 @@
+class FrameRenderer:
+    """
+    Draws every overlay of a frame in a single in-place pass.
+
+    Layers are callables `layer(frame, frame_num)` that draw onto the frame they
+    are given; they run in the order they were added. Rendered frames are written
+    straight to a sink (anything with a `write(frame)` method, e.g. utils.VideoSink),
+    so no output frame list is built.
+    """
+    def __init__(self, layers=None):
+        self.layers = list(layers) if layers is not None else []
+
+    def add_layer(self, layer):
+        self.layers.append(layer)
+        return self
+
+    def render_frame(self, frame, frame_num):
+        for layer in self.layers:
+            layer(frame, frame_num)
+        return frame
+
+    def render_video(self, frames, sink, start_frame=0):
+        # Returns the frame number after the last rendered frame, start_frame for no frames
+        next_frame = start_frame
+        for frame_num, frame in enumerate(frames, start=start_frame):
+            sink.write(self.render_frame(frame, frame_num))
+            next_frame = frame_num + 1
+        return next_frame
@@ -1,58 +1,178 @@
 import cv2
 import numpy as np
-from utils.bbox_utils import measure_distance
-from sklearn.cluster import KMeans
 
 
 class IsBall:
-    def __init__(self, min_ball_size=5, max_ball_size=20, color_threshold=(20, 100, 100, 30, 255, 255), stationary_threshold=5, penalty_threshold=1.5):
+    """
+    Ball detection validator.
+
+    Every candidate gets a size, a colour and a trajectory score in [0, 1]; it is
+    kept when their mean reaches min_score. Colour statistics are computed on the
+    candidate crop only (never the whole frame) and compared with a reference
+    fitted once on all candidates of the video. Scoring runs on all candidates at
+    once, so it only needs the frames while the crop statistics are collected.
+    """
+    def __init__(self, min_ball_size=5, max_ball_size=20, color_threshold=(20, 100, 100, 30, 255, 255), stationary_threshold=5, penalty_threshold=1.5,
+                 frame_rate=24, max_ball_speed=40, max_ball_pixel_speed=60, min_score=0.5, reference_candidates=48):
         self.min_ball_size = min_ball_size
         self.max_ball_size = max_ball_size
         self.color_threshold = color_threshold
         self.stationary_threshold = stationary_threshold
         self.penalty_threshold = penalty_threshold
-
-    def get_clustering_model(self,image):
-        # Reshape the image to 2D array
-        image_2d = image.reshape(-1,3)
-
-        # Preform K-means with 2 clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++",n_init=1)
-        kmeans.fit(image_2d)
-
-        return kmeans
+        self.frame_rate = frame_rate
+        # Fastest plausible ball movement, in m/s on the pitch and in pixels per frame in the image
+        self.max_ball_speed = max_ball_speed
+        self.max_ball_pixel_speed = max_ball_pixel_speed
+        self.min_score = min_score
+        # Reference colour statistics (median, spread); fitted on the candidates unless set
+        self.color_reference = None
+        # Live validation: candidates collected for the reference, and the last accepted (bbox, frame, position)
+        self.reference_candidates = reference_candidates
+        self.live_candidates = []
+        self.last_live_ball = None
 
     def _is_valid_ball(self, ball_bbox):
-        min_ball_size = 5
-        max_ball_size = 20
         ball_width = ball_bbox[2] - ball_bbox[0]
         ball_height = ball_bbox[3] - ball_bbox[1]
-        return min_ball_size < ball_width < max_ball_size and min_ball_size < ball_height < max_ball_size
-    
-    def get_ball_color(self,frame,bbox):
-        image = frame[int(bbox[1]):int(bbox[3]),int(bbox[0]):int(bbox[2])]
-        top_half_image = image[0:int(image.shape[0]/2),:]
-        kmeans = self.get_clustering_model(top_half_image)
-        labels = kmeans.labels_
-        clustered_image = labels.reshape(top_half_image.shape[0],top_half_image.shape[1])
-        corner_clusters = [clustered_image[0,0],clustered_image[0,-1],clustered_image[-1,0],clustered_image[-1,-1]]
-        non_ball_cluster = max(set(corner_clusters),key=corner_clusters.count)
-        ball_cluster = 1 - non_ball_cluster
-        ball_color = kmeans.cluster_centers_[ball_cluster]
-
-        return ball_color
+        return self.min_ball_size < ball_width < self.max_ball_size and self.min_ball_size < ball_height < self.max_ball_size
 
+    def get_color_stats(self, frame, bbox):
+        # [mean saturation, mean value, white fraction, in-threshold fraction] of the crop centre
+        x1, y1, x2, y2 = map(int, bbox)
+        crop = frame[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)]
+        if crop.size == 0:
+            return np.full(4, np.nan, dtype=np.float32)
+        height, width = crop.shape[:2]
+        crop = crop[height // 4:height - height // 4 or height, width // 4:width - width // 4 or width]
 
-    def _filter_by_color(self, frame, object_bbox):
-        x1, y1, x2, y2 = map(int, object_bbox)
+        hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV).reshape(-1, 3).astype(np.float32)
+        lower, upper = np.array(self.color_threshold[:3]), np.array(self.color_threshold[3:])
+        in_threshold = np.all((hsv >= lower) & (hsv <= upper), axis=1)
+        white = (hsv[:, 1] < 60) & (hsv[:, 2] > 160)
+        return np.array([hsv[:, 1].mean() / 255, hsv[:, 2].mean() / 255, white.mean(), in_threshold.mean()], dtype=np.float32)
+
+    def get_candidate_stats(self, frames, ball_tracks, start_frame=0):
+        # (frame_nums, color_stats) of the ball candidates of frames[i] = frame start_frame + i
+        frame_nums, color_stats = [], []
+        for offset, frame in enumerate(frames):
+            ball = ball_tracks[start_frame + offset].get(1)
+            if ball is None:
+                continue
+            frame_nums.append(start_frame + offset)
+            color_stats.append(self.get_color_stats(frame, ball['bbox']))
+        return np.array(frame_nums, dtype=np.int64), np.array(color_stats, dtype=np.float32).reshape(-1, 4)
+
+    def fit_color_reference(self, color_stats, size_valid):
+        # Robust centre and spread of the plausibly sized candidates (all of them if none are)
+        stats = color_stats[size_valid] if size_valid.any() else color_stats
+        stats = stats[~np.isnan(stats).any(axis=1)]
+        if len(stats) == 0:
+            return None
+        median = np.median(stats, axis=0)
+        spread = np.maximum(1.4826 * np.median(np.abs(stats - median), axis=0), 0.1)
+        return median, spread
+
+    def score_candidates(self, bboxes, color_stats, frame_nums, positions=None):
+        """
+        Size, colour and trajectory scores for all candidates at once.
+        bboxes (N,4), color_stats (N,4), frame_nums (N,) increasing, positions (N,2) pitch
+        positions in metres (NaN where unknown). Returns the (N,) combined score.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        size_score = self.score_size(bboxes)
+        reference = self.color_reference or self.fit_color_reference(color_stats, size_score == 1)
+        color_score = self.score_color(color_stats, reference)
+        trajectory_score = self.score_trajectory(bboxes, frame_nums, positions)
+        return (size_score + color_score + trajectory_score) / 3
+
+    def score_size(self, bboxes):
+        # 1 inside (min_ball_size, max_ball_size), fading out linearly over another max_ball_size outside it
+        sizes = np.stack([bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1]], axis=1)
+        excess = np.maximum(self.min_ball_size - sizes, 0) + np.maximum(sizes - self.max_ball_size, 0)
+        return np.clip(1 - excess.max(axis=1) / self.max_ball_size, 0, 1)
+
+    def score_color(self, color_stats, reference):
+        if reference is None:
+            return np.ones(len(color_stats), dtype=np.float32)
+        z = (color_stats - reference[0]) / reference[1]
+        return np.nan_to_num(np.exp(-0.5 * np.mean(z ** 2, axis=1)), nan=0.0)
 
-        hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        object_mask = hsv_frame[y1:y2, x1:x2]
-        lower_ball_color = self.get_ball_color(frame, object_bbox) 
-        upper_ball_color = self.get_ball_color(frame, object_bbox)
-        ball_mask = cv2.inRange(object_mask, lower_ball_color, upper_ball_color)
-        return cv2.countNonZero(ball_mask) > 0
+    def score_trajectory(self, bboxes, frame_nums, positions=None):
+        # A candidate is plausible if it is reachable from its previous or its next candidate
+        if len(bboxes) < 2:
+            return np.ones(len(bboxes), dtype=np.float32)
+        centers = np.stack([(bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2], axis=1)
+        gaps = np.maximum(np.diff(frame_nums), 1).astype(np.float32)
 
+        pixel_speed = np.linalg.norm(np.diff(centers, axis=0), axis=1) / gaps
+        step_score = np.minimum(1, self.max_ball_pixel_speed / np.maximum(pixel_speed, 1e-6))
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+            pitch_speed = np.linalg.norm(np.diff(positions, axis=0), axis=1) / (gaps / self.frame_rate)
+            # Prefer the pitch speed wherever both positions are calibrated
+            step_score = np.where(np.isnan(pitch_speed), step_score,
+                                  np.minimum(1, self.max_ball_speed / np.maximum(np.nan_to_num(pitch_speed), 1e-6)))
+
+        previous_score = np.concatenate([[0], step_score])
+        next_score = np.concatenate([step_score, [0]])
+        return np.maximum(previous_score, next_score).astype(np.float32)
+
+    def validate_ball_tracks(self, ball_tracks, frame_nums, color_stats):
+        # Marks each candidate with is_valid_ball and returns the (N,) validity mask
+        balls = [ball_tracks[frame_num][1] for frame_num in frame_nums]
+        if not balls:
+            return np.zeros(0, dtype=bool)
+        bboxes = np.array([ball['bbox'] for ball in balls], dtype=np.float32)
+        positions = np.array([ball.get('position_transformed') if ball.get('position_transformed') is not None else [np.nan, np.nan]
+                              for ball in balls], dtype=np.float32)
+
+        valid = self.score_candidates(bboxes, color_stats, frame_nums, positions) >= self.min_score
+        for ball, is_valid in zip(balls, valid):
+            ball['is_valid_ball'] = bool(is_valid)
+        return valid
+
+    def validate_live_candidate(self, ball, color_stats, frame_num):
+        """
+        Causal version of validate_ball_tracks for one candidate at a time (live use).
+        The colour reference is fitted once reference_candidates candidates have been
+        seen (size and trajectory only until then) and the trajectory is scored
+        against the last accepted candidate, since the next one is not known yet.
+        """
+        bbox = np.asarray(ball['bbox'], dtype=np.float32).reshape(1, 4)
+        position = ball.get('position_transformed')
+        position = np.asarray(position if position is not None else [np.nan, np.nan], dtype=np.float32).reshape(1, 2)
+        color_stats = np.asarray(color_stats, dtype=np.float32).reshape(1, 4)
+
+        if self.color_reference is None:
+            self.live_candidates.append((bbox[0], color_stats[0]))
+            if len(self.live_candidates) >= self.reference_candidates:
+                bboxes, stats = map(np.array, zip(*self.live_candidates))
+                self.color_reference = self.fit_color_reference(stats, self.score_size(bboxes) == 1)
+                self.live_candidates = []
+
+        if self.last_live_ball is None:
+            trajectory_score = 1.0
+        else:
+            last_bbox, last_frame_num, last_position = self.last_live_ball
+            trajectory_score = self.score_trajectory(np.concatenate([last_bbox, bbox]), np.array([last_frame_num, frame_num]),
+                                                     np.concatenate([last_position, position]))[1]
+
+        score = (self.score_size(bbox)[0] + self.score_color(color_stats, self.color_reference)[0] + trajectory_score) / 3
+        ball['is_valid_ball'] = bool(score >= self.min_score)
+        if ball['is_valid_ball']:
+            self.last_live_ball = (bbox, frame_num, position)
+        return ball['is_valid_ball']
+
+    def filter_ball_tracks(self, ball_tracks, frame_nums, color_stats):
+        # Drops invalid candidates in place so they are re-interpolated; returns how many were dropped
+        valid = self.validate_ball_tracks(ball_tracks, frame_nums, color_stats)
+        for frame_num in frame_nums[~valid]:
+            del ball_tracks[frame_num][1]
+        return int((~valid).sum())
+
+    def _filter_by_color(self, frame, object_bbox):
+        # Any pixel of the crop centre inside color_threshold (HSV)
+        return self.get_color_stats(frame, object_bbox)[3] > 0
 
     def _classify_ball(self, ball_bbox, frame, tracked_positions):
         score = 0
@@ -1 +1,2 @@
-from .kalman_filter import KalmanFilter
\ No newline at end of file
+from .kalman_filter import KalmanFilter
+from .kalman_filter_bank import KalmanFilterBank
\ No newline at end of file
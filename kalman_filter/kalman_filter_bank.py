@@ -0,0 +1,103 @@
+import numpy as np
+
+class KalmanFilterBank:
+    """
+    Constant-velocity Kalman filters for many tracks at once.
+
+    Same model and initial state as KalmanFilter (state x, y, vx, vy, zero initial
+    state and covariance), but the states and covariances of all tracks are
+    kept in stacked arrays so a whole frame is predicted and corrected in one step.
+    Tracks are addressed by key and live in array slots; dropping a track moves
+    the last slot into its place.
+    """
+    def __init__(self, process_noise=1e-2, measurement_noise=1e-1, capacity=64):
+        self.transition_matrix = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], np.float64)
+        self.process_noise_cov = np.eye(4) * process_noise
+        self.measurement_noise_cov = np.eye(2) * measurement_noise
+
+        self.state = np.zeros((capacity, 4))
+        self.cov = np.zeros((capacity, 4, 4))
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        self.keys = []
+        self.slot_of = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grow(self, size):
+        capacity = len(self.state)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        self.state = np.resize(self.state, (capacity, 4))
+        self.cov = np.resize(self.cov, (capacity, 4, 4))
+        self.last_seen = np.resize(self.last_seen, capacity)
+
+    def get_slots(self, keys):
+        # Slots for the given keys, creating zero-initialised filters for new keys
+        slots = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            slot = self.slot_of.get(key)
+            if slot is None:
+                slot = len(self.keys)
+                self._grow(slot + 1)
+                self.state[slot] = 0
+                self.cov[slot] = 0
+                self.keys.append(key)
+                self.slot_of[key] = slot
+            slots[i] = slot
+        return slots
+
+    def drop(self, keys):
+        for key in keys:
+            slot = self.slot_of.pop(key, None)
+            if slot is None:
+                continue
+            last = len(self.keys) - 1
+            if slot != last:
+                last_key = self.keys[last]
+                self.state[slot] = self.state[last]
+                self.cov[slot] = self.cov[last]
+                self.last_seen[slot] = self.last_seen[last]
+                self.keys[slot] = last_key
+                self.slot_of[last_key] = slot
+            self.keys.pop()
+
+    def drop_stale(self, frame_num, max_age):
+        # Drop tracks that have not been updated for more than max_age frames
+        count = len(self.keys)
+        stale = np.flatnonzero(frame_num - self.last_seen[:count] > max_age)
+        self.drop([self.keys[slot] for slot in stale])
+
+    def predict(self, slots):
+        F = self.transition_matrix
+        self.state[slots] = self.state[slots] @ F.T
+        self.cov[slots] = F @ self.cov[slots] @ F.T + self.process_noise_cov
+        return self.state[slots, :2].copy()
+
+    def correct(self, slots, measurements):
+        # The measurement matrix selects x, y, so H P H^T and P H^T are plain slices
+        P = self.cov[slots]
+        S = P[:, :2, :2] + self.measurement_noise_cov
+        det = S[:, 0, 0] * S[:, 1, 1] - S[:, 0, 1] * S[:, 1, 0]
+        S_inv = np.empty_like(S)
+        S_inv[:, 0, 0] = S[:, 1, 1] / det
+        S_inv[:, 1, 1] = S[:, 0, 0] / det
+        S_inv[:, 0, 1] = -S[:, 0, 1] / det
+        S_inv[:, 1, 0] = -S[:, 1, 0] / det
+        K = P[:, :, :2] @ S_inv
+
+        innovation = np.asarray(measurements, dtype=np.float64) - self.state[slots, :2]
+        self.state[slots] += (K @ innovation[:, :, None])[:, :, 0]
+        self.cov[slots] = P - K @ P[:, :2, :]
+
+    def step(self, keys, measurements, frame_num=None):
+        # Predict and correct the given tracks; returns the predictions (before correction)
+        slots = self.get_slots(keys)
+        if len(slots) == 0:
+            return np.zeros((0, 2))
+        prediction = self.predict(slots)
+        self.correct(slots, measurements)
+        if frame_num is not None:
+            self.last_seen[slots] = frame_num
+        return prediction
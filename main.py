@@ -1,10 +1,9 @@
 from is_ball.is_ball import IsBall
-from pass_stats_tracker import PassStatsTracker
-from player_heatmap.player_heatmap import PlayerHeatmap
+from pass_stats_tracker import MatchStats
 from tactical_analysis.pass_network import PassNetwork
 from tactical_analysis.space_occupancy_analyzer import SpaceOccupancyAnalyzer
-from utils import read_video, save_video
-from trackers import Tracker
+from utils import read_video, get_video_fps, VideoSink
+from trackers import Tracker, AdaptiveStride, BallROIDetector
 import cv2
 import numpy as np
 from team_assigner import TeamAssigner
@@ -12,207 +11,179 @@ from player_ball_assigner import PlayerBallAssigner
 from camera_movement_estimator import CameraMovementEstimator
 from view_transformer import ViewTransformer
 from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from pipeline import StreamingPipeline, ChunkedPipeline, BatchRunner, LivePipeline, StageProfiler
+from pipeline.stages import assign_player_teams, assign_ball_possession, save_heatmaps, build_frame_renderer
+from stage_cache import StageCache
+import argparse
 
 
-def main():
+def main(input_video_path='input_videos/08fd33_4.mp4', output_video_path='output_videos/08fd33_4_v2_1.avi', model_path='models/best.pt', cache_dir=None, cache_max_bytes=None, profiler=None, detect_stride=1, ball_roi=0):
+    # Every stage is timed; the report is only printed/written when a profiler is passed in
+    report_profile = profiler is not None
+    profiler = profiler or StageProfiler()
+    fps = get_video_fps(input_video_path)
+
     # Read Video
-    video_frames = read_video('input_videos/08fd33_4.mp4')
+    with profiler.stage('read_video') as stage:
+        video_frames = read_video(input_video_path)
+        stage['frames'] = num_frames = len(video_frames)
 
-    # Initialize Tracker
-    tracker = Tracker('models/best.pt')
+    # Intermediate results are cached by video/model/parameter hash; without a cache the demo stubs are used
+    cache = StageCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
 
-    tracks = tracker.get_object_tracks(video_frames,
-                                       read_from_stub=True,
-                                       stub_path='stubs/track_stubs_08fd33_4_demo.pkl')
+    # Initialize Tracker
+    with profiler.stage('get_object_tracks', frames=num_frames):
+        tracker = Tracker(model_path)
+        if detect_stride > 1:
+            tracker.adaptive_stride = AdaptiveStride(max_stride=detect_stride)
+        if ball_roi:
+            tracker.ball_roi_detector = BallROIDetector(tracker.model, roi_size=ball_roi)
+
+        tracks_cache_key = cache.make_key('tracks', input_video_path, model_path, **tracker.get_cache_params()) if cache else None
+        tracks = tracker.get_object_tracks(video_frames,
+                                           read_from_stub=cache is None,
+                                           stub_path='stubs/track_stubs_08fd33_4_demo.pkl' if cache is None else None,
+                                           cache=cache,
+                                           cache_key=tracks_cache_key)
+        if tracker.adaptive_stride is not None and tracker.adaptive_stride.frames:
+            tracker.adaptive_stride.print_report()
+        if tracker.ball_roi_detector is not None and tracker.ball_roi_detector.frame_num:
+            tracker.ball_roi_detector.print_report()
     # Get object positions with kalman filter
-    tracker.add_position_to_tracks(tracks)
+    with profiler.stage('add_position_to_tracks', frames=num_frames):
+        tracker.add_position_to_tracks(tracks)
 
     # camera movement estimator
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                                read_from_stub=True,
-                                                                                stub_path='stubs/camera_movement_stub_08fd33_4_demo.pkl')
-    camera_movement_estimator.add_adjust_positions_to_tracks(tracks,camera_movement_per_frame)
+    with profiler.stage('get_camera_movement', frames=num_frames):
+        camera_movement_estimator = CameraMovementEstimator(video_frames[0])
+        camera_cache_key = cache.make_key('camera_movement', input_video_path, **camera_movement_estimator.get_cache_params()) if cache else None
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
+                                                                                    read_from_stub=cache is None,
+                                                                                    stub_path='stubs/camera_movement_stub_08fd33_4_demo.pkl' if cache is None else None,
+                                                                                    cache=cache,
+                                                                                    cache_key=camera_cache_key)
+        camera_movement_estimator.add_adjust_positions_to_tracks(tracks,camera_movement_per_frame)
 
 
     # View Trasnformer
-    view_transformer = ViewTransformer()
-    view_transformer.add_transformed_position_to_tracks(tracks)
-
-    #for frame_num in range(len(tracks["ball"])):
-    #    print(f"Ball transformed position at frame {frame_num}: {tracks['ball'][frame_num].get(1, {}).get('position_transformed', 'Missing')}")
-
-    # Interpolate Ball Positions
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
-    """
-    # Initialize IsBall
-    is_ball_detector = IsBall()
-
-    for frame_num, ball_track in enumerate(tracks['ball']):
-        for track_id, track_info in ball_track.items():
-            ball_bbox = track_info['bbox']
-            tracked_positions = [track_info['position_transformed']] 
-            frame = video_frames[frame_num]
-
-            is_ball = is_ball_detector._classify_ball(ball_bbox, frame, tracked_positions)
-
-            tracks['ball'][frame_num][track_id]['is_valid_ball'] = is_ball
-            #validity = "valid" if is_ball else "invalid"
-            #print(f"Frame {frame_num}: ball is {validity}")
-
-    # Validate and remove invalid ball positions
-    for frame_num, ball_track in enumerate(tracks['ball']):
-        for track_id, track_info in list(ball_track.items()):
-            if not track_info.get('is_valid_ball', False):
-                del tracks['ball'][frame_num][track_id]
-    
-
-    # Interpolate missing ball positions
-    tracks['ball'] = tracker.interpolate_ball_positions(tracks['ball'])
-
-    # Optional: Recheck ball validity if necessary
-    for frame_num, ball_track in enumerate(tracks['ball']):
-        for track_id, track_info in ball_track.items():
-            ball_bbox = track_info['bbox']
-            tracked_positions = [track_info['position_transformed']] 
-            frame = video_frames[frame_num]
-
-            is_ball = is_ball_detector._classify_ball(ball_bbox, frame, tracked_positions)
-            tracks['ball'][frame_num][track_id]['is_valid_ball'] = is_ball
-            validity = "valid" if is_ball else "invalid"
-            print(f"Frame {frame_num}: ball is {validity}")
-    """
+    with profiler.stage('view_transform', frames=num_frames):
+        view_transformer = ViewTransformer()
+        view_transformer.add_transformed_position_to_tracks(tracks)
+
+    # Validate ball detections (size, crop colour and trajectory) and re-interpolate the rejected ones
+    with profiler.stage('ball_validation', frames=num_frames):
+        is_ball_detector = IsBall(frame_rate=fps)
+        ball_frame_nums, ball_color_stats = is_ball_detector.get_candidate_stats(video_frames, tracks['ball'])
+        is_ball_detector.filter_ball_tracks(tracks['ball'], ball_frame_nums, ball_color_stats)
+
+        # Interpolate Ball Positions
+        tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
 
     # Speed and distance estimator
-    speed_and_distance_estimator = SpeedAndDistance_Estimator()
-    speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+    with profiler.stage('speed_and_distance', frames=num_frames):
+        speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
 
     # Assign Player Teams
-    team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(video_frames[0], 
-                                    tracks['players'][0])
-    
-    for frame_num, player_track in enumerate(tracks['players']):
-        for player_id, track in player_track.items():
-            team = team_assigner.get_player_team(video_frames[frame_num],   
-                                                 track['bbox'],
-                                                 player_id)
-            tracks['players'][frame_num][player_id]['team'] = team 
-            tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
-
-    
+    with profiler.stage('team_assignment', frames=num_frames):
+        team_assigner = TeamAssigner()
+        assign_player_teams(team_assigner, video_frames, tracks['players'])
+
     # Assign Ball Aquisition
-    player_assigner =PlayerBallAssigner()
-    team_ball_control= []
-    for frame_num, player_track in enumerate(tracks['players']):
-        ball_bbox = tracks['ball'][frame_num][1]['bbox']
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_bbox)
-
-        if assigned_player != -1:
-            tracks['players'][frame_num][assigned_player]['has_ball'] = True
-            team_ball_control.append(tracks['players'][frame_num][assigned_player]['team'])
-        else:
-            if len(team_ball_control) > 0:
-                team_ball_control.append(team_ball_control[-1])
-    team_ball_control= np.array(team_ball_control)
+    with profiler.stage('ball_possession', frames=num_frames):
+        player_assigner =PlayerBallAssigner()
+        team_ball_control = assign_ball_possession(tracks, player_assigner)
 
     # Initialize Tactical Analysis Components
     pass_network = PassNetwork()
-    #space_occupancy_analyzer = SpaceOccupancyAnalyzer()
+    space_occupancy_analyzer = SpaceOccupancyAnalyzer(frame_rate=fps)
 
 
     # Pass Network Analysis
-    pass_network_graph = pass_network.construct_pass_network(tracks['players'], team_ball_control)
-    pass_network.visualize(pass_network_graph, 'output_images/pass_network.png')
-
-    # Space Occupancy Analysis
-    #space_occupancy_maps = space_occupancy_analyzer.analyze_space_control(tracks['players'])
-    #space_occupancy_analyzer.visualize_space_occupancy(space_occupancy_maps, 'output_images/space_occupancy.png')
-
-
-    # Initialize PassStatsTracker
-    pass_stats_tracker = PassStatsTracker()
-
-   # Draw stats on each frame with a semi-transparent background
-    font = cv2.FONT_HERSHEY_DUPLEX
-    font_scale = 0.5
-    font_color = (0, 0, 0)
-    line_type = 1
-
-    for frame_num, frame in enumerate(video_frames):
-        # Update pass stats for the current frame
-        pass_stats_tracker.update_frame_stats(tracks, frame_num, team_ball_control)
-        live_stats = pass_stats_tracker.get_live_stats()
-
-        # Determine the background rectangle dimensions
-        frame_height = frame.shape[0] - 100
-        y_offset = frame_height - (len(live_stats) * 20 + 10)
-        rect_height = len(live_stats) * 20 + 20
-        rect_width = 450 
-
-        # Draw semi-transparent rectangle
-        overlay = frame.copy()
-        cv2.rectangle(
-            overlay,
-            (10, y_offset - 10),
-            (10 + rect_width, y_offset + rect_height - 10),
-            (255, 255, 255),
-            -1,
-        )
-        alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-        # Draw stats text on top of the semi-transparent background
-        for line in live_stats:
-            cv2.putText(
-                frame,
-                line,
-                (20, y_offset),
-                font,
-                font_scale,
-                font_color,
-                line_type,
-            )
-            y_offset += 18  # Adjust spacing between lines
-
-    pass_stats_tracker.print_stats()
-
-
-    # Generate heatmaps for each team
-    teams = set(player['team'] for frame in tracks['players'] for player in frame.values() if 'team' in player)
-    frame_size = (video_frames[0].shape[0], video_frames[0].shape[1])
-    pitch_image_path = "images/football_pitch.png"
-
-    for team in teams:
-        # Initialize heatmap for the team
-        team_heatmap = PlayerHeatmap(frame_size, pitch_image_path=pitch_image_path)
-        team_heatmap.update_heatmap(tracks, team=team)
-        output_path = f"output_images/team_{team}_heatmap.png"
-        team_heatmap.save_heatmap_on_pitch(output_path)
-        print(f"Heatmap for team {team} saved at {output_path}")
-
-    # Generate heatmap for all players
-    all_players_heatmap = PlayerHeatmap(frame_size, pitch_image_path=pitch_image_path)
-    all_players_heatmap.update_heatmap(tracks)
-    output_path_all = "output_images/all_players_heatmap.png"
-    all_players_heatmap.save_heatmap_on_pitch(output_path_all)
-    print(f"Heatmap for all players saved at {output_path_all}")
-
-
-
-    # Draw output 
-    ## Draw object Tracks
-    output_video_frames = tracker.draw_annotations(video_frames, tracks,team_ball_control)
-
-    ## Draw Camera movement
-    output_video_frames = camera_movement_estimator.draw_camera_movement(output_video_frames,camera_movement_per_frame)
-
-    ## Draw Speed and Distance
-    speed_and_distance_estimator.draw_speed_and_distance(output_video_frames,tracks)
-
-
-    # Save video
-    save_video(output_video_frames, 'output_videos/08fd33_4_v2_1.avi')
+    with profiler.stage('pass_network', frames=num_frames):
+        pass_network_graph = pass_network.construct_pass_network(tracks['players'], tracks['ball'])
+        pass_network.visualize(pass_network_graph, 'output_images/pass_network.png')
+
+    # Space Occupancy Analysis: per-frame Voronoi pitch control averaged over the match
+    with profiler.stage('pitch_control', frames=num_frames):
+        pitch_control_windows, _ = space_occupancy_analyzer.analyze_pitch_control(tracks['players'])
+        space_occupancy_analyzer.visualize_pitch_control(pitch_control_windows[0], 'output_images/pitch_control.png')
+
+
+    # Generate heatmaps for each team and for all players
+    with profiler.stage('heatmaps', frames=num_frames):
+        save_heatmaps(tracks, pitch_image_path="images/football_pitch.png")
+
+
+    # Possession and pass statistics, queried incrementally while rendering
+    match_stats = MatchStats.from_tracks(tracks, team_ball_control)
+
+    # Draw output: pass stats, tracks, ball control, camera movement and speed/distance
+    # are drawn in one in-place pass per frame and encoded right away
+    with profiler.stage('render', frames=num_frames):
+        renderer = build_frame_renderer(tracks, camera_movement_per_frame, tracker,
+                                        camera_movement_estimator, speed_and_distance_estimator, match_stats)
+        with VideoSink(output_video_path, fps) as sink:
+            renderer.render_video(video_frames, sink)
+
+    match_stats.print_stats()
+
+    if cache is not None:
+        print(f"Stage cache: {cache.report()}")
+
+    if report_profile:
+        profiler.print_report()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Football analysis pipeline")
+    parser.add_argument('--input', default='input_videos/08fd33_4.mp4', help="input video path")
+    parser.add_argument('--output', default='output_videos/08fd33_4_v2_1.avi', help="output video path")
+    parser.add_argument('--model', default='models/best.pt', help="YOLO model path")
+    parser.add_argument('--stream', action='store_true', help="process the video in bounded-memory chunks")
+    parser.add_argument('--chunk-size', type=int, default=100, help="frames per chunk in streaming mode")
+    parser.add_argument('--overlap', action='store_true', help="overlap decoding, inference and tracking (streaming mode)")
+    parser.add_argument('--batch-size', type=int, default=20, help="inference batch size (streaming mode)")
+    parser.add_argument('--fast-camera', action='store_true', help="downscaled, robust camera movement estimation (streaming mode)")
+    parser.add_argument('--cache-dir', default=None, help="content-addressed cache for tracks and camera movement (replaces the stubs)")
+    parser.add_argument('--cache-max-gb', type=float, default=None, help="evict least recently used cache entries above this size")
+    parser.add_argument('--parallel', action='store_true', help="process overlapping chunks of the match in a process pool")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes in parallel mode (default: all cores)")
+    parser.add_argument('--chunk-frames', type=int, default=1500, help="frames per worker chunk in parallel mode")
+    parser.add_argument('--batch', default=None, help="directory or manifest of videos to process in one run (resumable)")
+    parser.add_argument('--batch-workers', type=int, default=2, help="videos processed concurrently in batch mode")
+    parser.add_argument('--output-dir', default='output_videos', help="output and job state directory in batch mode")
+    parser.add_argument('--detect-stride', type=int, default=1, help="run the detector on at most every Nth frame and propagate tracks in between (1 = every frame)")
+    parser.add_argument('--ball-roi', type=int, default=0, help="re-detect the ball on a window of this many full-resolution pixels around its predicted position (0 = off)")
+    parser.add_argument('--live', action='store_true', help="low-latency causal mode; --input may be a camera index or stream URL, files are replayed in real time")
+    parser.add_argument('--latency-budget', type=float, default=0.25, help="seconds from capture after which a frame is dropped in live mode")
+    parser.add_argument('--profile', default=None, help="write a per-stage JSON profile report to this path")
+    parser.add_argument('--profile-sampling', action='store_true', help="also sample call stacks per stage in the profile report")
+    args = parser.parse_args()
+    if args.profile and args.batch:
+        # Batch jobs run in worker processes; their per-stage timings are in each job's state.json
+        parser.error("--profile is not supported with --batch, see the per-stage timings in each job's state.json")
+    cache_max_bytes = int(args.cache_max_gb * 1e9) if args.cache_max_gb else None
+    profiler = StageProfiler(sampling=args.profile_sampling) if args.profile else None
+
+    if args.live:
+        live_pipeline = LivePipeline(args.model, latency_budget=args.latency_budget, profiler=profiler)
+        live_pipeline.print_report(live_pipeline.run(args.input, args.output))
+    elif args.batch:
+        BatchRunner(args.model, output_dir=args.output_dir, max_workers=args.batch_workers,
+                    pipeline_kwargs=dict(chunk_size=args.chunk_size, fast_camera_movement=args.fast_camera,
+                                         overlap_stages=args.overlap, batch_size=args.batch_size, detect_stride=args.detect_stride,
+                                         ball_roi=args.ball_roi)).run(args.batch)
+    elif args.parallel:
+        ChunkedPipeline(args.model, num_workers=args.workers, chunk_frames=args.chunk_frames, chunk_size=args.chunk_size,
+                        fast_camera_movement=args.fast_camera, batch_size=args.batch_size, detect_stride=args.detect_stride,
+                        ball_roi=args.ball_roi, profiler=profiler).run(args.input, args.output)
+    elif args.stream:
+        StreamingPipeline(args.model, chunk_size=args.chunk_size, fast_camera_movement=args.fast_camera,
+                          overlap_stages=args.overlap, batch_size=args.batch_size, detect_stride=args.detect_stride,
+                          ball_roi=args.ball_roi, cache=StageCache(args.cache_dir, max_bytes=cache_max_bytes) if args.cache_dir else None,
+                          profiler=profiler).run(args.input, args.output)
+    else:
+        main(args.input, args.output, args.model, args.cache_dir, cache_max_bytes, profiler, args.detect_stride, args.ball_roi)
+
+    if profiler is not None:
+        profiler.write_report(args.profile)
\ No newline at end of file
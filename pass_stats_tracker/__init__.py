@@ -1 +1,3 @@
-from .pass_stats_tracker import PassStatsTracker
\ No newline at end of file
+from .pass_stats_tracker import PassStatsTracker
+from .match_stats import MatchStats
+from .pass_detector import PassDetector
\ No newline at end of file
@@ -0,0 +1,142 @@
+import bisect
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import FrameBuffer
+from .pass_detector import PassDetector
+
+class MatchStats:
+    """
+    Incremental possession and pass statistics.
+
+    Per-frame inputs are the team in control, the ball carrier (-1 for none), the
+    carrier's team and the ball's pitch position. Possession is kept as running
+    prefix counts and passes are counted by a cursor that only ever moves forward,
+    so getting the stats of the next frame is O(1) regardless of match length.
+    Passes follow the shared PassDetector definition and are counted at the
+    frame the receiver gets the ball. In a live session release_before() drops
+    the per-frame inputs of frames that will not be queried again.
+    """
+    def __init__(self, pass_detector=None):
+        self.pass_detector = pass_detector or PassDetector()
+        self.carriers = FrameBuffer()
+        self.carrier_teams = FrameBuffer()
+        self.ball_positions = FrameBuffer()
+        self.team_1_prefix = FrameBuffer()
+        self.team_2_prefix = FrameBuffer()
+
+        self.pass_stats = {}
+        self.events = []  # (frame, passer, receiver, successful)
+        self.cursor = 0
+
+    @classmethod
+    def from_tracks(cls, tracks, team_ball_control, ball_carriers=None, pass_detector=None):
+        stats = cls(pass_detector)
+        player_tracks = tracks['players']
+        if ball_carriers is None:
+            ball_carriers = [next((player_id for player_id, player in players.items() if player.get('has_ball', False)), -1)
+                             for players in player_tracks]
+
+        for frame_num, carrier in enumerate(ball_carriers):
+            carrier_team = player_tracks[frame_num][carrier].get('team', 0) if carrier != -1 else 0
+            ball_position = tracks['ball'][frame_num].get(1, {}).get('position_transformed')
+            team = team_ball_control[frame_num] if frame_num < len(team_ball_control) else 0
+            stats.append(team, carrier, carrier_team, ball_position)
+
+        return stats
+
+    def __len__(self):
+        return len(self.carriers)
+
+    def append(self, team_in_control, carrier, carrier_team, ball_position=None):
+        team_1 = self.team_1_prefix[-1] if self.team_1_prefix else 0
+        team_2 = self.team_2_prefix[-1] if self.team_2_prefix else 0
+        self.team_1_prefix.append(team_1 + (team_in_control == 1))
+        self.team_2_prefix.append(team_2 + (team_in_control == 2))
+        self.carriers.append(int(carrier))
+        self.carrier_teams.append(carrier_team)
+        self.ball_positions.append(ball_position)
+
+    def release_before(self, frame_num):
+        # Count the passes up to frame_num first; the last frame is kept for its prefix counts
+        frame_num = min(frame_num, len(self.carriers) - 1)
+        self.advance(frame_num - 1)
+        for frames in (self.carriers, self.carrier_teams, self.ball_positions, self.team_1_prefix, self.team_2_prefix):
+            frames.release_before(frame_num)
+
+    def initialize_player_stats(self, player_id):
+        if player_id not in self.pass_stats:
+            self.pass_stats[player_id] = {
+                'total_passes': 0,
+                'successful_passes': 0,
+                'received_passes': 0
+            }
+
+    def process_frame(self, frame_num):
+        receiver = self.carriers[frame_num]
+        if receiver == -1:
+            return
+        self.initialize_player_stats(receiver)
+        completed = self.pass_detector.update(frame_num, receiver, self.carrier_teams[frame_num], self.ball_positions[frame_num])
+        if completed is None:
+            return
+
+        passer, _, successful = completed
+        if successful:
+            self.pass_stats[passer]['successful_passes'] += 1
+            self.pass_stats[receiver]['received_passes'] += 1
+        self.pass_stats[passer]['total_passes'] += 1
+        self.events.append((frame_num, passer, receiver, successful))
+
+    def advance(self, frame_num):
+        while self.cursor <= frame_num and self.cursor < len(self.carriers):
+            self.process_frame(self.cursor)
+            self.cursor += 1
+
+    def possession(self, frame_num):
+        # Ball control percentages up to and including frame_num
+        if not self.team_1_prefix:
+            return {1: 0.0, 2: 0.0}
+        frame_num = min(frame_num, len(self.team_1_prefix) - 1)
+        team_1, team_2 = self.team_1_prefix[frame_num], self.team_2_prefix[frame_num]
+        total = max(team_1 + team_2, 1)
+        return {1: team_1 / total * 100, 2: team_2 / total * 100}
+
+    def pass_stats_at(self, frame_num):
+        # Rebuild the stats of an earlier frame from the recorded events
+        if frame_num >= self.cursor - 1:
+            self.advance(frame_num)
+            return self.pass_stats
+        pass_stats = {player_id: {'total_passes': 0, 'successful_passes': 0, 'received_passes': 0}
+                      for player_id in self.carriers[:frame_num + 1] if player_id != -1}
+        for _, passer, receiver, successful in self.events[:bisect.bisect_right(self.events, (frame_num, np.inf))]:
+            pass_stats.setdefault(receiver, {'total_passes': 0, 'successful_passes': 0, 'received_passes': 0})
+            pass_stats[passer]['total_passes'] += 1
+            if successful:
+                pass_stats[passer]['successful_passes'] += 1
+                pass_stats[receiver]['received_passes'] += 1
+        return pass_stats
+
+    def snapshot(self, frame_num):
+        return {
+            'frame': frame_num,
+            'team_ball_control': self.possession(frame_num),
+            'pass_stats': {player_id: dict(stats) for player_id, stats in self.pass_stats_at(frame_num).items()},
+        }
+
+    def get_live_stats(self, frame_num):
+        stats_text = []
+        for player_id, stats in self.pass_stats_at(frame_num).items():
+            stats_text.append(
+                f"Player {player_id}: Passes: {stats['total_passes']} | Successful: {stats['successful_passes']} | Received: {stats['received_passes']}"
+            )
+        return stats_text
+
+    def print_stats(self):
+        self.advance(len(self.carriers))
+        for player_id, stats in self.pass_stats.items():
+            print(
+                f"Player {player_id}: Total Passes = {stats['total_passes']}, "
+                f"Successful Passes = {stats['successful_passes']}, "
+                f"Received Passes = {stats['received_passes']}"
+            )
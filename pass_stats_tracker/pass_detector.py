@@ -0,0 +1,39 @@
+import sys
+sys.path.append('../')
+from utils import measure_distance
+
+class PassDetector:
+    """
+    The pass definition shared by MatchStats and PassNetwork.
+
+    Frames with a ball carrier are pushed in order, with the carrier's team and the
+    ball's pitch position in metres (position_transformed, so camera pans do not
+    count as ball travel). A pass is a change of carrier where
+    - at most max_flight_frames frames passed since the previous carrier last had
+      the ball (frames without a carrier in between are the ball in flight), and
+    - the ball travelled at least min_ball_travel metres between release and
+      reception; when either position is unknown the carrier change alone counts.
+    It is successful when both carriers are in the same team.
+    """
+    def __init__(self, min_ball_travel=1.0, max_flight_frames=48):
+        self.min_ball_travel = min_ball_travel
+        self.max_flight_frames = max_flight_frames
+        self.reset()
+
+    def reset(self):
+        self.last_carrier = None  # (frame, player_id, team, ball_position)
+
+    def update(self, frame_num, carrier, carrier_team, ball_position=None):
+        # Returns (passer, passer_team, successful) when the ball reached carrier by a pass, else None
+        if carrier is None or carrier == -1:
+            return None
+        completed = None
+        if self.last_carrier is not None:
+            last_frame, passer, passer_team, release_position = self.last_carrier
+            if passer != carrier and frame_num - last_frame <= self.max_flight_frames:
+                travelled = (ball_position is None or release_position is None or
+                             measure_distance(release_position, ball_position) >= self.min_ball_travel)
+                if travelled:
+                    completed = (passer, passer_team, passer_team == carrier_team)
+        self.last_carrier = (frame_num, carrier, carrier_team, ball_position)
+        return completed
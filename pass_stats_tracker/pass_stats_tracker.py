@@ -64,5 +64,3 @@ class PassStatsTracker:
 
                         self.pass_stats[assigned_player_id]['total_passes'] += 1
                         break
-
-    
@@ -0,0 +1,5 @@
+from .streaming_pipeline import StreamingPipeline
+from .chunked_pipeline import ChunkedPipeline
+from .batch_runner import BatchRunner
+from .live_pipeline import LivePipeline
+from .profiler import StageProfiler
\ No newline at end of file
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sys
+sys.path.append('../')
+from utils import read_video_chunks, get_video_fps
+from trackers import Tracker
+from camera_movement_estimator import CameraMovementEstimator
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from is_ball import IsBall
+from .streaming_pipeline import StreamingPipeline
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def collect_jobs(source, output_dir='output_videos'):
+    """
+    Jobs from a directory of videos or a manifest.
+    A manifest is either a text file with one video path per line (optionally
+    'input,output') or a JSON list of paths or {"input": ..., "output": ...}.
+    Jobs are named after the file stem, plus a short hash of the input path when
+    two inputs share a stem, so every job has its own directory and output.
+    """
+    if os.path.isdir(source):
+        entries = [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.lower().endswith(VIDEO_EXTENSIONS)]
+    elif source.endswith('.json'):
+        with open(source) as f:
+            entries = json.load(f)
+    else:
+        with open(source) as f:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    parsed = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            input_path, output_path = entry['input'], entry.get('output')
+        else:
+            input_path, _, output_path = entry.partition(',')
+            input_path, output_path = input_path.strip(), output_path.strip() or None
+        parsed.append((input_path, output_path))
+
+    input_paths = [os.path.abspath(input_path) for input_path, _ in parsed]
+    duplicates = sorted({path for path in input_paths if input_paths.count(path) > 1})
+    if duplicates:
+        raise ValueError(f"Videos listed more than once: {', '.join(duplicates)}")
+    stems = [os.path.splitext(os.path.basename(input_path))[0] for input_path, _ in parsed]
+
+    jobs = []
+    for (input_path, output_path), stem, absolute_path in zip(parsed, stems, input_paths):
+        name = stem
+        if stems.count(stem) > 1:
+            name = f"{stem}-{hashlib.sha1(absolute_path.encode()).hexdigest()[:8]}"
+        job_dir = os.path.join(output_dir, name)
+        jobs.append({
+            'name': name,
+            'input': input_path,
+            'output': output_path or os.path.join(output_dir, f'{name}.avi'),
+            'job_dir': job_dir,
+        })
+    outputs = [os.path.abspath(job['output']) for job in jobs]
+    clashes = sorted({output for output in outputs if outputs.count(output) > 1})
+    if clashes:
+        raise ValueError(f"Several videos write to the same output: {', '.join(clashes)}")
+    return jobs
+
+
+def get_job_params(job, model_path, pipeline_kwargs=None):
+    # What a job's saved stages depend on, as stored in (and compared with) its state.json
+    return json.loads(json.dumps({'input': os.path.abspath(job['input']), 'model_path': model_path,
+                                  'pipeline_kwargs': pipeline_kwargs or {}}, sort_keys=True, default=str))
+
+
+def load_state(job_dir, params=None):
+    # A state saved for other job params (input, model, pipeline kwargs) is discarded, so the job restarts
+    state_path = os.path.join(job_dir, 'state.json')
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if params is None or state.get('params') == params:
+            return state
+    return {'completed': [], 'timings': {}, 'params': params}
+
+
+def save_state(job_dir, state):
+    # Write then rename, so an interrupted run never leaves a truncated state file
+    state_path = os.path.join(job_dir, 'state.json')
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def save_artifact(job_dir, stage, data):
+    path = os.path.join(job_dir, f'{stage}.pkl')
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_artifact(job_dir, stage):
+    with open(os.path.join(job_dir, f'{stage}.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def restore_pipeline(pipeline, input_video_path, fps):
+    # Recreate the stage objects a resumed run skipped; rendering draws with them
+    pipeline.tracker = Tracker(None)
+    pipeline.is_ball = IsBall()
+    pipeline.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+    for chunk in read_video_chunks(input_video_path, 1, 0, 1):
+        pipeline.camera_movement_estimator = CameraMovementEstimator(chunk[0], fast=pipeline.fast_camera_movement)
+
+
+def run_job(job, model_path, pipeline_kwargs=None):
+    """
+    Run one video through the StreamingPipeline stages, skipping the stages its
+    state.json marks as completed. Each finished stage stores its results in the
+    job directory before it is marked, so a run can be interrupted at any point.
+    """
+    job_dir = job['job_dir']
+    os.makedirs(os.path.join(job_dir, 'images'), exist_ok=True)
+    state = load_state(job_dir, get_job_params(job, model_path, pipeline_kwargs))
+    pipeline = StreamingPipeline(model_path, output_image_dir=os.path.join(job_dir, 'images'), **(pipeline_kwargs or {}))
+    fps = get_video_fps(job['input'])
+    restored = False
+
+    def run_stage(stage, function):
+        start_time, start_cpu = time.perf_counter(), time.process_time()
+        result = function()
+        state['timings'][stage] = {'wall_seconds': time.perf_counter() - start_time, 'cpu_seconds': time.process_time() - start_cpu}
+        state['completed'].append(stage)
+        save_state(job_dir, state)
+        return result
+
+    try:
+        if 'frames' in state['completed']:
+            tracks, camera_movement_per_frame, pipeline.ball_candidates = load_artifact(job_dir, 'frames')
+            restore_pipeline(pipeline, job['input'], fps)
+            restored = True
+        else:
+            def frames_stage():
+                tracks, camera_movement_per_frame = pipeline.process_frames(job['input'])
+                save_artifact(job_dir, 'frames', (tracks, camera_movement_per_frame, pipeline.ball_candidates))
+                return tracks, camera_movement_per_frame
+            tracks, camera_movement_per_frame = run_stage('frames', frames_stage)
+        state['num_frames'] = len(camera_movement_per_frame)
+
+        if 'analysis' in state['completed']:
+            tracks, team_ball_control = load_artifact(job_dir, 'analysis')
+            if not restored:
+                restore_pipeline(pipeline, job['input'], fps)
+        else:
+            def analysis_stage():
+                team_ball_control = pipeline.analyze_tracks(tracks, camera_movement_per_frame, fps)
+                save_artifact(job_dir, 'analysis', (tracks, team_ball_control))
+                return team_ball_control
+            team_ball_control = run_stage('analysis', analysis_stage)
+
+        if 'render' not in state['completed']:
+            run_stage('render', lambda: pipeline.render(job['input'], job['output'], tracks, camera_movement_per_frame, team_ball_control))
+
+        state['status'] = 'done'
+        state.pop('error', None)
+    except Exception:
+        state['status'] = 'failed'
+        state['error'] = traceback.format_exc()
+    save_state(job_dir, state)
+    return job, state
+
+
+class BatchRunner:
+    """
+    Runs many videos through the pipeline, max_workers at a time in a process
+    pool. Each video has its own job directory under output_dir with state.json
+    (completed stages, per-stage wall/CPU time, status) and the stage results,
+    so re-running the same batch only does the work that is missing.
+    """
+    def __init__(self, model_path, output_dir='output_videos', max_workers=2, pipeline_kwargs=None):
+        self.model_path = model_path
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.pipeline_kwargs = pipeline_kwargs or {}
+
+    def run(self, source):
+        jobs = collect_jobs(source, self.output_dir)
+        pending = [job for job in jobs
+                   if load_state(job['job_dir'], get_job_params(job, self.model_path, self.pipeline_kwargs)).get('status') != 'done']
+        print(f"{len(jobs)} videos, {len(jobs) - len(pending)} already done, {len(pending)} to run")
+
+        start_time = time.perf_counter()
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [pool.submit(run_job, job, self.model_path, self.pipeline_kwargs) for job in pending]
+                for future in as_completed(futures):
+                    job, state = future.result()
+                    print(f"{job['name']}: {state['status']}")
+
+        summary = self.summarize(jobs, time.perf_counter() - start_time)
+        self.print_summary(summary)
+        with open(os.path.join(self.output_dir, 'batch_summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def summarize(self, jobs, elapsed):
+        videos = []
+        for job in jobs:
+            state = load_state(job['job_dir'])
+            num_frames = state.get('num_frames', 0)
+            wall_seconds = sum(timing['wall_seconds'] for timing in state['timings'].values())
+            videos.append({
+                'name': job['name'],
+                'status': state.get('status', 'pending'),
+                'frames': num_frames,
+                'wall_seconds': wall_seconds,
+                'fps': num_frames / wall_seconds if wall_seconds else None,
+                'stages': {stage: dict(timing, fps=num_frames / timing['wall_seconds'] if timing['wall_seconds'] else None)
+                           for stage, timing in state['timings'].items()},
+                'error': state.get('error'),
+            })
+        total_frames = sum(video['frames'] for video in videos if video['status'] == 'done')
+        return {'elapsed_seconds': elapsed, 'total_frames': total_frames,
+                'fps': total_frames / elapsed if elapsed else None, 'videos': videos}
+
+    def print_summary(self, summary):
+        print(f"{'video':<24}{'status':<10}{'frames':>8}{'seconds':>10}{'fps':>10}")
+        for video in summary['videos']:
+            fps = f"{video['fps']:.1f}" if video['fps'] else '-'
+            print(f"{video['name']:<24}{video['status']:<10}{video['frames']:>8}{video['wall_seconds']:>10.1f}{fps:>10}")
+        print(f"Batch: {summary['total_frames']} frames in {summary['elapsed_seconds']:.1f}s")
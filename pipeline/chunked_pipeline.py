@@ -0,0 +1,285 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.cluster import KMeans
+import sys
+sys.path.append('../')
+from utils import read_video_chunks, get_video_fps, get_video_frame_count, get_iou_matrix
+from trackers import Tracker, AdaptiveStride, BallROIDetector
+from team_assigner import TeamAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from is_ball import IsBall
+from .stages import extend_tracks
+from .streaming_pipeline import StreamingPipeline
+
+
+def plan_chunks(num_frames, chunk_frames, overlap_frames):
+    # (owned_start, owned_end, decode_start, decode_end) per chunk; each chunk also
+    # decodes overlap_frames on both sides of the frames it owns
+    chunks = []
+    for owned_start in range(0, num_frames, chunk_frames):
+        owned_end = min(owned_start + chunk_frames, num_frames)
+        chunks.append((owned_start, owned_end, max(owned_start - overlap_frames, 0), min(owned_end + overlap_frames, num_frames)))
+    return chunks
+
+
+def analyze_chunk(tracker, camera_movement_estimator, tracks, camera_movement_per_frame, decode_start, fps=24):
+    # Per-track analytics on one chunk; the overlap warms up the filters and speed windows
+    tracker.add_position_to_tracks(tracks)
+    camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+    ViewTransformer().add_transformed_position_to_tracks(tracks)
+
+    # Align the speed windows with the ones a single pass over the whole video would use
+    speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+    window = speed_and_distance_estimator.frame_window
+    first_window = speed_and_distance_estimator.start_frame
+    speed_and_distance_estimator.start_frame = first_window - decode_start if decode_start <= first_window \
+        else (first_window - decode_start) % window
+    speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+    return tracks
+
+
+def process_chunk(task):
+    """
+    Worker: detection, tracking, camera movement and per-track analytics for one
+    chunk of the video, with frame numbers local to decode_start. Runs in a
+    separate process, so everything it needs comes in the task dict.
+    """
+    decode_start, decode_end = task['decode_start'], task['decode_end']
+    tracker = Tracker(task['model_path'])
+    tracker.batch_size = task['batch_size']
+    if task['detect_stride'] > 1:
+        tracker.adaptive_stride = AdaptiveStride(max_stride=task['detect_stride'])
+    if task['ball_roi']:
+        tracker.ball_roi_detector = BallROIDetector(tracker.model, roi_size=task['ball_roi'])
+    team_assigner = TeamAssigner()
+    is_ball = IsBall()
+    camera_movement_estimator = None
+
+    tracks = {"players": [], "referees": [], "ball": []}
+    camera_movement_per_frame = []
+    color_samples = {}  # track id -> sampled shirt colours
+    sightings = Counter()
+    ball_candidates = []
+
+    for chunk in read_video_chunks(task['video_path'], task['chunk_size'], decode_start, decode_end):
+        start_frame = len(tracks['players'])
+        if camera_movement_estimator is None:
+            camera_movement_estimator = CameraMovementEstimator(chunk[0], fast=task['fast_camera_movement'])
+
+        extend_tracks(tracks, tracker.get_object_tracks(chunk))
+        for frame_num, frame in enumerate(chunk, start=start_frame):
+            camera_movement_per_frame.append(camera_movement_estimator.update_camera_movement(frame))
+
+            # Sample each track's colour every vote_every sightings, as TeamAssigner does
+            players = tracks['players'][frame_num]
+            to_sample = [player_id for player_id in players if sightings[player_id] % team_assigner.vote_every == 0]
+            sightings.update(players.keys())
+            if to_sample:
+                colors = team_assigner.get_player_colors(frame, [players[player_id]['bbox'] for player_id in to_sample])
+                for player_id, color in zip(to_sample, colors):
+                    color_samples.setdefault(player_id, []).append(color)
+
+        ball_candidates.append(is_ball.get_candidate_stats(chunk, tracks['ball'], start_frame))
+
+    if camera_movement_estimator is None:
+        # CAP_PROP_FRAME_COUNT can overestimate the length, leaving a chunk past the last frame
+        return {
+            'decode_start': decode_start,
+            'tracks': tracks,
+            'camera_movement': [],
+            'color_samples': {},
+            'ball_frame_nums': np.zeros(0, dtype=np.int64),
+            'ball_color_stats': np.zeros((0, 4), dtype=np.float32),
+            'detect_stride': None,
+            'ball_roi': None,
+        }
+
+    analyze_chunk(tracker, camera_movement_estimator, tracks, camera_movement_per_frame, decode_start, task['fps'])
+
+    return {
+        'decode_start': decode_start,
+        'tracks': tracks,
+        'camera_movement': camera_movement_per_frame,
+        'color_samples': {player_id: np.array(colors) for player_id, colors in color_samples.items()},
+        'ball_frame_nums': np.concatenate([frame_nums for frame_nums, _ in ball_candidates]) + decode_start,
+        'ball_color_stats': np.concatenate([color_stats for _, color_stats in ball_candidates]),
+        'detect_stride': tracker.adaptive_stride.report() if tracker.adaptive_stride is not None else None,
+        'ball_roi': tracker.ball_roi_detector.report() if tracker.ball_roi_detector is not None else None,
+    }
+
+
+class ChunkedPipeline(StreamingPipeline):
+    """
+    Parallel version of StreamingPipeline for long matches.
+
+    The match is split into chunks of chunk_frames frames, each decoded with
+    overlap_frames of context on both sides and processed by process_chunk in a
+    process pool. The results are stitched in the parent:
+    - ByteTrack ids are matched to the previous chunk by box IoU over the overlap,
+    - camera movement and tracks of every frame come from the chunk owning it,
+    - cumulative distances are offset so they continue across chunk boundaries,
+    - teams come from one clustering of the colour samples of all chunks.
+    Match-level analytics and rendering then run as in StreamingPipeline.
+    """
+    def __init__(self, model_path, num_workers=None, chunk_frames=1500, overlap_frames=48, iou_threshold=0.5,
+                 min_matched_frames=3, **kwargs):
+        super().__init__(model_path, **kwargs)
+        self.num_workers = num_workers or os.cpu_count()
+        self.chunk_frames = chunk_frames
+        self.overlap_frames = overlap_frames
+        self.iou_threshold = iou_threshold
+        self.min_matched_frames = min_matched_frames
+
+    def process_frames(self, input_video_path):
+        # Detection runs in the workers; the parent only interpolates and draws, so it loads no model
+        self.tracker = Tracker(None)
+        self.is_ball = IsBall()
+        self.ball_candidates = []
+        self.fps = get_video_fps(input_video_path)
+
+        chunks = plan_chunks(get_video_frame_count(input_video_path), self.chunk_frames, self.overlap_frames)
+        tasks = [dict(video_path=input_video_path, model_path=self.model_path, batch_size=self.batch_size,
+                      chunk_size=self.chunk_size, fast_camera_movement=self.fast_camera_movement, fps=self.fps,
+                      detect_stride=self.detect_stride, ball_roi=self.ball_roi,
+                      decode_start=decode_start, decode_end=decode_end)
+                 for _, _, decode_start, decode_end in chunks]
+
+        with ProcessPoolExecutor(max_workers=min(self.num_workers, max(len(tasks), 1))) as pool:
+            results = list(pool.map(process_chunk, tasks))
+        # Chunks planned past the real end of the video decode nothing
+        kept = [(chunk, result) for chunk, result in zip(chunks, results) if result['camera_movement']]
+        chunks, results = [chunk for chunk, _ in kept], [result for _, result in kept]
+
+        stride_reports = [result['detect_stride'] for result in results if result['detect_stride'] is not None]
+        if stride_reports:
+            keyframes, frames = sum(report['keyframes'] for report in stride_reports), sum(report['frames'] for report in stride_reports)
+            print(f"Detector ran on {keyframes}/{frames} frames (duty cycle {keyframes / max(frames, 1):.0%})")
+        ball_roi_reports = [result['ball_roi'] for result in results if result['ball_roi'] is not None]
+        if ball_roi_reports:
+            ball_frames, frames = sum(report['ball_frames'] for report in ball_roi_reports), sum(report['frames'] for report in ball_roi_reports)
+            print(f"Ball found on {ball_frames}/{frames} frames, {sum(report['roi_passes'] for report in ball_roi_reports)} ROI passes")
+
+        # Only used for drawing the camera movement overlay
+        for chunk in read_video_chunks(input_video_path, 1, 0, 1):
+            self.camera_movement_estimator = CameraMovementEstimator(chunk[0], fast=self.fast_camera_movement)
+        return self.stitch_chunks(chunks, results)
+
+    def match_track_ids(self, tracks, chunk_tracks, frame_range, decode_start):
+        # local id -> id in tracks, for tracks whose boxes overlap over the shared frames
+        votes = Counter()
+        for frame_num in frame_range:
+            previous, current = tracks[frame_num], chunk_tracks[frame_num - decode_start]
+            if not previous or not current:
+                continue
+            previous_ids, current_ids = list(previous), list(current)
+            iou = get_iou_matrix([previous[track_id]['bbox'] for track_id in previous_ids],
+                                 [current[track_id]['bbox'] for track_id in current_ids])
+            for i, j in zip(*np.nonzero(iou >= self.iou_threshold)):
+                votes[(current_ids[j], previous_ids[i])] += 1
+
+        id_map, used = {}, set()
+        for (local_id, track_id), count in votes.most_common():
+            if count < self.min_matched_frames or local_id in id_map or track_id in used:
+                continue
+            id_map[local_id] = track_id
+            used.add(track_id)
+        return id_map
+
+    def get_distance_offsets(self, tracks, chunk_tracks, id_map, frame_range, decode_start):
+        # Global minus local cumulative distance at the last shared frame where both were measured
+        offsets = {}
+        for frame_num in reversed(frame_range):
+            current = chunk_tracks[frame_num - decode_start]
+            for local_id, track_id in id_map.items():
+                if track_id in offsets or local_id not in current or track_id not in tracks[frame_num]:
+                    continue
+                distance, local_distance = tracks[frame_num][track_id].get('distance'), current[local_id].get('distance')
+                if distance is not None and local_distance is not None:
+                    offsets[track_id] = distance - local_distance
+        return offsets
+
+    def stitch_chunks(self, chunks, results):
+        tracks = {"players": [], "referees": [], "ball": []}
+        camera_movement_per_frame = []
+        color_samples = {}
+        next_id = 1
+
+        for (owned_start, owned_end, _, _), result in zip(chunks, results):
+            decode_start = result['decode_start']
+            owned_end = min(owned_end, decode_start + len(result['camera_movement']))
+            shared_frames = range(decode_start, min(owned_start, len(tracks['players']), owned_end))
+
+            # Players and referees share the ByteTrack id space; the ball is always id 1
+            id_map, offsets = {}, {}
+            for object in ("players", "referees"):
+                object_map = self.match_track_ids(tracks[object], result['tracks'][object], shared_frames, decode_start)
+                offsets.update(self.get_distance_offsets(tracks[object], result['tracks'][object], object_map, shared_frames, decode_start))
+                id_map.update(object_map)
+            for frames in (result['tracks']['players'], result['tracks']['referees']):
+                for frame in frames[owned_start - decode_start:owned_end - decode_start]:
+                    for local_id in frame:
+                        if local_id not in id_map:
+                            id_map[local_id] = next_id
+                            next_id += 1
+
+            for object, object_tracks in result['tracks'].items():
+                for frame in object_tracks[owned_start - decode_start:owned_end - decode_start]:
+                    if object == "ball":
+                        tracks[object].append(frame)
+                        continue
+                    stitched = {}
+                    for local_id, track_info in frame.items():
+                        track_id = id_map[local_id]
+                        if track_info.get('distance') is not None:
+                            track_info['distance'] += offsets.get(track_id, 0)
+                        stitched[track_id] = track_info
+                    tracks[object].append(stitched)
+
+            camera_movement_per_frame.extend(result['camera_movement'][owned_start - decode_start:owned_end - decode_start])
+            for local_id, colors in result['color_samples'].items():
+                if local_id in id_map:
+                    color_samples.setdefault(id_map[local_id], []).append(colors)
+
+            owned = (result['ball_frame_nums'] >= owned_start) & (result['ball_frame_nums'] < owned_end)
+            self.ball_candidates.append((result['ball_frame_nums'][owned], result['ball_color_stats'][owned]))
+
+        self.assign_teams(tracks['players'], {track_id: np.concatenate(colors) for track_id, colors in color_samples.items()})
+        return tracks, camera_movement_per_frame
+
+    def assign_teams(self, player_tracks, color_samples):
+        # One team clustering over the colour samples of every chunk, then a majority vote per track.
+        # Tracks without colour samples get team 0 (unknown) and no team colour.
+        self.team_assigner = TeamAssigner()
+        all_colors = np.concatenate(list(color_samples.values())) if color_samples else np.zeros((0, 3))
+        player_teams = {}
+        if len(all_colors) >= 2:
+            kmeans = KMeans(n_clusters=2, init="k-means++", n_init=10).fit(all_colors)
+            self.team_assigner.kmeans = kmeans
+            self.team_assigner.team_colors = {1: kmeans.cluster_centers_[0].astype(np.float64), 2: kmeans.cluster_centers_[1].astype(np.float64)}
+            player_teams = {track_id: Counter(self.team_assigner.predict_teams(colors).tolist()).most_common(1)[0][0]
+                            for track_id, colors in color_samples.items() if len(colors)}
+
+        for frame in player_tracks:
+            for track_id, track_info in frame.items():
+                team = player_teams.get(track_id, 0)
+                track_info['team'] = team
+                if team != 0:
+                    track_info['team_color'] = self.team_assigner.team_colors[team]
+
+    def analyze_tracks(self, tracks, camera_movement_per_frame, fps=24):
+        # Positions, camera adjustment, pitch positions, speed and distance came from the workers
+        self.is_ball.frame_rate = fps
+        ball_frame_nums = np.concatenate([frame_nums for frame_nums, _ in self.ball_candidates])
+        ball_color_stats = np.concatenate([color_stats for _, color_stats in self.ball_candidates])
+        self.is_ball.filter_ball_tracks(tracks['ball'], ball_frame_nums, ball_color_stats)
+        tracks["ball"] = self.tracker.interpolate_ball_positions(tracks["ball"])
+
+        # Ball speed needs the interpolated positions, so it is measured here over the whole match
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        self.speed_and_distance_estimator.add_speed_and_distance_to_tracks({"ball": tracks["ball"]})
+
+        return self.analyze_match(tracks, fps)
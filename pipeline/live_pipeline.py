@@ -0,0 +1,331 @@
+import collections
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import VideoSink, FrameBuffer
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from is_ball import IsBall
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from pass_stats_tracker import MatchStats
+from trackers import BallSmoother
+from .profiler import StageProfiler
+from .stages import assign_player_teams, assign_ball_possession, build_frame_renderer
+
+
+class FrameCapture(threading.Thread):
+    """
+    Live frame source: a camera index, a stream URL or a local file. A file is
+    replayed at its frame rate by wall clock (realtime=True), so it behaves like
+    a live feed for testing. Frames wait in a queue of max_queue; when the
+    consumer falls behind, the oldest waiting frame is dropped, as on a live feed.
+    Items are (frame_num, capture_time, frame) with perf_counter capture times.
+    """
+    def __init__(self, source, realtime=True, max_queue=4, fps=None):
+        super().__init__(daemon=True)
+        self.source = int(source) if str(source).isdigit() else source
+        self.cap = cv2.VideoCapture(self.source)
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 24
+        # Cameras and streams deliver frames at their own rate; only files need pacing
+        self.realtime = realtime and isinstance(self.source, str) and '://' not in self.source
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.end = object()
+
+    def run(self):
+        start_time = time.perf_counter()
+        frame_num = 0
+        while not self.stop_event.is_set():
+            if self.realtime:
+                time.sleep(max(start_time + frame_num / self.fps - time.perf_counter(), 0))
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            item = (frame_num, time.perf_counter(), frame)
+            while True:
+                try:
+                    self.frames.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+            frame_num += 1
+        self.cap.release()
+        self.frames.put(self.end)
+
+    def get(self):
+        # The next waiting frame, or None once the source is exhausted
+        item = self.frames.get()
+        return None if item is self.end else item
+
+    def pending(self):
+        return self.frames.qsize()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class LivePipeline:
+    """
+    Low-latency version of main() for a live feed. Every stage only uses the
+    frames seen so far:
+    - detection and ByteTrack run frame by frame,
+    - Kalman positions, camera movement, view transform and team votes are causal,
+    - ball candidates are validated against the past only (IsBall.validate_live_candidate)
+      and gaps of up to ball_max_gap frames are filled by a fixed-lag BallSmoother,
+    - speed and distance are updated from the trailing window
+      (SpeedAndDistance_Estimator.add_speed_and_distance_to_frame),
+    - ball speed, possession and pass stats follow once the smoother has released
+      the frame's ball, and are appended to a MatchStats.
+    A frame is rendered and emitted once its ball is final and lag_frames more
+    frames are; one frame of lag is what a pass needs to be counted (it ends on
+    the next frame). The delay is therefore at most ball_max_gap + lag_frames frames.
+
+    Each frame has a latency budget in seconds from capture: a frame that is over
+    budget when it is taken from the capture queue is dropped if a newer frame is
+    waiting, so the pipeline skips ahead instead of falling further behind.
+    """
+    def __init__(self, model_path, latency_budget=0.25, lag_frames=1, max_queue=4, realtime=True, ball_max_gap=6,
+                 fast_camera_movement=True, detections=None, profiler=None, latency_samples=10000):
+        self.model_path = model_path
+        self.latency_budget = latency_budget
+        self.lag_frames = lag_frames
+        self.max_queue = max_queue
+        self.realtime = realtime
+        self.ball_max_gap = ball_max_gap
+        self.fast_camera_movement = fast_camera_movement
+        # Precomputed tracks indexed by source frame (e.g. a stub), used instead of the model for replay tests
+        self.detections = detections
+        self.profiler = profiler or StageProfiler()
+        # Latency percentiles come from a uniform reservoir of at most this many frames
+        self.latency_samples = latency_samples
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stage_seconds = collections.Counter()
+        self.latencies = []
+        self.latency_count = 0
+        self.latency_max = 0.0
+        self.rng = np.random.default_rng(0)
+        self.processed_frames = 0
+        self.dropped = 0
+        self.over_budget = 0
+        self.capture_dropped = 0
+
+    def reset(self, first_frame, fps):
+        self.fps = fps
+        self.tracker = Tracker(self.model_path if self.detections is None else None)
+        self.team_assigner = TeamAssigner()
+        self.player_assigner = PlayerBallAssigner()
+        self.camera_movement_estimator = CameraMovementEstimator(first_frame, fast=self.fast_camera_movement)
+        self.view_transformer = ViewTransformer()
+        self.is_ball = IsBall(frame_rate=fps)
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        self.match_stats = MatchStats()
+        self.ball_smoother = BallSmoother(max_gap=self.ball_max_gap)
+
+        # Everything below is indexed by processed frame; source_frames maps back to the capture.
+        # Frames are released once emitted and final (release_frames), so memory stays bounded
+        self.tracks = {"players": FrameBuffer(), "referees": FrameBuffer(), "ball": FrameBuffer()}
+        self.camera_movement_per_frame = FrameBuffer()
+        # Team of the last ball holder; the possession history itself lives in match_stats
+        self.team_in_control = 0
+        self.source_frames = FrameBuffer()
+        self.ball_frames = 0  # Frames whose ball the smoother has released
+
+        self.renderer = build_frame_renderer(self.tracks, self.camera_movement_per_frame, self.tracker,
+                                             self.camera_movement_estimator, self.speed_and_distance_estimator, self.match_stats)
+        self.pending = collections.deque()  # (frame_num, capture_time, frame) waiting for their lag
+
+    def detect(self, source_frame, frame):
+        if self.detections is not None:
+            for object, object_tracks in self.detections.items():
+                frame_tracks = object_tracks[source_frame] if source_frame < len(object_tracks) else {}
+                self.tracks[object].append({track_id: {'bbox': track_info['bbox']} for track_id, track_info in frame_tracks.items()})
+            return
+        self.tracker.add_detection_to_tracks(self.tracks, self.tracker.model.predict([frame], conf=0.1, verbose=False)[0])
+
+    def update_ball(self, frame_num, source_frame, frame):
+        # Validate the candidate, then let the smoother fill gaps; returns the number of frames released
+        balls = self.tracks['ball'][frame_num]
+        ball = balls.get(1)
+        if ball is not None and not self.is_ball.validate_live_candidate(ball, self.is_ball.get_color_stats(frame, ball['bbox']), source_frame):
+            del balls[1]
+        return len(self.ball_smoother.update(source_frame, balls))
+
+    def finalize_ball_frame(self, frame_num):
+        # Stages that need the final ball of the frame
+        self.speed_and_distance_estimator.add_speed_and_distance_to_frame({'ball': self.tracks['ball']}, frame_num,
+                                                                          self.source_frames[frame_num] / self.fps)
+        team = int(assign_ball_possession(self.tracks, self.player_assigner, frame_num, frame_num + 1)[0])
+        team = self.team_in_control = team or self.team_in_control
+        players = self.tracks['players'][frame_num]
+        carrier = next((player_id for player_id, player in players.items() if player.get('has_ball', False)), -1)
+        carrier_team = players[carrier].get('team', 0) if carrier != -1 else 0
+        self.match_stats.append(team, carrier, carrier_team, self.tracks['ball'][frame_num].get(1, {}).get('position_transformed'))
+
+    def finalize_ball_frames(self, count):
+        start = time.perf_counter()
+        for frame_num in range(self.ball_frames, self.ball_frames + count):
+            self.finalize_ball_frame(frame_num)
+        self.ball_frames += count
+        self.stage_seconds['ball_possession'] += time.perf_counter() - start
+
+    def process_frame(self, source_frame, frame):
+        # Run every causal stage on one frame; returns its processed frame index
+        frame_num = len(self.source_frames)
+        self.source_frames.append(source_frame)
+        self.processed_frames += 1
+        timings = []
+
+        def timed(stage, function, *args):
+            start = time.perf_counter()
+            result = function(*args)
+            timings.append((stage, time.perf_counter() - start))
+            return result
+
+        timed('detection', self.detect, source_frame, frame)
+        self.camera_movement_per_frame.append(timed('camera_movement', self.camera_movement_estimator.update_camera_movement, frame))
+
+        def positions():
+            self.tracker.add_position_to_tracks(self.tracks, start_frame=frame_num)
+            self.camera_movement_estimator.add_adjust_positions_to_tracks(self.tracks, self.camera_movement_per_frame, start_frame=frame_num)
+            self.view_transformer.add_transformed_position_to_tracks(self.tracks, frame_num, frame_num + 1)
+        timed('positions', positions)
+        released = timed('ball', self.update_ball, frame_num, source_frame, frame)
+        timed('speed_and_distance', self.speed_and_distance_estimator.add_speed_and_distance_to_frame,
+              {'players': self.tracks['players']}, frame_num, source_frame / self.fps)
+
+        def teams():
+            # The team colours are clustered on the first frame with enough players
+            if self.team_assigner.team_colors or len(self.tracks['players'][frame_num]) >= 2:
+                assign_player_teams(self.team_assigner, [frame], self.tracks['players'], frame_num)
+        timed('team_assignment', teams)
+
+        for stage, seconds in timings:
+            self.stage_seconds[stage] += seconds
+        self.finalize_ball_frames(released)
+        return frame_num
+
+    def emit(self, sink=None, stats_callback=None, flush=False):
+        # Render and emit the frames whose ball is final and whose lag has passed
+        while self.pending and (flush or self.ball_frames - self.pending[0][0] > self.lag_frames):
+            frame_num, capture_time, frame = self.pending.popleft()
+            start = time.perf_counter()
+            self.renderer.render_frame(frame, frame_num)
+            if sink is not None:
+                sink.write(frame)
+            self.stage_seconds['render'] += time.perf_counter() - start
+            if stats_callback is not None:
+                stats_callback(dict(self.match_stats.snapshot(frame_num), source_frame=self.source_frames[frame_num]), frame)
+            self.record_latency(time.perf_counter() - capture_time)
+        self.release_frames()
+
+    def release_frames(self):
+        # Emitted frames with a final ball are not read again: the Kalman filters, camera
+        # movement, team votes and live speed windows keep their own state
+        release = min(self.pending[0][0] if self.pending else len(self.source_frames), self.ball_frames)
+        for frames in (*self.tracks.values(), self.camera_movement_per_frame, self.source_frames):
+            frames.release_before(release)
+        self.match_stats.release_before(release)
+
+    def record_latency(self, latency):
+        # Reservoir sampling keeps a uniform sample of the session's latencies in bounded memory
+        self.latency_count += 1
+        self.latency_max = max(self.latency_max, latency)
+        if len(self.latencies) < self.latency_samples:
+            self.latencies.append(latency)
+        else:
+            index = self.rng.integers(self.latency_count)
+            if index < self.latency_samples:
+                self.latencies[index] = latency
+
+    def run(self, source, output_video_path=None, stats_callback=None, max_frames=None):
+        """
+        Process a live source until it ends (or max_frames frames were captured).
+        Annotated frames go to output_video_path when given, and
+        stats_callback(snapshot, annotated_frame) is called for every emitted frame.
+        Returns the latency report.
+        """
+        self.reset_stats()
+        capture = FrameCapture(source, realtime=self.realtime, max_queue=self.max_queue)
+        if not capture.cap.isOpened():
+            capture.cap.release()
+            raise IOError(f"Cannot open live source {source!r} (camera index, stream URL or video file)")
+        sink = VideoSink(output_video_path, capture.fps) if output_video_path else None
+        capture.start()
+        started = False
+        with self.profiler.stage('live') as stage:
+            try:
+                while True:
+                    item = capture.get()
+                    if item is None:
+                        break
+                    source_frame, capture_time, frame = item
+                    if max_frames is not None and source_frame >= max_frames:
+                        break
+                    if not started:
+                        self.reset(frame, capture.fps)
+                        started = True
+
+                    # Over budget: skip to a newer frame if one is waiting
+                    if time.perf_counter() - capture_time > self.latency_budget and capture.pending() > 0:
+                        self.dropped += 1
+                        continue
+
+                    frame_num = self.process_frame(source_frame, frame)
+                    self.pending.append((frame_num, capture_time, frame))
+                    self.emit(sink, stats_callback)
+                    if time.perf_counter() - capture_time > self.latency_budget:
+                        self.over_budget += 1
+                if started:
+                    self.finalize_ball_frames(len(self.ball_smoother.flush()))
+                    self.emit(sink, stats_callback, flush=True)
+            finally:
+                capture.stop()
+                if sink is not None:
+                    sink.release()
+            self.capture_dropped = capture.dropped
+            report = self.report()
+            # The per-frame stage times are summed by the loop; record them as children of 'live'
+            stage['frames'] = report['processed_frames']
+            stage.update({key: value for key, value in report.items() if key != 'stage_ms_per_frame'})
+            for name, seconds in self.stage_seconds.items():
+                self.profiler.add_stage(name, seconds, frames=report['processed_frames'],
+                                        ms_per_frame=report['stage_ms_per_frame'][name])
+
+        return report
+
+    def report(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        processed = self.processed_frames
+        return {
+            'processed_frames': processed,
+            'dropped_over_budget': self.dropped,
+            'dropped_at_capture': self.capture_dropped,
+            'emitted_over_budget': self.over_budget,
+            'latency_budget': self.latency_budget,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)),
+            'latency_max': float(self.latency_max),
+            'stage_ms_per_frame': {stage: seconds / max(processed, 1) * 1000 for stage, seconds in self.stage_seconds.items()},
+        }
+
+    def print_report(self, report):
+        print(f"Live: {report['processed_frames']} frames processed, {report['dropped_over_budget']} dropped over budget, "
+              f"{report['dropped_at_capture']} dropped at capture")
+        print(f"Latency p50 {report['latency_p50'] * 1000:.0f} ms, p95 {report['latency_p95'] * 1000:.0f} ms, "
+              f"max {report['latency_max'] * 1000:.0f} ms (budget {report['latency_budget'] * 1000:.0f} ms)")
+        for stage, ms in report['stage_ms_per_frame'].items():
+            print(f"  {stage:<20}{ms:>8.2f} ms/frame")
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def get_peak_rss_mb():
+    # High-water mark of the process resident set size
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+
+
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Minimal statistical profiler: a daemon thread samples the stack of the
+    profiled thread every interval seconds and counts, per pipeline stage, the
+    function on top of the stack (self) and every function on it (cumulative).
+    """
+    def __init__(self, stage_profiler, interval=0.005, thread_id=None):
+        super().__init__(daemon=True)
+        self.stage_profiler = stage_profiler
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.self_counts = {}
+        self.cumulative_counts = {}
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stage = self.stage_profiler.current_stage or '<none>'
+            functions = []
+            while frame is not None:
+                code = frame.f_code
+                functions.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}')
+                frame = frame.f_back
+            self.self_counts.setdefault(stage, Counter())[functions[0]] += 1
+            self.cumulative_counts.setdefault(stage, Counter()).update(set(functions))
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def report(self, top=20):
+        return {stage: {'samples': sum(self.self_counts[stage].values()),
+                        'self': self.self_counts[stage].most_common(top),
+                        'cumulative': self.cumulative_counts[stage].most_common(top)}
+                for stage in self.self_counts}
+
+
+class StageProfiler:
+    """
+    Per-stage instrumentation for a pipeline run.
+
+    with profiler.stage('get_object_tracks', frames=len(video_frames)):
+        ...
+
+    records wall and CPU time, frames per second, the process RSS after the
+    stage and its peak so far, and the change in allocated memory blocks
+    (sys.getallocatedblocks). With sampling=True a SamplingProfiler attributes
+    stack samples to the running stage. write_report() saves everything as JSON.
+    """
+    def __init__(self, sampling=False, sampling_interval=0.005):
+        self.stages = []
+        self.current_stage = None
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.sampler = SamplingProfiler(self, sampling_interval) if sampling else None
+        if self.sampler is not None:
+            self.sampler.start()
+
+    @contextmanager
+    def stage(self, name, frames=None):
+        # Nested stages keep their parent, so their time is not added twice when summing
+        record = {'name': name, 'parent': self.current_stage, 'frames': frames}
+        previous_stage, self.current_stage = self.current_stage, name
+        blocks = sys.getallocatedblocks()
+        start_time, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - start_time
+            record['cpu_seconds'] = time.process_time() - start_cpu
+            record['allocated_blocks_delta'] = sys.getallocatedblocks() - blocks
+            record['rss_mb'] = get_rss_mb()
+            record['peak_rss_mb'] = get_peak_rss_mb()
+            if record['frames'] and record['wall_seconds'] > 0:
+                record['fps'] = record['frames'] / record['wall_seconds']
+            self.stages.append(record)
+            self.current_stage = previous_stage
+
+    def add_stage(self, name, wall_seconds, frames=None, **extra):
+        # Record a stage timed elsewhere (e.g. summed over frames) as a child of the running stage
+        record = {'name': name, 'parent': self.current_stage, 'frames': frames, 'wall_seconds': wall_seconds,
+                  'cpu_seconds': None, 'allocated_blocks_delta': None, 'rss_mb': get_rss_mb(), 'peak_rss_mb': get_peak_rss_mb()}
+        record.update(extra)
+        if frames and wall_seconds > 0:
+            record['fps'] = frames / wall_seconds
+        self.stages.append(record)
+        return record
+
+    def report(self):
+        report = {
+            'wall_seconds': time.perf_counter() - self.start_time,
+            'cpu_seconds': time.process_time() - self.start_cpu,
+            'peak_rss_mb': get_peak_rss_mb(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'stages': self.stages,
+        }
+        if self.sampler is not None:
+            report['sampling'] = self.sampler.report()
+        return report
+
+    def print_report(self):
+        print(f"{'stage':<28}{'wall s':>9}{'cpu s':>9}{'fps':>9}{'peak MB':>10}{'blocks':>10}")
+        for record in self.stages:
+            fps = f"{record['fps']:.1f}" if record.get('fps') else '-'
+            peak = f"{record['peak_rss_mb']:.0f}" if record['peak_rss_mb'] is not None else '-'
+            cpu = f"{record['cpu_seconds']:.2f}" if record['cpu_seconds'] is not None else '-'
+            blocks = record['allocated_blocks_delta'] if record['allocated_blocks_delta'] is not None else '-'
+            print(f"{record['name']:<28}{record['wall_seconds']:>9.2f}{cpu:>9}{fps:>9}{peak:>10}{blocks:>10}")
+
+    def write_report(self, output_path):
+        if self.sampler is not None:
+            self.sampler.stop()
+        with open(output_path, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        print(f"Profile report saved to {output_path}")
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from player_heatmap import HeatmapAccumulator
+from utils import draw_transparent_rect
+from frame_renderer import FrameRenderer
+
+
+def extend_tracks(tracks, chunk_tracks):
+    # Append the per-frame dicts of a chunk to the match-wide tracks
+    for object, object_tracks in chunk_tracks.items():
+        tracks.setdefault(object, []).extend(object_tracks)
+    return tracks
+
+
+def assign_player_teams(team_assigner, frames, player_tracks, start_frame=0, frame_scale=1.0):
+    # frames[i] is the frame for player_tracks[start_frame + i], possibly downscaled by frame_scale
+    if not team_assigner.team_colors:
+        team_assigner.assign_team_color(frames[0], player_tracks[start_frame], frame_scale)
+
+    for frame_num, frame in enumerate(frames, start=start_frame):
+        # All players of a frame are assigned in one batch
+        teams = team_assigner.get_player_teams(frame, player_tracks[frame_num], frame_scale)
+        for player_id, team in teams.items():
+            player_tracks[frame_num][player_id]['team'] = team
+            player_tracks[frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
+
+
+def assign_ball_possession(tracks, player_assigner, start_frame=0, end_frame=None):
+    # Assign the ball for a whole frame range at once and mark the holders with has_ball
+    player_tracks = tracks['players'][start_frame:end_frame]
+    ball_tracks = tracks['ball'][start_frame:end_frame]
+    player_ids, player_teams, player_bboxes, ball_centers = player_assigner.stack_tracks(player_tracks, ball_tracks)
+    assigned_players, team_ball_control = player_assigner.assign_ball_to_players(player_ids, player_bboxes, ball_centers, player_teams)
+
+    for frame_num in np.flatnonzero(assigned_players != -1):
+        player_tracks[frame_num][assigned_players[frame_num]]['has_ball'] = True
+
+    return team_ball_control
+
+
+def draw_pass_stats(frame, live_stats):
+    # Draw stats on the frame with a semi-transparent background
+    font = cv2.FONT_HERSHEY_DUPLEX
+    font_scale = 0.5
+    font_color = (0, 0, 0)
+    line_type = 1
+
+    # Determine the background rectangle dimensions
+    frame_height = frame.shape[0] - 100
+    y_offset = frame_height - (len(live_stats) * 20 + 10)
+    rect_height = len(live_stats) * 20 + 20
+    rect_width = 450
+
+    # Draw semi-transparent rectangle
+    draw_transparent_rect(
+        frame,
+        (10, y_offset - 10),
+        (10 + rect_width, y_offset + rect_height - 10),
+        (255, 255, 255),
+        0.4,
+    )
+
+    # Draw stats text on top of the semi-transparent background
+    for line in live_stats:
+        cv2.putText(
+            frame,
+            line,
+            (20, y_offset),
+            font,
+            font_scale,
+            font_color,
+            line_type,
+        )
+        y_offset += 18  # Adjust spacing between lines
+
+    return frame
+
+
+def save_heatmaps(tracks, pitch_image_path="images/football_pitch.png", output_dir="output_images", heatmap=None, pitch_offset=None):
+    # One pass over the tracks fills the team and all-player layers (or pass a merged HeatmapAccumulator).
+    # The pitch image is only used when pitch_offset places the calibrated area on it.
+    if heatmap is None:
+        heatmap = HeatmapAccumulator().add_tracks(tracks['players'])
+    pitch_image = heatmap.load_pitch_image(pitch_image_path, pitch_offset=pitch_offset)
+
+    for team in sorted(heatmap.teams):
+        output_path = f"{output_dir}/team_{team}_heatmap.png"
+        heatmap.save_heatmap_on_pitch(output_path, pitch_image, team=team)
+        print(f"Heatmap for team {team} saved at {output_path}")
+
+    output_path_all = f"{output_dir}/all_players_heatmap.png"
+    heatmap.save_heatmap_on_pitch(output_path_all, pitch_image)
+    print(f"Heatmap for all players saved at {output_path_all}")
+
+
+def build_frame_renderer(tracks, camera_movement_per_frame, tracker,
+                         camera_movement_estimator, speed_and_distance_estimator, match_stats):
+    # Same layers and order as the separate draw passes: pass stats, tracks and
+    # ball control, camera movement, speed and distance
+    return FrameRenderer([
+        lambda frame, frame_num: draw_pass_stats(frame, match_stats.get_live_stats(frame_num)),
+        lambda frame, frame_num: tracker.draw_frame_annotations(frame, frame_num, tracks, match_stats),
+        lambda frame, frame_num: camera_movement_estimator.draw_frame_camera_movement(frame, camera_movement_per_frame[frame_num]),
+        lambda frame, frame_num: speed_and_distance_estimator.draw_frame_speed_and_distance(frame, frame_num, tracks),
+    ])
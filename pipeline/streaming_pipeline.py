@@ -0,0 +1,216 @@
+import itertools
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_chunks, get_video_fps, VideoSink, VideoDecoder
+from trackers import Tracker, AdaptiveStride, BallROIDetector
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from is_ball import IsBall
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from pass_stats_tracker import MatchStats
+from tactical_analysis.pass_network import PassNetwork
+from tactical_analysis.space_occupancy_analyzer import SpaceOccupancyAnalyzer
+from .profiler import StageProfiler
+from .stages import extend_tracks, assign_player_teams, assign_ball_possession, save_heatmaps, build_frame_renderer
+
+
+class StreamingPipeline:
+    """
+    Bounded-memory version of main(): frames are decoded and processed in chunks
+    and never held for the whole video.
+
+    Pass 1 decodes the video once and runs detection/tracking, camera movement and
+    team colour assignment chunk by chunk, keeping only the (small) tracks.
+    The track analytics then run on the whole match, and pass 2 decodes the video
+    again, annotating each chunk and writing it straight to the encoder.
+    """
+    def __init__(self, model_path, chunk_size=100, fast_camera_movement=False, overlap_stages=False, batch_size=20,
+                 cache=None, pitch_image_path="images/football_pitch.png", output_image_dir="output_images", profiler=None,
+                 detect_stride=1, ball_roi=0):
+        self.model_path = model_path
+        self.chunk_size = chunk_size
+        self.fast_camera_movement = fast_camera_movement
+        # Run decode, inference and tracking concurrently (Tracker.get_object_tracks_pipelined)
+        self.overlap_stages = overlap_stages
+        self.batch_size = batch_size
+        # Optional StageCache for the pass 1 tracks and camera movement
+        self.cache = cache
+        self.pitch_image_path = pitch_image_path
+        self.output_image_dir = output_image_dir
+        self.profiler = profiler or StageProfiler()
+        # Above 1, detection runs on adaptive keyframes (AdaptiveStride) at most this many frames apart
+        self.detect_stride = detect_stride
+        # Above 0, the ball is re-detected on a window of this size around its prediction (BallROIDetector)
+        self.ball_roi = ball_roi
+
+    def process_frames(self, input_video_path):
+        # Pass 1: decode -> detect/track -> camera movement -> team colours
+        self.tracker = Tracker(self.model_path)
+        self.tracker.batch_size = self.batch_size
+        if self.detect_stride > 1:
+            self.tracker.adaptive_stride = AdaptiveStride(max_stride=self.detect_stride)
+        if self.ball_roi:
+            self.tracker.ball_roi_detector = BallROIDetector(self.tracker.model, roi_size=self.ball_roi)
+        self.team_assigner = TeamAssigner()
+        self.camera_movement_estimator = None
+        # Ball candidate crop statistics, gathered while the frames are decoded
+        self.is_ball = IsBall()
+        self.ball_candidates = []
+
+        if self.cache is not None:
+            cached = self.load_cached_frames_results(input_video_path)
+            if cached is not None:
+                return cached
+
+        # Keyframe decisions and ROI windows depend on the previous frame, so both run in the chunked path
+        if self.overlap_stages and self.tracker.adaptive_stride is None and self.tracker.ball_roi_detector is None:
+            tracks, camera_movement_per_frame = self.process_frames_overlapped(input_video_path)
+        else:
+            tracks, camera_movement_per_frame = self.process_frames_chunked(input_video_path)
+        if self.tracker.adaptive_stride is not None:
+            self.tracker.adaptive_stride.print_report()
+        if self.tracker.ball_roi_detector is not None:
+            self.tracker.ball_roi_detector.print_report()
+
+        if self.cache is not None:
+            # Teams depend on the colour clustering and are not part of the cached tracks
+            self.cache.save_tracks(self.tracks_cache_key, {object: [{track_id: {'bbox': info['bbox']} for track_id, info in frame.items()}
+                                                                    for frame in object_tracks]
+                                                           for object, object_tracks in tracks.items()})
+            self.cache.save_camera_movement(self.camera_cache_key, camera_movement_per_frame)
+
+        return tracks, camera_movement_per_frame
+
+    def load_cached_frames_results(self, input_video_path):
+        # On a hit, the video is only decoded for the team colours
+        self.tracks_cache_key = self.cache.make_key('tracks', input_video_path, self.model_path, **self.tracker.get_cache_params())
+        tracks = self.cache.load_tracks(self.tracks_cache_key)
+        camera_movement_per_frame = None
+
+        start_frame = 0
+        decoder = self.make_decoder(input_video_path, views=('small_bgr',))
+        for decoded_chunk in decoder.chunks(self.chunk_size, view=None):
+            chunk = [decoded.bgr for decoded in decoded_chunk]
+            if self.camera_movement_estimator is None:
+                self.camera_movement_estimator = CameraMovementEstimator(chunk[0], fast=self.fast_camera_movement)
+                self.camera_cache_key = self.cache.make_key('camera_movement', input_video_path,
+                                                            **self.camera_movement_estimator.get_cache_params())
+                camera_movement_per_frame = self.cache.load_camera_movement(self.camera_cache_key)
+                if tracks is None or camera_movement_per_frame is None:
+                    self.camera_movement_estimator = None
+                    return None
+            assign_player_teams(self.team_assigner, [decoded.small_bgr for decoded in decoded_chunk], tracks['players'],
+                                start_frame, frame_scale=decoder.scale)
+            self.ball_candidates.append(self.is_ball.get_candidate_stats(chunk, tracks['ball'], start_frame))
+            start_frame += len(chunk)
+
+        return tracks, camera_movement_per_frame
+
+    def make_decoder(self, input_video_path, views):
+        # Team colours use the half-size frames, and so does the fast camera movement (pyramid level 1)
+        return VideoDecoder(input_video_path, read_ahead=self.chunk_size, views=views, scale=0.5)
+
+    def process_frames_chunked(self, input_video_path):
+        tracks = {"players": [], "referees": [], "ball": []}
+        camera_movement_per_frame = []
+
+        # The camera movement and team colour views are converted on the decoder thread
+        camera_view = 'small_gray' if self.fast_camera_movement else 'gray'
+        decoder = self.make_decoder(input_video_path, views=(camera_view, 'small_bgr'))
+        for decoded_chunk in decoder.chunks(self.chunk_size, view=None):
+            chunk = [decoded.bgr for decoded in decoded_chunk]
+            start_frame = len(tracks["players"])
+            if self.camera_movement_estimator is None:
+                self.camera_movement_estimator = CameraMovementEstimator(chunk[0], fast=self.fast_camera_movement)
+
+            extend_tracks(tracks, self.tracker.get_object_tracks(chunk))
+
+            for decoded in decoded_chunk:
+                camera_movement_per_frame.append(self.camera_movement_estimator.update_camera_movement(decoded.view(camera_view)))
+
+            assign_player_teams(self.team_assigner, [decoded.small_bgr for decoded in decoded_chunk], tracks['players'],
+                                start_frame, frame_scale=decoder.scale)
+            self.ball_candidates.append(self.is_ball.get_candidate_stats(chunk, tracks['ball'], start_frame))
+
+        return tracks, camera_movement_per_frame
+
+    def process_frames_overlapped(self, input_video_path):
+        camera_movement_per_frame = []
+
+        def on_frame(frame_num, frame, tracks):
+            if self.camera_movement_estimator is None:
+                self.camera_movement_estimator = CameraMovementEstimator(frame, fast=self.fast_camera_movement)
+            camera_movement_per_frame.append(self.camera_movement_estimator.update_camera_movement(frame))
+            assign_player_teams(self.team_assigner, [frame], tracks['players'], frame_num)
+            self.ball_candidates.append(self.is_ball.get_candidate_stats([frame], tracks['ball'], frame_num))
+
+        frames = itertools.chain.from_iterable(read_video_chunks(input_video_path, self.chunk_size))
+        tracks = self.tracker.get_object_tracks_pipelined(frames, self.batch_size, queue_size=self.chunk_size, frame_callback=on_frame)
+        return tracks, camera_movement_per_frame
+
+    def analyze_tracks(self, tracks, camera_movement_per_frame, fps=24):
+        self.tracker.add_position_to_tracks(tracks)
+        self.camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+
+        view_transformer = ViewTransformer()
+        view_transformer.add_transformed_position_to_tracks(tracks)
+
+        self.is_ball.frame_rate = fps
+        ball_frame_nums = np.concatenate([frame_nums for frame_nums, _ in self.ball_candidates])
+        ball_color_stats = np.concatenate([color_stats for _, color_stats in self.ball_candidates])
+        self.is_ball.filter_ball_tracks(tracks['ball'], ball_frame_nums, ball_color_stats)
+        tracks["ball"] = self.tracker.interpolate_ball_positions(tracks["ball"])
+
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        self.speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+
+        return self.analyze_match(tracks, fps)
+
+    def analyze_match(self, tracks, fps=24):
+        # Match-level analytics on the finished tracks: possession, pass network, pitch control, heatmaps
+        num_frames = len(tracks['players'])
+        with self.profiler.stage('ball_possession', frames=num_frames):
+            team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner())
+
+        with self.profiler.stage('pass_network', frames=num_frames):
+            pass_network = PassNetwork()
+            pass_network_graph = pass_network.construct_pass_network(tracks['players'], tracks['ball'])
+            pass_network.visualize(pass_network_graph, f'{self.output_image_dir}/pass_network.png')
+
+        with self.profiler.stage('pitch_control', frames=num_frames):
+            space_occupancy_analyzer = SpaceOccupancyAnalyzer(frame_rate=fps)
+            pitch_control_windows, _ = space_occupancy_analyzer.analyze_pitch_control(tracks['players'])
+            space_occupancy_analyzer.visualize_pitch_control(pitch_control_windows[0], f'{self.output_image_dir}/pitch_control.png')
+
+        with self.profiler.stage('heatmaps', frames=num_frames):
+            save_heatmaps(tracks, self.pitch_image_path, self.output_image_dir)
+
+        return team_ball_control
+
+    def render(self, input_video_path, output_video_path, tracks, camera_movement_per_frame, team_ball_control):
+        # Pass 2: decode again, annotate each chunk and encode it right away
+        match_stats = MatchStats.from_tracks(tracks, team_ball_control)
+        fps = get_video_fps(input_video_path)
+
+        renderer = build_frame_renderer(tracks, camera_movement_per_frame, self.tracker,
+                                        self.camera_movement_estimator, self.speed_and_distance_estimator, match_stats)
+
+        with VideoSink(output_video_path, fps) as sink:
+            start_frame = 0
+            for chunk in read_video_chunks(input_video_path, self.chunk_size):
+                start_frame = renderer.render_video(chunk, sink, start_frame)
+
+        match_stats.print_stats()
+
+    def run(self, input_video_path, output_video_path):
+        with self.profiler.stage('process_frames') as stage:
+            tracks, camera_movement_per_frame = self.process_frames(input_video_path)
+            stage['frames'] = num_frames = len(camera_movement_per_frame)
+        with self.profiler.stage('analyze_tracks', frames=num_frames):
+            team_ball_control = self.analyze_tracks(tracks, camera_movement_per_frame, get_video_fps(input_video_path))
+        with self.profiler.stage('render', frames=num_frames):
+            self.render(input_video_path, output_video_path, tracks, camera_movement_per_frame, team_ball_control)
+        return tracks
@@ -1,10 +1,13 @@
+import numpy as np
 import sys 
 sys.path.append('../')
 from utils import get_center_of_bbox, measure_distance, get_bbox_height
 
 class PlayerBallAssigner():
-    def __init__(self):
+    def __init__(self, hysteresis_frames=0):
         self.max_player_ball_distance = 70
+        # A new holder must be the closest player for this many consecutive frames (0 = off)
+        self.hysteresis_frames = hysteresis_frames
     
     def assign_ball_to_player(self,players,ball_bbox):
         avg_player_bbox_height = 0
@@ -35,4 +38,85 @@ class PlayerBallAssigner():
                     miniumum_distance = distance
                     assigned_player = player_id
 
-        return assigned_player
\ No newline at end of file
+        return assigned_player
+
+    def stack_tracks(self, player_tracks, ball_tracks):
+        # Pad the per-frame dicts into (F,P) ids/teams, (F,P,4) boxes and (F,2) ball centres
+        num_frames = len(player_tracks)
+        max_players = max((len(players) for players in player_tracks), default=0)
+        player_ids = np.full((num_frames, max_players), -1, dtype=np.int64)
+        player_teams = np.zeros((num_frames, max_players), dtype=np.int64)
+        player_bboxes = np.full((num_frames, max_players, 4), np.nan)
+        ball_centers = np.full((num_frames, 2), np.nan)
+
+        for frame_num, players in enumerate(player_tracks):
+            for i, (player_id, player) in enumerate(players.items()):
+                player_ids[frame_num, i] = player_id
+                player_teams[frame_num, i] = player.get('team', 0)
+                player_bboxes[frame_num, i] = player['bbox']
+            ball = ball_tracks[frame_num].get(1) if frame_num < len(ball_tracks) else None
+            if ball is not None and len(ball.get('bbox', [])) == 4:
+                x1, y1, x2, y2 = ball['bbox']
+                ball_centers[frame_num] = [(x1 + x2) / 2, (y1 + y2) / 2]
+
+        # get_center_of_bbox truncates to int
+        return player_ids, player_teams, player_bboxes, np.trunc(ball_centers)
+
+    def apply_hysteresis(self, assigned_players, player_ids=None):
+        # The holder is only carried into frames where it is tracked (player_ids row), other frames get -1
+        assigned_players = assigned_players.copy()
+        if self.hysteresis_frames <= 1 or len(assigned_players) == 0:
+            return assigned_players
+        holder = assigned_players[0]
+        candidate, streak = holder, 0
+        for frame_num in range(1, len(assigned_players)):
+            player = assigned_players[frame_num]
+            if player == holder:
+                streak = 0
+            else:
+                streak = streak + 1 if player == candidate else 1
+                candidate = player
+                if streak >= self.hysteresis_frames:
+                    holder, streak = player, 0
+            present = holder == -1 or player_ids is None or (player_ids[frame_num] == holder).any()
+            assigned_players[frame_num] = holder if present else -1
+        return assigned_players
+
+    def assign_ball_to_players(self, player_ids, player_bboxes, ball_centers, player_teams=None):
+        """
+        Batched assign_ball_to_player over a frame range.
+        :param player_ids: (F,P) player ids, -1 for padding.
+        :param player_bboxes: (F,P,4) player boxes.
+        :param ball_centers: (F,2) ball centres, NaN when there is no ball.
+        :param player_teams: Optional (F,P) teams used for the team control array.
+        :return: (F,) assigned player per frame (-1 for none) and, with teams, the (F,)
+                 team in control per frame (last holder's team, 0 before the first possession).
+        """
+        valid = player_ids != -1
+        num_players = valid.sum(axis=1)
+
+        # Adaptive threshold: half the average (int) player height, 70 without players
+        heights = np.where(valid, np.trunc(player_bboxes[..., 3] - player_bboxes[..., 1]), 0)
+        threshold = np.where(num_players > 0, heights.sum(axis=1) / np.maximum(num_players * 2, 1), 70)
+
+        foot_y = player_bboxes[..., 3] - ball_centers[:, None, 1]
+        distance_left = np.hypot(player_bboxes[..., 0] - ball_centers[:, None, 0], foot_y)
+        distance_right = np.hypot(player_bboxes[..., 2] - ball_centers[:, None, 0], foot_y)
+        distance = np.fmin(distance_left, distance_right)
+
+        candidate = valid & (distance < threshold[:, None])
+        distance = np.where(candidate, distance, np.inf)
+        closest = distance.argmin(axis=1) if distance.shape[1] > 0 else np.zeros(len(distance), dtype=np.int64)
+        has_player = candidate.any(axis=1)
+        assigned_players = np.where(has_player, player_ids[np.arange(len(player_ids)), closest] if player_ids.shape[1] > 0 else -1, -1)
+        assigned_players = self.apply_hysteresis(assigned_players, player_ids)
+
+        if player_teams is None:
+            return assigned_players
+
+        # Team of the assigned player, carried forward through frames without one
+        match = (player_ids == assigned_players[:, None]) & (assigned_players[:, None] != -1)
+        assigned_teams = np.where(match.any(axis=1), player_teams[np.arange(len(player_ids)), match.argmax(axis=1)] if player_ids.shape[1] > 0 else 0, 0)
+        last_assigned = np.maximum.accumulate(np.where(assigned_teams > 0, np.arange(len(assigned_teams)), -1)) if len(assigned_teams) else assigned_teams
+        team_ball_control = np.where(last_assigned >= 0, assigned_teams[np.maximum(last_assigned, 0)], 0)
+        return assigned_players, team_ball_control
@@ -1 +1,2 @@
-from .player_heatmap import PlayerHeatmap
\ No newline at end of file
+from .player_heatmap import PlayerHeatmap
+from .heatmap_accumulator import HeatmapAccumulator
\ No newline at end of file
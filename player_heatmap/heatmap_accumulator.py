@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from view_transformer import ViewTransformer
+
+class HeatmapAccumulator:
+    """
+    Occupancy histograms in pitch coordinates.
+
+    position_transformed (metres, x along the pitch length, y across its width) is
+    binned into a grid of cell_size metre cells covering pitch_size, by default the
+    ViewTransformer's calibrated court_length x court_width, giving a total layer plus one layer
+    per team and per player from a single pass over the tracks. Counts stay raw;
+    blurring and colouring only happen when an image is rendered. Accumulators
+    built on separate chunks can be combined with merge().
+
+    The grid is only drawn over the part of the image it covers (pitch_region):
+    the whole canvas of load_pitch_image, which has the grid's aspect ratio, or,
+    given where the calibrated area starts along a full_pitch_size pitch
+    (pitch_offset in metres), its sub-rectangle of the full pitch image.
+    """
+    def __init__(self, pitch_size=None, cell_size=0.5):
+        if pitch_size is None:
+            view_transformer = ViewTransformer()
+            pitch_size = (view_transformer.court_length, view_transformer.court_width)
+        self.pitch_size = pitch_size
+        self.cell_size = cell_size
+        self.grid_shape = (int(np.ceil(pitch_size[1] / cell_size)), int(np.ceil(pitch_size[0] / cell_size)))
+        self.total = np.zeros(self.grid_shape, dtype=np.float32)
+        self.teams = {}
+        self.players = {}
+        self.pitch_region = None  # (x1, y1, x2, y2) pixels of the pitch image the grid covers, None for all of it
+
+    def layer(self, layers, key):
+        if key not in layers:
+            layers[key] = np.zeros(self.grid_shape, dtype=np.float32)
+        return layers[key]
+
+    def add_positions(self, positions, teams, player_ids):
+        # positions: (N,2) metres; teams/player_ids: (N,) with team 0 for unassigned
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        teams = np.asarray(teams)
+        player_ids = np.asarray(player_ids)
+        cols = np.floor(positions[:, 0] / self.cell_size).astype(np.int64)
+        rows = np.floor(positions[:, 1] / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.grid_shape[0]) & (cols >= 0) & (cols < self.grid_shape[1])
+        cells = rows[inside] * self.grid_shape[1] + cols[inside]
+        teams, player_ids = teams[inside], player_ids[inside]
+
+        np.add.at(self.total.reshape(-1), cells, 1)
+        for team in np.unique(teams):
+            if team != 0:
+                np.add.at(self.layer(self.teams, int(team)).reshape(-1), cells[teams == team], 1)
+
+        # Group cells by player once instead of masking per player
+        order = np.argsort(player_ids, kind='stable')
+        unique_ids, starts = np.unique(player_ids[order], return_index=True)
+        for player_id, player_cells in zip(unique_ids, np.split(cells[order], starts[1:])):
+            np.add.at(self.layer(self.players, int(player_id)).reshape(-1), player_cells, 1)
+
+    def add_tracks(self, player_tracks):
+        positions, teams, player_ids = [], [], []
+        for frame_tracks in player_tracks:
+            for player_id, player in frame_tracks.items():
+                position = player.get('position_transformed')
+                if position is None:
+                    continue
+                positions.append(position)
+                teams.append(player.get('team', 0))
+                player_ids.append(player_id)
+        if positions:
+            self.add_positions(positions, teams, player_ids)
+        return self
+
+    def merge(self, other):
+        self.total += other.total
+        for layers, other_layers in ((self.teams, other.teams), (self.players, other.players)):
+            for key, counts in other_layers.items():
+                self.layer(layers, key)
+                layers[key] += counts
+        return self
+
+    def get_layer(self, team=None, player_id=None):
+        if player_id is not None:
+            return self.players.get(player_id, np.zeros(self.grid_shape, dtype=np.float32))
+        if team is not None:
+            return self.teams.get(team, np.zeros(self.grid_shape, dtype=np.float32))
+        return self.total
+
+    def render(self, counts, pitch_image, colormap=cv2.COLORMAP_JET, alpha=0.5):
+        # Upsample the grid to its pitch_region, blur once and overlay as PlayerHeatmap does
+        x1, y1, x2, y2 = self.pitch_region or (0, 0, pitch_image.shape[1], pitch_image.shape[0])
+        pitch_overlay = pitch_image.copy()
+        pitch_overlay[y1:y2, x1:x2] = self.render_region(counts, pitch_image[y1:y2, x1:x2], colormap, alpha)
+        return pitch_overlay
+
+    def render_region(self, counts, pitch_image, colormap, alpha):
+        height, width = pitch_image.shape[:2]
+        heatmap = cv2.resize(counts, (width, height), interpolation=cv2.INTER_LINEAR)
+        blur_radius = max(1, int(min(height, width) / 20) | 1)
+        heatmap = cv2.GaussianBlur(heatmap, (blur_radius, blur_radius), 0)
+        heatmap_normalized = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        heatmap_colored = cv2.applyColorMap(heatmap_normalized, colormap)
+        heatmap_colored = cv2.convertScaleAbs(heatmap_colored, alpha=2.0, beta=30)
+
+        mask = heatmap_normalized > 10
+        pitch_overlay = pitch_image.copy()
+        pitch_overlay[mask] = cv2.addWeighted(pitch_image[mask], 1 - alpha, heatmap_colored[mask], alpha, 0)
+        return pitch_overlay
+
+    def load_pitch_image(self, pitch_image_path=None, pixels_per_metre=20, pitch_offset=None, full_pitch_size=(105, 68)):
+        """
+        Background to render on; sets pitch_region, the part of it the grid covers.
+        Without pitch_offset the placement of the calibrated area on the pitch is
+        unknown, so the background is a black canvas with the grid's aspect ratio.
+        """
+        length, width = self.pitch_size
+        if pitch_offset is not None:
+            pitch_image = cv2.imread(pitch_image_path) if pitch_image_path else None
+            if pitch_image is not None:
+                self.pitch_region = (round(pitch_offset * pixels_per_metre), 0,
+                                     round((pitch_offset + length) * pixels_per_metre), round(width * pixels_per_metre))
+                return cv2.resize(pitch_image, (round(full_pitch_size[0] * pixels_per_metre), round(full_pitch_size[1] * pixels_per_metre)))
+            print("Warning: Pitch image not found. Using black background.")
+        self.pitch_region = None
+        return np.zeros((round(width * pixels_per_metre), round(length * pixels_per_metre), 3), dtype=np.uint8)
+
+    def save_heatmap_on_pitch(self, output_path, pitch_image, team=None, player_id=None):
+        cv2.imwrite(output_path, self.render(self.get_layer(team, player_id), pitch_image))
+        print(f"Heatmap with vivid colors saved to {output_path}")
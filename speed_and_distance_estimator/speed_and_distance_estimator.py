@@ -1,81 +1,188 @@
+import math
 import cv2
+import numpy as np
 import sys 
 sys.path.append('../')
 from utils import measure_distance ,get_foot_position
 
 class SpeedAndDistance_Estimator():
-    def __init__(self):
-        self.frame_window=3
-        self.frame_rate=24
-        self.min_time_elapsed=0.1
-    
-    def add_speed_and_distance_to_tracks(self,tracks):
-        total_distance= {}
+    def __init__(self, frame_rate=24, frame_window=None, min_time_elapsed=0.1, start_frame=5):
+        self.frame_rate=frame_rate
+        self.min_time_elapsed=min_time_elapsed
+        # By default the window is long enough to pass min_time_elapsed at the video frame rate
+        self.frame_window=frame_window or max(3, math.ceil(min_time_elapsed * frame_rate))
+        self.start_frame=start_frame  # Skip first frames for stabilization
+        # Live mode: (object, track id) -> [anchor time, anchor position, speed, distance]
+        self.live_tracks = {}
+
+    def compute_speed_and_distance(self, frame, track_id, positions, num_frames):
+        """
+        Vectorized speed (km/h) and cumulative distance (m) for every row of one object class.
+        :param frame: (R,) frame index of each row.
+        :param track_id: (R,) track id of each row.
+        :param positions: (R,2) transformed positions, NaN where unknown.
+        :param num_frames: Number of frames in the video.
+        :return: (speed, distance) arrays of shape (R,), NaN where nothing was measured.
+
+        Frames are split into windows [s, e) with s = start_frame + k*frame_window and
+        e = min(s + frame_window, num_frames - 1). A track's displacement over a window runs
+        from its first valid position in [s, e) to its last valid position in (first, e],
+        so tracks with gaps are measured over the frames they were actually seen.
+        """
+        frame = np.asarray(frame, dtype=np.int64)
+        track_id = np.asarray(track_id)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        speed = np.full(len(frame), np.nan)
+        distance = np.full(len(frame), np.nan)
+        w = self.frame_window
+
+        track_ids, track_index = np.unique(track_id, return_inverse=True)
+        window = np.where(frame >= self.start_frame, (frame - self.start_frame) // w, -1)
+        num_windows = max((num_frames - self.start_frame + w - 1) // w, 0)
+        window_end = np.minimum(self.start_frame + (np.arange(num_windows) + 1) * w, num_frames - 1)
+
+        # Valid observations ordered by track, then frame
+        valid = (window >= 0) & ~np.isnan(positions).any(axis=1)
+        rows = np.flatnonzero(valid)
+        rows = rows[np.lexsort((frame[rows], track_index[rows]))]
+        if len(rows) == 0 or num_windows == 0:
+            return speed, distance
+
+        group = track_index[rows] * num_windows + window[rows]
+        group_keys, first = np.unique(group, return_index=True)
+        last = np.append(first[1:], len(rows)) - 1
+
+        group_window = group_keys % num_windows
+        group_track = group_keys // num_windows
+        start_rows = rows[first]
+        end_rows = rows[last]
+
+        # The window end frame belongs to the next window; use it when the track was seen there
+        has_next = last + 1 < len(rows)
+        next_rows = rows[np.minimum(last + 1, len(rows) - 1)]
+        use_next = has_next & (track_index[next_rows] == group_track) & (frame[next_rows] == window_end[group_window])
+        end_rows = np.where(use_next, next_rows, end_rows)
+
+        # Rows past the clipped end of the last window are not part of it
+        in_window = frame[end_rows] <= window_end[group_window]
+        start_ok = frame[start_rows] < window_end[group_window]
+        time_elapsed = (frame[end_rows] - frame[start_rows]) / self.frame_rate
+        ok = in_window & start_ok & (time_elapsed >= self.min_time_elapsed) & (time_elapsed > 0)
+
+        distance_covered = np.where(ok, np.linalg.norm(positions[end_rows] - positions[start_rows], axis=1), 0.0)
+        window_speed = np.where(ok, distance_covered / np.where(ok, time_elapsed, 1) * 3.6, np.nan)
+
+        # Cumulative distance per track: groups are sorted by track, so cumsum and subtract the track's start
+        cumulative = np.cumsum(distance_covered)
+        track_start = np.searchsorted(group_track, group_track)
+        cumulative = cumulative - np.append(0, cumulative)[track_start]
+
+        # Every row of the track inside [s, e) gets its window's values
+        row_key = track_index * num_windows + window
+        found = np.searchsorted(group_keys, row_key)
+        found = np.minimum(found, len(group_keys) - 1)
+        assign = (window >= 0) & (group_keys[found] == row_key)
+        assign &= ok[found] & (frame < window_end[group_window[found]])
+        speed[assign] = window_speed[found[assign]]
+        distance[assign] = cumulative[found[assign]]
+        return speed, distance
 
+    def add_speed_and_distance_to_tracks(self,tracks):
         for object, object_tracks in tracks.items():
             if object == "referees":
                 continue
-            
-            number_of_frames = len(object_tracks)
-            
-            for frame_num in range(5, number_of_frames, self.frame_window):  # Skip first 5 frames for stabilization
-                last_frame = min(frame_num + self.frame_window, number_of_frames - 1)
-
-                for track_id, _ in object_tracks[frame_num].items():
-                    if track_id not in object_tracks[last_frame]:
-                        continue
-
-                    start_position = object_tracks[frame_num][track_id]['position_transformed']
-                    end_position = object_tracks[last_frame][track_id]['position_transformed']
 
-                    if start_position is None or end_position is None:
-                        continue
+            # Gather the object's rows into flat arrays
+            track_infos, frame, track_id, positions = [], [], [], []
+            for frame_num, track in enumerate(object_tracks):
+                for tid, track_info in track.items():
+                    position = track_info.get('position_transformed')
+                    track_infos.append(track_info)
+                    frame.append(frame_num)
+                    track_id.append(tid)
+                    positions.append(position if position is not None else (np.nan, np.nan))
 
-                    distance_covered = measure_distance(start_position, end_position)
-                    time_elapsed = (last_frame - frame_num) / self.frame_rate
+            if not track_infos:
+                continue
 
-                    if time_elapsed < self.min_time_elapsed:  # Avoid too small time intervals
-                        continue
+            speed, distance = self.compute_speed_and_distance(frame, track_id, positions, len(object_tracks))
 
-                    speed_meteres_per_second = distance_covered / time_elapsed
-                    speed_km_per_hour = speed_meteres_per_second * 3.6
+            for row in np.flatnonzero(~np.isnan(speed)):
+                track_infos[row]['speed'] = float(speed[row])
+                track_infos[row]['distance'] = float(distance[row])
 
-                    if object not in total_distance:
-                        total_distance[object] = {}
+    def add_speed_and_distance_to_track_store(self, track_store):
+        for object, table in track_store.items():
+            if object == "referees":
+                continue
+            speed, distance = self.compute_speed_and_distance(table.frame, table.track_id,
+                                                              table.get('position_transformed'), table.num_frames)
+            measured = ~np.isnan(speed)
+            table.set('speed', speed[measured], measured)
+            table.set('distance', distance[measured], measured)
 
-                    if track_id not in total_distance[object]:
-                        total_distance[object][track_id] = 0
+    def add_speed_and_distance_to_frame(self, tracks, frame_num, frame_time=None):
+        """
+        Causal version of add_speed_and_distance_to_tracks for live use: only frames
+        up to frame_num are used. A track's speed and distance are updated once at
+        least frame_window frames of time have passed since its previous update
+        (its anchor), from the displacement since the anchor, so they trail the
+        windowed batch values by one window instead of looking ahead.
+        frame_time (seconds) defaults to frame_num / frame_rate; pass the capture
+        time when frames can be dropped.
+        """
+        if frame_num < self.start_frame:
+            return
+        frame_time = frame_num / self.frame_rate if frame_time is None else frame_time
+        window_time = self.frame_window / self.frame_rate
+        for object, object_tracks in tracks.items():
+            if object == "referees":
+                continue
+            for track_id, track_info in object_tracks[frame_num].items():
+                position = track_info.get('position_transformed')
+                if position is None:
+                    continue
+                state = self.live_tracks.get((object, track_id))
+                if state is None:
+                    self.live_tracks[(object, track_id)] = [frame_time, position, None, 0.0]
+                    continue
+                anchor_time, anchor_position, speed, distance = state
+                time_elapsed = frame_time - anchor_time
+                if time_elapsed >= window_time and time_elapsed >= self.min_time_elapsed:
+                    distance_covered = measure_distance(anchor_position, position)
+                    speed = distance_covered / time_elapsed * 3.6
+                    distance += distance_covered
+                    self.live_tracks[(object, track_id)] = [frame_time, position, speed, distance]
+                if speed is not None:
+                    track_info['speed'] = speed
+                    track_info['distance'] = distance
 
-                    total_distance[object][track_id] += distance_covered
+    def draw_frame_speed_and_distance(self,frame,frame_num,tracks):
+        # Draw speed and distance labels of one frame in place
+        for object, object_tracks in tracks.items():
+            if object == "referees":
+                continue 
+            for _, track_info in object_tracks[frame_num].items():
+               if "speed" in track_info:
+                   speed = track_info.get('speed',None)
+                   distance = track_info.get('distance',None)
+                   if speed is None or distance is None:
+                       continue
+                   
+                   bbox = track_info['bbox']
+                   position = get_foot_position(bbox)
+                   position = list(position)
+                   position[1]+=40
 
-                    for frame_num_batch in range(frame_num, last_frame):
-                        if track_id not in tracks[object][frame_num_batch]:
-                            continue
-                        tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour
-                        tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
+                   position = tuple(map(int,position))
+                   cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_DUPLEX,0.5,(0,0,0),1)
+                   cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+20),cv2.FONT_HERSHEY_DUPLEX,0.5,(0,0,0),1)
+        return frame
 
-    
-    def draw_speed_and_distance(self,frames,tracks):
+    def draw_speed_and_distance(self,frames,tracks, start_frame=0):
         output_frames = []
-        for frame_num, frame in enumerate(frames):
-            for object, object_tracks in tracks.items():
-                if object == "referees":
-                    continue 
-                for _, track_info in object_tracks[frame_num].items():
-                   if "speed" in track_info:
-                       speed = track_info.get('speed',None)
-                       distance = track_info.get('distance',None)
-                       if speed is None or distance is None:
-                           continue
-                       
-                       bbox = track_info['bbox']
-                       position = get_foot_position(bbox)
-                       position = list(position)
-                       position[1]+=40
-
-                       position = tuple(map(int,position))
-                       cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_DUPLEX,0.5,(0,0,0),1)
-                       cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+20),cv2.FONT_HERSHEY_DUPLEX,0.5,(0,0,0),1)
+        for frame_num, frame in enumerate(frames, start=start_frame):
+            self.draw_frame_speed_and_distance(frame,frame_num,tracks)
             output_frames.append(frame)
         
-        return output_frames
\ No newline at end of file
+        return output_frames
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import sys
+sys.path.append('../')
+from track_store import TrackStore
+
+# Bump when the layout of cached entries changes; older entries are then ignored
+SCHEMA_VERSION = 1
+
+
+class StageCache:
+    """
+    Content-addressed cache for intermediate pipeline results.
+
+    Entries are keyed by a hash of the video content, the model file and the
+    stage parameters, so a result is only reused for exactly the inputs that
+    produced it. Each entry is a directory of .npy arrays (memory-mapped on load),
+    or a single compressed .npz when compress=True, plus a meta.json with the
+    schema version.
+    The cache is trimmed to max_bytes by evicting the least recently used entries.
+    """
+    def __init__(self, cache_dir='cache', max_bytes=None, compress=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.file_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.file_hash_index_path = os.path.join(cache_dir, 'file_hashes.json')
+        if os.path.exists(self.file_hash_index_path):
+            with open(self.file_hash_index_path) as f:
+                self.file_hashes = json.load(f)
+
+    def hash_file(self, path, chunk_size=1 << 20):
+        # Full content hash, remembered per (path, size, mtime) so large videos are hashed once
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            return f'missing:{path}'
+        stat = os.stat(path)
+        index_key = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        if index_key not in self.file_hashes:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(block)
+            self.file_hashes[index_key] = digest.hexdigest()
+            with open(self.file_hash_index_path, 'w') as f:
+                json.dump(self.file_hashes, f)
+        return self.file_hashes[index_key]
+
+    def make_key(self, stage, video_path=None, model_path=None, **params):
+        description = {
+            'schema_version': SCHEMA_VERSION,
+            'stage': stage,
+            'video': self.hash_file(video_path),
+            'model': self.hash_file(model_path),
+            'params': params,
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode()
+        return f'{stage}-{hashlib.sha256(encoded).hexdigest()[:32]}'
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def read_meta(self, key):
+        # None for a missing or unreadable (e.g. truncated) meta.json
+        meta_path = os.path.join(self.entry_dir(key), 'meta.json')
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, entry_dir, meta):
+        # Write then rename, so an interrupted write never leaves a truncated meta.json
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def load(self, key):
+        # {name: array} for a key, or None on a miss
+        meta = self.read_meta(key)
+        if meta is None or meta.get('schema_version') != SCHEMA_VERSION:
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            self.misses += 1
+            return None
+
+        entry_dir = self.entry_dir(key)
+        if meta['format'] == 'npz':
+            with np.load(os.path.join(entry_dir, 'arrays.npz')) as data:
+                arrays = {name: data[name] for name in meta['arrays']}
+        else:
+            # Copy-on-write mapping: pages are read lazily and writes stay private
+            arrays = {name: np.load(os.path.join(entry_dir, f'{name}.npy'), mmap_mode='c') for name in meta['arrays']}
+
+        meta['last_access'] = time.time()
+        self.write_meta(entry_dir, meta)
+
+        self.hits += 1
+        return arrays
+
+    def save(self, key, arrays):
+        entry_dir = self.entry_dir(key)
+        tmp_dir = entry_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        if self.compress:
+            np.savez_compressed(os.path.join(tmp_dir, 'arrays.npz'), **arrays)
+        else:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), np.asarray(array))
+
+        meta = {
+            'schema_version': SCHEMA_VERSION,
+            'format': 'npz' if self.compress else 'npy',
+            'arrays': list(arrays),
+            'created': time.time(),
+            'last_access': time.time(),
+        }
+        self.write_meta(tmp_dir, meta)
+
+        # Swap the finished entry in so readers never see a partial one
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+        self.evict()
+
+    def entry_size(self, key):
+        entry_dir = self.entry_dir(key)
+        return sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+
+    def entries(self):
+        return [name for name in os.listdir(self.cache_dir)
+                if os.path.exists(os.path.join(self.cache_dir, name, 'meta.json'))]
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        # Entries with an unreadable meta.json go first
+        entries = sorted(self.entries(), key=lambda key: (self.read_meta(key) or {}).get('last_access', 0))
+        total = sum(self.entry_size(key) for key in entries)
+        while entries and total > self.max_bytes:
+            key = entries.pop(0)
+            total -= self.entry_size(key)
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def report(self):
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(self.entry_size(key) for key in entries),
+        }
+
+    def load_tracks(self, key):
+        arrays = self.load(key)
+        return TrackStore.from_arrays(arrays).to_tracks() if arrays is not None else None
+
+    def save_tracks(self, key, tracks):
+        self.save(key, TrackStore.from_tracks(tracks).to_arrays())
+
+    def load_camera_movement(self, key):
+        arrays = self.load(key)
+        return arrays['camera_movement'].tolist() if arrays is not None else None
+
+    def save_camera_movement(self, key, camera_movement):
+        self.save(key, {'camera_movement': np.asarray(camera_movement, dtype=np.float32).reshape(-1, 2)})
@@ -1,18 +1,101 @@
+import bisect
 from matplotlib import pyplot as plt
 import networkx as nx
+import numpy as np
+import sys
+sys.path.append('../')
+from pass_stats_tracker import PassDetector
 
 class PassNetwork:
-    def construct_pass_network(self, player_tracks, team_ball_control):
+    """
+    Pass network built from pass events rather than from co-presence.
+
+    Passes are the successful ones of the shared PassDetector definition (same
+    team, ball travelled at least min_ball_travel metres on the pitch), the same
+    passes MatchStats counts. They are accumulated in a sparse per-team adjacency
+    {team: {(passer, receiver): count}} and kept as a frame-ordered event list, so
+    windows of the match can be sliced without rescanning the tracks. networkx
+    graphs are only built on export.
+    """
+    def __init__(self, pass_detector=None):
+        self.pass_detector = pass_detector or PassDetector()
+        self.reset()
+
+    def reset(self):
+        self.adjacency = {}
+        self.events = []  # (frame, team, passer, receiver)
+        self.pass_detector.reset()
+        self.next_frame = 0
+
+    def add_pass(self, frame_num, team, passer, receiver, count=1):
+        team, passer, receiver = int(team), int(passer), int(receiver)
+        team_adjacency = self.adjacency.setdefault(team, {})
+        team_adjacency[(passer, receiver)] = team_adjacency.get((passer, receiver), 0) + count
+        self.events.append((frame_num, team, passer, receiver))
+
+    def get_ball_position(self, ball_track):
+        # Pitch position in metres, None when the ball or its transformed position is missing
+        return ball_track.get(1, {}).get('position_transformed')
+
+    def update(self, player_tracks, ball_tracks=None, start_frame=None):
+        # Incremental: frames are consumed in order and state carries over between calls
+        start_frame = self.next_frame if start_frame is None else start_frame
+        for offset, players in enumerate(player_tracks):
+            frame_num = start_frame + offset
+            carrier = next((player_id for player_id, player in players.items() if player.get('has_ball', False)), None)
+            if carrier is None:
+                continue
+
+            team = players[carrier].get('team', 0)
+            ball_position = self.get_ball_position(ball_tracks[offset]) if ball_tracks is not None else None
+            completed = self.pass_detector.update(frame_num, carrier, team, ball_position)
+            if completed is not None and completed[2]:
+                self.add_pass(frame_num, team, completed[0], carrier)
+
+        self.next_frame = start_frame + len(player_tracks)
+        return self
+
+    def construct_pass_network(self, player_tracks, ball_tracks=None):
+        self.reset()
+        self.update(player_tracks, ball_tracks)
+        return self.to_graph()
+
+    def get_adjacency(self, team, start_frame=None, end_frame=None):
+        # Sparse passer -> receiver counts, optionally restricted to [start_frame, end_frame)
+        if start_frame is None and end_frame is None:
+            return dict(self.adjacency.get(team, {}))
+        first = bisect.bisect_left(self.events, (start_frame if start_frame is not None else -np.inf,))
+        last = bisect.bisect_left(self.events, (end_frame,)) if end_frame is not None else len(self.events)
+        adjacency = {}
+        for _, event_team, passer, receiver in self.events[first:last]:
+            if event_team == team:
+                adjacency[(passer, receiver)] = adjacency.get((passer, receiver), 0) + 1
+        return adjacency
+
+    def windows(self, window_frames):
+        # (start_frame, end_frame, {team: adjacency}) per block, e.g. window_frames = 15 * 60 * fps
+        teams = sorted(self.adjacency)
+        for start_frame in range(0, max(self.next_frame, 1), window_frames):
+            end_frame = start_frame + window_frames
+            yield start_frame, end_frame, {team: self.get_adjacency(team, start_frame, end_frame) for team in teams}
+
+    def to_matrix(self, team, start_frame=None, end_frame=None):
+        # Dense export: (player_ids, counts) with counts[i, j] = passes from player_ids[i] to player_ids[j]
+        adjacency = self.get_adjacency(team, start_frame, end_frame)
+        player_ids = sorted({player_id for edge in adjacency for player_id in edge})
+        index = {player_id: i for i, player_id in enumerate(player_ids)}
+        matrix = np.zeros((len(player_ids), len(player_ids)), dtype=np.int32)
+        for (passer, receiver), count in adjacency.items():
+            matrix[index[passer], index[receiver]] = count
+        return player_ids, matrix
+
+    def to_graph(self, team=None, start_frame=None, end_frame=None):
         graph = nx.DiGraph()
-        for frame_tracks in player_tracks:
-            for player_id, track in frame_tracks.items():
-                if "has_ball" in track and track["has_ball"]:
-                    team = track["team"]
-                    if team not in graph:
-                        graph.add_node(team)
-                    for target_player, target_track in frame_tracks.items():
-                        if target_player != player_id and target_track["team"] == team:
-                            graph.add_edge(player_id, target_player, weight=1)
+        for graph_team in ([team] if team is not None else sorted(self.adjacency)):
+            for (passer, receiver), count in self.get_adjacency(graph_team, start_frame, end_frame).items():
+                graph.add_node(passer, team=graph_team)
+                graph.add_node(receiver, team=graph_team)
+                graph.add_edge(passer, receiver, weight=count)
         return graph
 
     def visualize(self, graph, output_path):
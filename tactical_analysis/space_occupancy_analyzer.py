@@ -1,22 +1,47 @@
 import numpy as np
 import cv2
+import sys
+sys.path.append('../')
+from view_transformer import ViewTransformer
 
 class SpaceOccupancyAnalyzer:
-    def __init__(self, field_width=68, field_length=105, grid_size=10):
+    def __init__(self, field_width=68, field_length=105, grid_size=10, control_cell_size=1.0, control_size=None,
+                 max_player_speed=7.0, reaction_time=0.7, control_sigma=0.45, frame_rate=24, batch_frames=16):
         """
         Initialize the space occupancy analyzer.
         :param field_width: Width of the field in meters.
         :param field_length: Length of the field in meters.
         :param grid_size: Size of each grid cell in meters.
+        :param control_cell_size: Size of each pitch control cell in meters.
+        :param control_size: (length, width) in meters covered by the pitch control grid; by default the
+                             ViewTransformer's calibrated court, the only area position_transformed is reliable in.
+        :param max_player_speed: Top speed (m/s) used by the time-to-reach model.
+        :param reaction_time: Seconds before a player starts moving towards a cell.
+        :param control_sigma: Spread (s) of the arrival time difference in the time-to-reach model.
+        :param frame_rate: Video frame rate, used for player velocities.
+        :param batch_frames: Frames evaluated together in one distance computation.
         """
         self.field_width = field_width
         self.field_length = field_length
         self.grid_size = grid_size
-        
+
         # Compute grid dimensions
         self.grid_rows = int(np.ceil(self.field_length / self.grid_size))
         self.grid_cols = int(np.ceil(self.field_width / self.grid_size))
 
+        # Pitch control grid: rows across the width, columns along the length
+        self.control_cell_size = control_cell_size
+        self.max_player_speed = max_player_speed
+        self.reaction_time = reaction_time
+        self.control_sigma = control_sigma
+        self.frame_rate = frame_rate
+        self.batch_frames = batch_frames
+        if control_size is None:
+            view_transformer = ViewTransformer()
+            control_size = (view_transformer.court_length, view_transformer.court_width)
+        self.control_size = control_size
+        self.control_shape = (int(np.ceil(control_size[1] / control_cell_size)), int(np.ceil(control_size[0] / control_cell_size)))
+
     def analyze_space_control(self, player_tracks):
         """
         Analyze space occupancy based on player positions.
@@ -25,19 +50,178 @@ class SpaceOccupancyAnalyzer:
         """
         space_control = np.zeros((self.grid_rows, self.grid_cols, 2))  # Two teams
 
-        for frame in player_tracks:
+        positions, teams, _ = self.stack_positions(player_tracks)
+        valid = ~np.isnan(positions[..., 0]) & ((teams == 1) | (teams == 2))
+        rows = (positions[..., 1][valid] / self.grid_size).astype(np.int64)
+        cols = (positions[..., 0][valid] / self.grid_size).astype(np.int64)
+        team_index = teams[valid] - 1
+        inside = (rows >= 0) & (rows < self.grid_rows) & (cols >= 0) & (cols < self.grid_cols)
+        np.add.at(space_control, (rows[inside], cols[inside], team_index[inside]), 1)
+
+        return space_control
+
+    def stack_positions(self, player_tracks):
+        """
+        Pack pitch positions into padded arrays.
+        :param player_tracks: List of player positions by frame.
+        :return: positions (F, P, 2) with NaN padding, teams (F, P) with 0 padding and
+                 track ids (F, P) with -1 padding, P being the most players in any frame.
+                 Players outside the calibrated area (extrapolated positions) are left out.
+        """
+        max_players = max((len(frame) for frame in player_tracks), default=0)
+        positions = np.full((len(player_tracks), max(max_players, 1), 2), np.nan, dtype=np.float32)
+        teams = np.zeros(positions.shape[:2], dtype=np.int64)
+        track_ids = np.full(positions.shape[:2], -1, dtype=np.int64)
+
+        for frame_num, frame in enumerate(player_tracks):
+            slot = 0
             for player_id, player_info in frame.items():
-                team = player_info.get('team')
                 position = player_info.get('position_transformed')
+                if position is None or player_info.get('team') is None or not player_info.get('in_calibrated_area', True):
+                    continue
+                positions[frame_num, slot] = position
+                teams[frame_num, slot] = player_info['team']
+                track_ids[frame_num, slot] = player_id
+                slot += 1
 
-                if team is not None and position is not None:
-                    row = int(position[1] / self.grid_size)
-                    col = int(position[0] / self.grid_size)
+        return positions, teams, track_ids
 
-                    if 0 <= row < self.grid_rows and 0 <= col < self.grid_cols:
-                        space_control[row, col, team - 1] += 1
+    def get_velocities(self, positions, track_ids, previous_positions=None, previous_track_ids=None):
+        """
+        Per-slot velocities (m/s) from the previous frame position of the same track.
+        :return: (F, P, 2) array, zero where the previous position is unknown.
+        """
+        velocities = np.zeros_like(positions)
+        if previous_positions is None:
+            previous_positions, previous_track_ids = positions[:0], track_ids[:0]
+        all_positions = np.concatenate([previous_positions[-1:], positions])
+        all_track_ids = np.concatenate([previous_track_ids[-1:], track_ids])
+        offset = len(all_positions) - len(positions)
 
-        return space_control
+        for frame_num in range(max(1 - offset, 0), len(positions)):
+            previous = frame_num + offset - 1
+            matches = (track_ids[frame_num][:, None] == all_track_ids[previous][None, :]) & (track_ids[frame_num][:, None] != -1)
+            slots, previous_slots = np.nonzero(matches)
+            velocities[frame_num, slots] = (positions[frame_num, slots] - all_positions[previous, previous_slots]) * self.frame_rate
+
+        return np.nan_to_num(velocities)
+
+    def nearest_distances(self, positions, mask):
+        # (F, rows, cols) distance field to the nearest masked player (exact Euclidean
+        # transform of the grid with the players' cells as seeds), inf when there is none
+        distances = np.full((len(positions), *self.control_shape), np.inf, dtype=np.float32)
+        valid = mask & ~np.isnan(positions[..., 0])
+        cells = np.floor(np.nan_to_num(positions) / self.control_cell_size).astype(np.int64)
+        rows = np.clip(cells[..., 1], 0, self.control_shape[0] - 1)
+        cols = np.clip(cells[..., 0], 0, self.control_shape[1] - 1)
+        seeds = np.empty(self.control_shape, dtype=np.uint8)
+
+        for frame_num in np.nonzero(valid.any(axis=1))[0]:
+            seeds.fill(255)
+            seeds[rows[frame_num][valid[frame_num]], cols[frame_num][valid[frame_num]]] = 0
+            distances[frame_num] = cv2.distanceTransform(seeds, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+        distances *= self.control_cell_size
+        return distances
+
+    def compute_control(self, positions, teams, velocities=None, method='voronoi'):
+        """
+        Team 1 control of every pitch cell for a batch of frames.
+        :param positions: (F, P, 2) pitch positions, NaN for empty slots.
+        :param teams: (F, P) team of each slot.
+        :param velocities: (F, P, 2) player velocities, only used by 'time_to_reach'.
+        :param method: 'voronoi' (nearest player owns the cell) or 'time_to_reach'
+                       (logistic of the arrival time difference of the fastest player of each team).
+        :return: (F, rows, cols) array in [0, 1], NaN where a team has no players.
+        """
+        if method == 'time_to_reach' and velocities is not None:
+            # Players keep drifting along their velocity during the reaction time
+            positions = positions + velocities * self.reaction_time
+
+        # Distance from every cell to the nearest player of each team
+        team_1 = self.nearest_distances(positions, teams == 1)
+        team_2 = self.nearest_distances(positions, teams == 2)
+
+        if method == 'voronoi':
+            control = (team_1 < team_2).astype(np.float32)
+            control[team_1 == team_2] = 0.5
+        elif method == 'time_to_reach':
+            time_1 = self.reaction_time + team_1 / self.max_player_speed
+            time_2 = self.reaction_time + team_2 / self.max_player_speed
+            with np.errstate(invalid='ignore', over='ignore'):
+                control = 1 / (1 + np.exp(-np.pi / np.sqrt(3) / self.control_sigma * (time_2 - time_1)))
+            control = control.astype(np.float32)
+        else:
+            raise ValueError(f"Unknown pitch control method: {method}")
+
+        control[np.isinf(team_1) | np.isinf(team_2)] = np.nan
+        return control
+
+    def iter_pitch_control(self, player_tracks, method='voronoi'):
+        """
+        Per-frame control maps for a whole match, computed batch_frames at a time.
+        :return: Generator of (start_frame, (F, rows, cols) control maps).
+        """
+        positions, teams, track_ids = self.stack_positions(player_tracks)
+        for start_frame in range(0, len(positions), self.batch_frames):
+            end_frame = start_frame + self.batch_frames
+            velocities = None
+            if method == 'time_to_reach':
+                velocities = self.get_velocities(positions[start_frame:end_frame], track_ids[start_frame:end_frame],
+                                                 positions[:start_frame], track_ids[:start_frame])
+            yield start_frame, self.compute_control(positions[start_frame:end_frame], teams[start_frame:end_frame],
+                                                    velocities, method)
+
+    def analyze_pitch_control(self, player_tracks, window_frames=None, method='voronoi'):
+        """
+        Aggregate per-frame control over time windows.
+        :param player_tracks: List of player positions by frame.
+        :param window_frames: Frames per window (e.g. 15 * 60 * fps); None for the whole match.
+        :return: (windows (W, rows, cols) mean team 1 control, frame_share (F,) team 1 share of the controlled area).
+        """
+        window_frames = window_frames or max(len(player_tracks), 1)
+        num_windows = int(np.ceil(len(player_tracks) / window_frames)) or 1
+        sums = np.zeros((num_windows, *self.control_shape), dtype=np.float64)
+        counts = np.zeros((num_windows, *self.control_shape), dtype=np.int64)
+        frame_share = np.full(len(player_tracks), np.nan, dtype=np.float32)
+
+        for start_frame, control in self.iter_pitch_control(player_tracks, method):
+            valid = ~np.isnan(control)
+            with np.errstate(invalid='ignore'):
+                frame_share[start_frame:start_frame + len(control)] = np.where(valid, control, 0).sum(axis=(1, 2)) / valid.sum(axis=(1, 2))
+            window_index = (start_frame + np.arange(len(control))) // window_frames
+            for window in np.unique(window_index):
+                in_window = window_index == window
+                sums[window] += np.where(valid[in_window], control[in_window], 0).sum(axis=0)
+                counts[window] += valid[in_window].sum(axis=0)
+
+        with np.errstate(invalid='ignore'):
+            windows = (sums / counts).astype(np.float32)
+        return windows, frame_share
+
+    def visualize_pitch_control(self, control, output_path, cell_pixels=10):
+        """
+        Save a team 1 (red) / team 2 (blue) pitch control map.
+        :param control: (rows, cols) team 1 control in [0, 1], NaN for unknown cells.
+        """
+        control = np.nan_to_num(control, nan=0.5)
+        field_img = np.zeros((*control.shape, 3), dtype=np.uint8)
+        field_img[..., 2] = np.clip(control * 255, 0, 255).astype(np.uint8)
+        field_img[..., 0] = np.clip((1 - control) * 255, 0, 255).astype(np.uint8)
+        field_img = cv2.resize(field_img, (control.shape[1] * cell_pixels, control.shape[0] * cell_pixels),
+                               interpolation=cv2.INTER_NEAREST)
+        cv2.imwrite(output_path, np.vstack((self.draw_legend(field_img.shape[1]), field_img)))
+        print(f"Pitch control visualization saved to {output_path}")
+
+    def draw_legend(self, img_width):
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        legend_height = 50
+        legend = np.zeros((legend_height, img_width, 3), dtype=np.uint8)
+        cv2.rectangle(legend, (10, 10), (30, 30), (0, 0, 255), -1)
+        cv2.putText(legend, "Team 1 (Red)", (40, 25), font, 0.5, (255, 255, 255), 1)
+        cv2.rectangle(legend, (150, 10), (170, 30), (255, 0, 0), -1)
+        cv2.putText(legend, "Team 2 (Blue)", (180, 25), font, 0.5, (255, 255, 255), 1)
+        return legend
 
     def visualize_space_occupancy(self, space_control, output_path):
         """
@@ -48,42 +232,16 @@ class SpaceOccupancyAnalyzer:
         max_control = np.sum(space_control, axis=-1)
         control_ratios = space_control / (max_control[..., None] + 1e-5)  # Avoid division by zero
 
-        # Debug: Print control ratios
-        print("Control Ratios:")
-        print(control_ratios)
-
-        # Create an empty field visualization
+        # Color every cell at once and scale the grid up to 20 px cells
         img_height, img_width = self.grid_rows * 20, self.grid_cols * 20
-        field_img = np.zeros((img_height, img_width, 3), dtype=np.uint8)
-
-        for row in range(self.grid_rows):
-            for col in range(self.grid_cols):
-                team1_ratio = control_ratios[row, col, 0]
-                team2_ratio = control_ratios[row, col, 1]
-
-                # Normalize colors for better visibility
-                team1_color = int(np.clip(team1_ratio * 255, 0, 255))
-                team2_color = int(np.clip(team2_ratio * 255, 0, 255))
-
-                color = (
-                    team2_color,  # Blue for Team 2
-                    0,            # Green is unused
-                    team1_color   # Red for Team 1
-                )
-
-                cv2.rectangle(
-                    field_img,
-                    (col * 20, row * 20),
-                    ((col + 1) * 20, (row + 1) * 20),
-                    color,
-                    -1
-                )
+        cell_colors = np.zeros((self.grid_rows, self.grid_cols, 3), dtype=np.uint8)
+        cell_colors[..., 0] = np.clip(control_ratios[..., 1] * 255, 0, 255).astype(np.uint8)  # Blue for Team 2
+        cell_colors[..., 2] = np.clip(control_ratios[..., 0] * 255, 0, 255).astype(np.uint8)  # Red for Team 1
+        field_img = np.repeat(np.repeat(cell_colors, 20, axis=0), 20, axis=1)
 
         # Overlay field lines
-        for i in range(self.grid_rows + 1):
-            cv2.line(field_img, (0, i * 20), (img_width, i * 20), (255, 255, 255), 1)
-        for j in range(self.grid_cols + 1):
-            cv2.line(field_img, (j * 20, 0), (j * 20, img_height), (255, 255, 255), 1)
+        field_img[::20, :] = 255
+        field_img[:, ::20] = 255
 
         # Add grid labels
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -100,17 +258,8 @@ class SpaceOccupancyAnalyzer:
                     1
                 )
 
-
-        # Add legend
-        legend_height = 50
-        legend = np.zeros((legend_height, img_width, 3), dtype=np.uint8)
-        cv2.rectangle(legend, (10, 10), (30, 30), (0, 0, 255), -1)
-        cv2.putText(legend, "Team 1 (Red)", (40, 25), font, 0.5, (255, 255, 255), 1)
-        cv2.rectangle(legend, (150, 10), (170, 30), (255, 0, 0), -1)
-        cv2.putText(legend, "Team 2 (Blue)", (180, 25), font, 0.5, (255, 255, 255), 1)
-
         # Combine legend with field image
-        combined_img = np.vstack((legend, field_img))
+        combined_img = np.vstack((self.draw_legend(img_width), field_img))
 
         # Save visualization
         cv2.imwrite(output_path, combined_img)
@@ -1,10 +1,22 @@
+from collections import OrderedDict, Counter
+import cv2
+import numpy as np
 from sklearn.cluster import KMeans
 
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, crop_size=(16,16), votes_per_player=5, vote_every=10, cache_size=1024, fast_color=True):
         self.team_colors = {}
-        self.player_team_dict = {}
-    
+        # LRU cache of decided teams: track id -> team
+        self.player_team_dict = OrderedDict()
+        # Pending majority votes: track id -> [sightings, votes]
+        self.player_votes = OrderedDict()
+
+        self.crop_size = crop_size
+        self.votes_per_player = votes_per_player
+        self.vote_every = vote_every
+        self.cache_size = cache_size
+        self.fast_color = fast_color
+
     def get_clustering_model(self,image):
         # Reshape the image to 2D array
         image_2d = image.reshape(-1,3)
@@ -38,35 +50,110 @@ class TeamAssigner:
 
         return player_color
 
+    def get_player_crops(self,frame,bboxes,frame_scale=1.0):
+        # Top half of every player box, downsampled to crop_size and stacked to (P, h, w, 3);
+        # frame may be the video frame downscaled by frame_scale, the boxes are in full resolution
+        width, height = self.crop_size
+        crops = np.zeros((len(bboxes), height, width, 3), dtype=np.float32)
+        frame_height, frame_width = frame.shape[:2]
+        for i, bbox in enumerate(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4) * frame_scale):
+            x1, y1 = max(int(bbox[0]), 0), max(int(bbox[1]), 0)
+            x2, y2 = min(int(bbox[2]), frame_width), min(int(bbox[3]), frame_height)
+            top_half_image = frame[y1:y1 + max((y2 - y1) // 2, 1), x1:max(x2, x1 + 1)]
+            if top_half_image.size == 0:
+                continue
+            crops[i] = cv2.resize(top_half_image, (width, height), interpolation=cv2.INTER_AREA)
+        return crops
+
+    def get_player_colors(self,frame,bboxes,iterations=5,frame_scale=1.0):
+        # Player colours of all boxes of a frame with one batched 2-cluster split
+        if len(bboxes) == 0:
+            return np.zeros((0,3))
+        if not self.fast_color:
+            return np.array([self.get_player_color(frame,np.asarray(bbox) * frame_scale) for bbox in bboxes])
+
+        crops = self.get_player_crops(frame,bboxes,frame_scale)
+        num_players, height, width, _ = crops.shape
+        pixels = crops.reshape(num_players, -1, 3)
+
+        # Start from the corner colour (background) and the centre colour (shirt)
+        corner_index = np.array([0, width - 1, (height - 1) * width, height * width - 1])
+        centers = np.stack([
+            pixels[:, corner_index].mean(axis=1),
+            crops[:, height // 4:3 * height // 4 + 1, width // 4:3 * width // 4 + 1].reshape(num_players, -1, 3).mean(axis=1),
+        ], axis=1)
+
+        for _ in range(iterations):
+            distances = ((pixels[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=-1)
+            labels = distances.argmin(axis=-1)
+            for cluster in (0, 1):
+                mask = (labels == cluster)[..., None]
+                count = mask.sum(axis=1)
+                centers[:, cluster] = np.where(count > 0, (pixels * mask).sum(axis=1) / np.maximum(count, 1), centers[:, cluster])
+
+        # Get the player cluster: the corners are the background
+        non_player_cluster = (labels[:, corner_index].sum(axis=1) > 2).astype(int)
+        player_cluster = 1 - non_player_cluster
+        return centers[np.arange(num_players), player_cluster]
+
+    def assign_team_color(self,frame, player_detections, frame_scale=1.0):
+
+        bboxes = [player_detection["bbox"] for player_detection in player_detections.values()]
+        player_colors = self.get_player_colors(frame,bboxes,frame_scale=frame_scale)
 
-    def assign_team_color(self,frame, player_detections):
-        
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color =  self.get_player_color(frame,bbox)
-            player_colors.append(player_color)
-        
         kmeans = KMeans(n_clusters=2, init="k-means++",n_init=10)
         kmeans.fit(player_colors)
 
         self.kmeans = kmeans
 
-        self.team_colors[1] = kmeans.cluster_centers_[0]
-        self.team_colors[2] = kmeans.cluster_centers_[1]
-
+        # float64: the crop colours are float32, which cv2 drawing functions reject as a colour
+        self.team_colors[1] = kmeans.cluster_centers_[0].astype(np.float64)
+        self.team_colors[2] = kmeans.cluster_centers_[1].astype(np.float64)
+
+    def predict_teams(self,player_colors):
+        # Nearest team colour, same as self.kmeans.predict + 1
+        team_colors = np.array([self.team_colors[1], self.team_colors[2]])
+        distances = ((np.asarray(player_colors)[:, None, :] - team_colors[None]) ** 2).sum(axis=-1)
+        return distances.argmin(axis=1) + 1
+
+    def get_player_teams(self,frame,player_detections,frame_scale=1.0):
+        # Teams for every player of a frame. Each track id is sampled every `vote_every`
+        # sightings until `votes_per_player` votes are in, then the majority is cached.
+        teams = {}
+        to_sample = []
+        for player_id in player_detections:
+            if player_id in self.player_team_dict:
+                self.player_team_dict.move_to_end(player_id)
+                teams[player_id] = self.player_team_dict[player_id]
+                continue
+            state = self.player_votes.setdefault(player_id, [0, []])
+            self.player_votes.move_to_end(player_id)
+            if state[0] % self.vote_every == 0:
+                to_sample.append(player_id)
+            state[0] += 1
+
+        if to_sample:
+            player_colors = self.get_player_colors(frame,[player_detections[player_id]['bbox'] for player_id in to_sample],
+                                                   frame_scale=frame_scale)
+            for player_id, team_id in zip(to_sample, self.predict_teams(player_colors)):
+                self.player_votes[player_id][1].append(int(team_id))
+
+        for player_id in player_detections:
+            if player_id in teams:
+                continue
+            votes = self.player_votes[player_id][1]
+            team_id = Counter(votes).most_common(1)[0][0]
+            teams[player_id] = team_id
+            if len(votes) >= self.votes_per_player:
+                del self.player_votes[player_id]
+                self.player_team_dict[player_id] = team_id
+                if len(self.player_team_dict) > self.cache_size:
+                    self.player_team_dict.popitem(last=False)
+
+        while len(self.player_votes) > self.cache_size:
+            self.player_votes.popitem(last=False)
+
+        return teams
 
     def get_player_team(self,frame,player_bbox,player_id):
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
-
-        player_color = self.get_player_color(frame,player_bbox)
-
-        team_id = self.kmeans.predict(player_color.reshape(1,-1))[0]
-        team_id+=1
-
-        
-
-        self.player_team_dict[player_id] = team_id
-
-        return team_id
+        return self.get_player_teams(frame,{player_id: {"bbox": player_bbox}})[player_id]
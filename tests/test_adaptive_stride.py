@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+import inspect
+from trackers import AdaptiveStride, measure_tracking_drift
+
+
+def player(x):
+    return {'bbox': [x, 100, x + 20, 160]}
+
+
+def test_drift_counts_identity_switches():
+    reference = {'players': [{1: player(0), 2: player(200)} for _ in range(4)]}
+    # Same boxes, but the strided run swaps ids halfway and then renumbers player 2
+    tracks = {'players': [{5: player(0), 6: player(200)}, {5: player(0), 6: player(200)},
+                          {6: player(0), 5: player(200)}, {6: player(0), 9: player(200)}]}
+    drift = measure_tracking_drift(tracks, reference, objects=('players',))
+    assert drift['mean_iou'] == pytest.approx(1.0)
+    assert drift['recall'] == 1.0
+    assert drift['id_switches'] == 3
+
+
+def test_identical_tracks_have_no_switches():
+    reference = {'players': [{1: player(10 * f), 2: player(300)} for f in range(5)]}
+    drift = measure_tracking_drift(reference, reference, objects=('players',))
+    assert drift['id_switches'] == 0
+    assert drift['mean_center_error'] == pytest.approx(0.0)
+
+
+
+def test_cache_params_cover_every_constructor_argument():
+    # Any argument that changes the propagated tracks has to change the tracks cache key
+    arguments = set(inspect.signature(AdaptiveStride).parameters)
+    assert set(AdaptiveStride().get_cache_params()) == arguments
+    assert AdaptiveStride(flow_scale=1.0).get_cache_params() != AdaptiveStride().get_cache_params()
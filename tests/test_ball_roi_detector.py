@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from trackers import BallROIDetector
+
+
+class Tensor:
+    # Just enough of a torch tensor for sv.Detections.from_ultralytics
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class Boxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = Tensor(np.reshape(xyxy, (-1, 4)))
+        self.conf = Tensor(conf)
+        self.cls = Tensor(np.zeros(len(conf)))
+        self.id = None
+
+
+class Result:
+    names = {0: 'ball'}
+    obb = None
+    masks = None
+
+    def __init__(self, xyxy, conf):
+        self.boxes = Boxes(xyxy, conf)
+
+
+class StubModel:
+    """Returns the queued crop-coordinate boxes ([] for no ball) and records each crop and imgsz."""
+    def __init__(self):
+        self.queue = []
+        self.calls = []
+
+    def predict(self, crop, imgsz, conf, verbose):
+        self.calls.append((crop.shape, imgsz))
+        boxes = self.queue.pop(0) if self.queue else []
+        return [Result(boxes, [0.9] * len(boxes))]
+
+
+def ball(x, y, size=10):
+    return {1: {'bbox': [x, y, x + size, y + size]}}
+
+
+def make_detector(**kwargs):
+    model = StubModel()
+    return model, BallROIDetector(model, roi_size=100, **kwargs)
+
+
+FRAME = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+
+def test_roi_ball_replaces_the_full_frame_ball():
+    model, detector = make_detector()
+    detector.update(FRAME, ball(600, 300))
+    assert model.calls == []
+
+    # The window around (605, 305) starts at (555, 255)
+    model.queue.append([[40, 40, 52, 52]])
+    ball_frame = detector.update(FRAME, ball(900, 100))
+    assert model.calls == [((100, 100, 3), 100)]
+    assert ball_frame[1]['bbox'] == pytest.approx([595, 295, 607, 307])
+    assert detector.report()['sources'] == {'full_frame': 1, 'roi': 1}
+
+
+def test_full_frame_ball_is_gated_by_the_prediction():
+    model, detector = make_detector(gate_distance=50)
+    detector.update(FRAME, ball(600, 300))
+
+    assert detector.update(FRAME, ball(620, 310))[1]['bbox'] == [620, 310, 630, 320]
+    assert detector.update(FRAME, ball(1100, 600)) == {}
+    assert detector.report()['sources'] == {'full_frame': 1, 'gated_full_frame': 1, 'none': 1}
+
+
+def test_lock_is_lost_after_max_misses_and_taken_again():
+    model, detector = make_detector(max_misses=2)
+    detector.update(FRAME, ball(600, 300))
+    for _ in range(3):
+        assert detector.update(FRAME, {}) == {}
+    assert detector.kalman_filter_bank is None
+    assert detector.roi_passes == 3
+
+    # Unlocked: the full-frame ball is kept as it is, without an ROI pass, and locks again
+    assert detector.update(FRAME, ball(200, 500))[1]['bbox'] == [200, 500, 210, 510]
+    assert detector.roi_passes == 3
+    assert detector.kalman_filter_bank is not None
+
+    # The next window is centred on the new lock
+    model.queue.append([[45, 45, 55, 55]])
+    assert detector.update(FRAME, {})[1]['bbox'] == pytest.approx([200, 500, 210, 510])
+    assert detector.report()['sources'] == {'full_frame': 2, 'none': 3, 'roi': 1}
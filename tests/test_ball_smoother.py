@@ -0,0 +1,61 @@
+import copy
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from trackers import BallSmoother
+
+
+def ball(x, y=100.0):
+    return {1: {'bbox': [x - 5, y - 5, x + 5, y + 5], 'position_transformed': [x / 10, y / 10]}}
+
+
+def test_gap_is_filled_by_linear_interpolation():
+    ball_tracks = [ball(0), {}, {}, {}, ball(40)]
+    BallSmoother(max_gap=5).smooth(ball_tracks)
+    for frame_num, x in enumerate([0, 10, 20, 30, 40]):
+        assert ball_tracks[frame_num][1]['bbox'] == pytest.approx([x - 5, 95, x + 5, 105])
+        assert ball_tracks[frame_num][1]['position_transformed'] == pytest.approx([x / 10, 10])
+    assert [frame[1].get('interpolated', False) for frame in ball_tracks] == [False, True, True, True, False]
+
+
+def test_gap_longer_than_max_gap_stays_empty():
+    ball_tracks = [ball(0)] + [{} for _ in range(4)] + [ball(50)]
+    BallSmoother(max_gap=3, max_pixel_speed=1000).smooth(ball_tracks)
+    assert all(frame == {} for frame in ball_tracks[1:5])
+    assert 'interpolated' not in ball_tracks[5][1]
+
+
+def test_leading_and_trailing_gaps_hold_the_nearest_ball():
+    ball_tracks = [{}, {}, ball(30), ball(32), {}]
+    BallSmoother(max_gap=5).smooth(ball_tracks)
+    assert ball_tracks[0][1]['bbox'] == pytest.approx(ball(30)[1]['bbox'])
+    assert ball_tracks[4][1]['bbox'] == pytest.approx(ball(32)[1]['bbox'])
+
+
+def test_jump_is_rejected_and_interpolated_over():
+    ball_tracks = [ball(0), ball(10), ball(900), ball(30)]
+    BallSmoother(max_gap=5, max_pixel_speed=60).smooth(ball_tracks)
+    assert ball_tracks[2][1]['interpolated']
+    assert ball_tracks[2][1]['bbox'] == pytest.approx(ball(20)[1]['bbox'])
+
+
+def test_repeated_jumps_relock_on_the_new_position():
+    ball_tracks = [ball(0)] + [ball(900 + step) for step in range(4)]
+    BallSmoother(max_gap=5, max_pixel_speed=60, max_rejections=3).smooth(ball_tracks)
+    assert ball_tracks[3][1]['bbox'] == pytest.approx(ball(902)[1]['bbox'])
+    assert 'interpolated' not in ball_tracks[3][1]
+    assert ball_tracks[4][1]['bbox'] == pytest.approx(ball(903)[1]['bbox'])
+
+
+def test_streaming_updates_match_smooth():
+    ball_tracks = [ball(0), {}, ball(900), {}, ball(40), {}, {}, {}, {}, {}, {}, ball(60), {}]
+    expected = BallSmoother(max_gap=4).smooth(copy.deepcopy(ball_tracks))
+
+    smoother = BallSmoother(max_gap=4)
+    released = []
+    for frame_num, ball_frame in enumerate(ball_tracks):
+        released += [released_frame_num for released_frame_num, _ in smoother.update(frame_num, ball_frame)]
+    released += [released_frame_num for released_frame_num, _ in smoother.flush()]
+    assert released == list(range(len(ball_tracks)))
+    assert ball_tracks == expected
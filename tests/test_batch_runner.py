@@ -0,0 +1,45 @@
+import json
+import os
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from pipeline.batch_runner import collect_jobs, get_job_params, load_state, save_state
+
+
+def write_manifest(tmp_path, lines):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('\n'.join(lines))
+    return str(manifest)
+
+
+def test_videos_with_the_same_stem_get_separate_jobs(tmp_path):
+    jobs = collect_jobs(write_manifest(tmp_path, ['a/match.mp4', 'b/match.mp4', 'c/other.mp4']), str(tmp_path / 'out'))
+    assert len({job['job_dir'] for job in jobs}) == 3
+    assert len({job['output'] for job in jobs}) == 3
+    assert jobs[2]['name'] == 'other'
+    assert jobs[0]['name'].startswith('match-') and jobs[1]['name'].startswith('match-')
+
+
+def test_duplicate_inputs_and_outputs_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        collect_jobs(write_manifest(tmp_path, ['a/match.mp4', 'a/match.mp4']))
+    with pytest.raises(ValueError):
+        collect_jobs(write_manifest(tmp_path, ['a/one.mp4,out.avi', 'b/two.mp4,out.avi']))
+
+
+def test_state_of_other_params_is_discarded(tmp_path):
+    job = {'input': 'match.mp4', 'job_dir': str(tmp_path)}
+    params = get_job_params(job, 'models/best.pt', {'detect_stride': 1})
+    state = load_state(str(tmp_path), params)
+    state['completed'].append('frames')
+    state['status'] = 'done'
+    save_state(str(tmp_path), state)
+
+    assert load_state(str(tmp_path), params)['completed'] == ['frames']
+    assert load_state(str(tmp_path), get_job_params(job, 'models/best.pt', {'detect_stride': 1}))['status'] == 'done'
+    for changed in (get_job_params(job, 'models/best.pt', {'detect_stride': 4}),
+                    get_job_params({'input': 'other/match.mp4'}, 'models/best.pt', {'detect_stride': 1})):
+        assert load_state(str(tmp_path), changed) == {'completed': [], 'timings': {}, 'params': changed}
+    with open(os.path.join(str(tmp_path), 'state.json')) as f:
+        assert json.load(f)['params'] == params
@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from pipeline import ChunkedPipeline
+from pipeline.chunked_pipeline import process_chunk
+
+
+def test_tracks_without_colour_samples_are_left_unknown():
+    rng = np.random.default_rng(0)
+    color_samples = {1: rng.normal([200, 30, 30], 5, (6, 3)), 2: rng.normal([30, 30, 200], 5, (6, 3))}
+    player_tracks = [{1: {}, 2: {}, 3: {}} for _ in range(3)]
+    pipeline = ChunkedPipeline(None, num_workers=1)
+    pipeline.assign_teams(player_tracks, color_samples)
+
+    for frame in player_tracks:
+        assert {frame[1]['team'], frame[2]['team']} == {1, 2}
+        assert frame[3]['team'] == 0
+        assert 'team_color' not in frame[3]
+
+
+def test_no_colour_samples_leaves_every_track_unknown():
+    player_tracks = [{1: {}, 2: {}}]
+    ChunkedPipeline(None, num_workers=1).assign_teams(player_tracks, {})
+    assert [info['team'] for info in player_tracks[0].values()] == [0, 0]
+
+
+def test_chunk_past_the_end_of_the_video_is_empty(tmp_path):
+    video_path = str(tmp_path / 'short.avi')
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 24, (64, 48))
+    for _ in range(10):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+
+    result = process_chunk(dict(video_path=video_path, model_path=None, batch_size=4, chunk_size=4,
+                                fast_camera_movement=True, fps=24, detect_stride=1, ball_roi=0,
+                                decode_start=20, decode_end=30))
+    assert result['camera_movement'] == []
+    assert all(object_tracks == [] for object_tracks in result['tracks'].values())
+    assert len(result['ball_frame_nums']) == 0 and result['ball_color_stats'].shape == (0, 4)
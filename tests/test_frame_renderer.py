@@ -0,0 +1,24 @@
+import numpy as np
+from frame_renderer import FrameRenderer
+
+
+class ListSink:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+
+def test_render_video_returns_next_frame_number():
+    drawn = []
+    renderer = FrameRenderer([lambda frame, frame_num: drawn.append(frame_num)])
+    sink = ListSink()
+    frames = [np.zeros((4, 4, 3), np.uint8) for _ in range(3)]
+
+    assert renderer.render_video(frames, sink, start_frame=10) == 13
+    assert drawn == [10, 11, 12] and len(sink.frames) == 3
+
+
+def test_render_video_empty_chunk_keeps_start_frame():
+    assert FrameRenderer().render_video([], ListSink(), start_frame=10) == 10
@@ -0,0 +1,49 @@
+import numpy as np
+from player_heatmap import HeatmapAccumulator
+from view_transformer import ViewTransformer
+
+
+def test_grid_covers_the_calibrated_court():
+    view_transformer = ViewTransformer()
+    heatmap = HeatmapAccumulator(cell_size=0.5)
+    assert heatmap.pitch_size == (view_transformer.court_length, view_transformer.court_width)
+    assert heatmap.grid_shape == (136, 47)
+
+
+def test_positions_outside_the_calibrated_court_are_dropped():
+    heatmap = HeatmapAccumulator(cell_size=1.0)
+    player_tracks = [{1: {'position_transformed': [22.9, 67.5], 'team': 1},
+                      2: {'position_transformed': [40.0, 30.0], 'team': 2},
+                      3: {'position_transformed': [-1.0, 10.0], 'team': 2}}]
+    heatmap.add_tracks(player_tracks)
+    assert heatmap.total.sum() == 1
+    assert heatmap.total[67, 22] == 1
+    assert np.array_equal(heatmap.get_layer(team=1), heatmap.total)
+
+
+def test_default_canvas_has_the_court_aspect_ratio():
+    heatmap = HeatmapAccumulator(cell_size=1.0)
+    heatmap.add_tracks([{1: {'position_transformed': [2.0, 3.0], 'team': 1}}])
+    canvas = heatmap.load_pitch_image('images/football_pitch.png', pixels_per_metre=10)
+    assert canvas.shape[:2] == (680, 233)
+    assert heatmap.pitch_region is None
+    rendered = heatmap.render(heatmap.total, canvas)
+    # The hot spot stays near (2 m, 3 m) instead of being stretched over a 105 m pitch
+    hot_y, hot_x = np.unravel_index(rendered.sum(axis=2).argmax(), rendered.shape[:2])
+    assert abs(hot_x - 25) < 15 and abs(hot_y - 35) < 15
+
+
+def test_pitch_offset_draws_into_the_covered_sub_rectangle(tmp_path):
+    import cv2
+    pitch_path = str(tmp_path / 'pitch.png')
+    cv2.imwrite(pitch_path, np.full((68, 105, 3), 40, dtype=np.uint8))
+    heatmap = HeatmapAccumulator(cell_size=1.0)
+    heatmap.add_tracks([{1: {'position_transformed': [10.0, 30.0], 'team': 1}}])
+    pitch_image = heatmap.load_pitch_image(pitch_path, pixels_per_metre=4, pitch_offset=40)
+    assert pitch_image.shape[:2] == (272, 420)
+    assert heatmap.pitch_region == (160, 0, 253, 272)
+
+    rendered = heatmap.render(heatmap.total, pitch_image)
+    changed = np.any(rendered != pitch_image, axis=2)
+    assert changed.any()
+    assert not changed[:, :160].any() and not changed[:, 253:].any()
@@ -0,0 +1,81 @@
+import os
+import pickle
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from pipeline import LivePipeline, StageProfiler
+from pass_stats_tracker import MatchStats
+
+STUB_PATH = os.path.join(os.path.dirname(__file__), '..', 'stubs', 'track_stubs_08fd33_4_demo.pkl')
+
+
+def write_video(path, num_frames=40, size=(1920, 1080)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 24, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for _ in range(num_frames):
+        writer.write(background)
+    writer.release()
+
+
+def test_live_panel_and_profile_follow_match_stats(tmp_path, monkeypatch):
+    if not os.path.exists(STUB_PATH):
+        pytest.skip('demo track stub not available')
+    with open(STUB_PATH, 'rb') as f:
+        detections = pickle.load(f)
+    video_path = tmp_path / 'live.avi'
+    write_video(video_path)
+
+    snapshots, teams = [], []
+    append = MatchStats.append
+
+    def recording_append(match_stats, team_in_control, *args):
+        teams.append(team_in_control)
+        append(match_stats, team_in_control, *args)
+
+    monkeypatch.setattr(MatchStats, 'append', recording_append)
+    profiler = StageProfiler()
+    live_pipeline = LivePipeline(None, detections=detections, realtime=False, max_queue=100, latency_budget=1e9,
+                                 profiler=profiler)
+    report = live_pipeline.run(str(video_path), stats_callback=lambda snapshot, frame: snapshots.append(snapshot))
+
+    assert report['processed_frames'] == len(live_pipeline.match_stats) == len(snapshots) == len(teams)
+    for snapshot in snapshots:
+        seen = np.asarray(teams[:snapshot['frame'] + 1])
+        total = max((seen == 1).sum() + (seen == 2).sum(), 1)
+        assert snapshot['team_ball_control'][1] == pytest.approx((seen == 1).sum() / total * 100)
+    live = next(record for record in profiler.stages if record['name'] == 'live')
+    children = {record['name'] for record in profiler.stages if record['parent'] == 'live'}
+    assert live['processed_frames'] == report['processed_frames']
+    assert {'detection', 'ball_possession', 'render'} <= children
+
+
+def test_live_session_releases_emitted_frames(tmp_path):
+    if not os.path.exists(STUB_PATH):
+        pytest.skip('demo track stub not available')
+    with open(STUB_PATH, 'rb') as f:
+        detections = pickle.load(f)
+    video_path = tmp_path / 'live.avi'
+    write_video(video_path, num_frames=60)
+
+    retained = []
+    live_pipeline = LivePipeline(None, detections=detections, realtime=False, max_queue=100, latency_budget=1e9,
+                                 ball_max_gap=6, latency_samples=16)
+    live_pipeline.run(str(video_path), stats_callback=lambda snapshot, frame: retained.append(
+        max(len(live_pipeline.tracks['players'].items), len(live_pipeline.source_frames.items),
+            len(live_pipeline.camera_movement_per_frame.items), len(live_pipeline.match_stats.carriers.items))))
+
+    assert len(live_pipeline.tracks['players']) == 60
+    # At most the smoother's gap, the lag and the frame being emitted are held
+    assert max(retained) <= live_pipeline.ball_max_gap + live_pipeline.lag_frames + 2
+    assert len(live_pipeline.latencies) == 16 and live_pipeline.latency_count == 60
+
+
+def test_unopenable_source_raises_a_clear_error():
+    live_pipeline = LivePipeline(None, detections={'players': [], 'referees': [], 'ball': []}, realtime=False)
+    with pytest.raises(IOError, match='Cannot open live source'):
+        live_pipeline.run('/nonexistent.mp4')
+    assert live_pipeline.report()['processed_frames'] == 0
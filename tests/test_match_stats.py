@@ -0,0 +1,69 @@
+import numpy as np
+from pass_stats_tracker import MatchStats, PassDetector
+from tactical_analysis.pass_network import PassNetwork
+
+
+def make_tracks(num_frames=120, seed=0):
+    rng = np.random.default_rng(seed)
+    tracks = {'players': [], 'ball': []}
+    carrier = -1
+    for _ in range(num_frames):
+        if rng.random() < 0.15:
+            carrier = int(rng.choice([-1, 3, 4, 8, 9]))
+        players = {track_id: {'team': 1 if track_id < 5 else 2} for track_id in (3, 4, 8, 9)}
+        if carrier != -1:
+            players[carrier]['has_ball'] = True
+        tracks['players'].append(players)
+        tracks['ball'].append({1: {'position_transformed': [float(rng.uniform(0, 23)), float(rng.uniform(0, 68))]}})
+    team_ball_control = []
+    for players in tracks['players']:
+        carriers = [info['team'] for info in players.values() if info.get('has_ball')]
+        team_ball_control.append(carriers[0] if carriers else (team_ball_control[-1] if team_ball_control else 0))
+    return tracks, team_ball_control
+
+
+def test_possession_matches_counting_up_to_each_frame():
+    tracks, team_ball_control = make_tracks()
+    match_stats = MatchStats.from_tracks(tracks, team_ball_control)
+    for frame_num in range(len(team_ball_control)):
+        seen = np.asarray(team_ball_control[:frame_num + 1])
+        total = max((seen == 1).sum() + (seen == 2).sum(), 1)
+        possession = match_stats.possession(frame_num)
+        assert np.isclose(possession[1], (seen == 1).sum() / total * 100)
+        assert np.isclose(possession[2], (seen == 2).sum() / total * 100)
+
+
+def test_live_appends_match_batch_stats():
+    tracks, team_ball_control = make_tracks(seed=1)
+    batch = MatchStats.from_tracks(tracks, team_ball_control)
+    live = MatchStats()
+    for frame_num, players in enumerate(tracks['players']):
+        carrier = next((track_id for track_id, info in players.items() if info.get('has_ball')), -1)
+        live.append(team_ball_control[frame_num], carrier, players[carrier]['team'] if carrier != -1 else 0,
+                    tracks['ball'][frame_num][1]['position_transformed'])
+        assert live.possession(frame_num) == batch.possession(frame_num)
+        assert live.pass_stats_at(frame_num) == batch.pass_stats_at(frame_num)
+    assert live.pass_stats_at(len(team_ball_control) - 1) == batch.pass_stats_at(len(team_ball_control) - 1)
+
+
+def test_pass_detector_requires_ball_travel_in_metres():
+    pass_detector = PassDetector(min_ball_travel=1.0)
+    assert pass_detector.update(0, 3, 1, [10.0, 30.0]) is None
+    # Same team but the ball only moved 0.5 m: a tackle/deflection, not a pass
+    assert pass_detector.update(1, 4, 1, [10.0, 30.5]) is None
+    assert pass_detector.update(5, 3, 1, [14.0, 30.5]) == (4, 1, True)
+    assert pass_detector.update(9, 8, 2, [20.0, 30.5]) == (3, 1, False)
+    # Too long in flight
+    assert pass_detector.update(100, 9, 2, [0.0, 0.0]) is None
+
+
+def test_pass_network_counts_the_match_stats_successful_passes():
+    tracks, team_ball_control = make_tracks(seed=2)
+    match_stats = MatchStats.from_tracks(tracks, team_ball_control)
+    match_stats.advance(len(team_ball_control))
+    pass_network = PassNetwork()
+    pass_network.construct_pass_network(tracks['players'], tracks['ball'])
+
+    successful = [(frame, passer, receiver) for frame, passer, receiver, ok in match_stats.events if ok]
+    assert successful
+    assert [(frame, passer, receiver) for frame, _, passer, receiver in pass_network.events] == successful
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from player_ball_assigner import PlayerBallAssigner
+
+# The pipeline package imports the trackers, which need the detection stack
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from pipeline.stages import assign_ball_possession
+
+
+def player(x, team):
+    return {'bbox': [x, 100.0, x + 40.0, 200.0], 'team': team}
+
+
+def ball_at(x):
+    return {1: {'bbox': [x - 4.0, 196.0, x + 4.0, 204.0]}}
+
+
+def test_assigns_closest_player_within_threshold():
+    tracks = {
+        'players': [{7: player(100, 1), 9: player(400, 2)}, {7: player(100, 1), 9: player(400, 2)}, {7: player(100, 1)}],
+        'ball': [ball_at(140), ball_at(400), ball_at(800)],
+    }
+    team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner())
+
+    assert tracks['players'][0][7].get('has_ball') and tracks['players'][1][9].get('has_ball')
+    assert not any(info.get('has_ball') for info in tracks['players'][2].values())
+    # The team in control is carried through frames without a holder
+    assert team_ball_control.tolist() == [1, 2, 2]
+
+
+def test_matches_single_frame_assignment():
+    rng = np.random.default_rng(0)
+    player_tracks, ball_tracks = [], []
+    for _ in range(40):
+        player_tracks.append({track_id: player(float(x), 1) for track_id, x in enumerate(rng.uniform(0, 1000, 6))})
+        ball_tracks.append(ball_at(float(rng.uniform(0, 1000))))
+    assigner = PlayerBallAssigner()
+    player_ids, _, player_bboxes, ball_centers = assigner.stack_tracks(player_tracks, ball_tracks)
+
+    assigned_players = assigner.assign_ball_to_players(player_ids, player_bboxes, ball_centers)
+    expected = [PlayerBallAssigner().assign_ball_to_player(players, ball[1]['bbox']) for players, ball in zip(player_tracks, ball_tracks)]
+    assert assigned_players.tolist() == expected
+
+
+def test_hysteresis_delays_holder_changes():
+    assigned_players = np.array([7, 7, 9, 7, 9, 9, 9, 9])
+    assert PlayerBallAssigner(hysteresis_frames=3).apply_hysteresis(assigned_players).tolist() == [7, 7, 7, 7, 7, 7, 9, 9]
+
+
+def test_hysteresis_does_not_carry_an_absent_holder():
+    # Player 7 holds the ball in frames 0-1; only player 9 is tracked in frames 2-3
+    tracks = {
+        'players': [{7: player(100, 1), 9: player(400, 2)}, {7: player(100, 1), 9: player(400, 2)},
+                    {9: player(400, 2)}, {9: player(400, 2)}],
+        'ball': [ball_at(140), ball_at(140), ball_at(400), ball_at(400)],
+    }
+    team_ball_control = assign_ball_possession(tracks, PlayerBallAssigner(hysteresis_frames=3))
+
+    assert [sorted(track_id for track_id, info in frame.items() if info.get('has_ball')) for frame in tracks['players']] == [[7], [7], [], []]
+    # Nobody visibly holds the ball in frames 2-3, so team 1 keeps control instead of dropping to 0
+    assert team_ball_control.tolist() == [1, 1, 1, 1]
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('ultralytics')
+pytest.importorskip('supervision')
+from pipeline import StageProfiler
+
+
+def test_added_stages_are_children_of_the_running_stage(capsys):
+    profiler = StageProfiler()
+    with profiler.stage('live') as stage:
+        profiler.add_stage('detection', 0.5, frames=10, ms_per_frame=50.0)
+        stage['frames'] = 10
+    detection, live = profiler.stages
+    assert detection['parent'] == 'live' and live['parent'] is None
+    assert detection['fps'] == 20 and detection['ms_per_frame'] == 50.0
+    profiler.print_report()
+    assert 'detection' in capsys.readouterr().out
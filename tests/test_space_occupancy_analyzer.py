@@ -0,0 +1,23 @@
+import numpy as np
+from tactical_analysis.space_occupancy_analyzer import SpaceOccupancyAnalyzer
+from view_transformer import ViewTransformer
+
+
+def test_pitch_control_grid_covers_the_calibrated_court():
+    view_transformer = ViewTransformer()
+    analyzer = SpaceOccupancyAnalyzer(control_cell_size=1.0)
+    assert analyzer.control_size == (view_transformer.court_length, view_transformer.court_width)
+    assert analyzer.control_shape == (68, 24)
+
+
+def test_players_outside_the_calibrated_area_do_not_control_cells():
+    analyzer = SpaceOccupancyAnalyzer(control_cell_size=1.0)
+    player_tracks = [{1: {'position_transformed': [5.0, 10.0], 'team': 1, 'in_calibrated_area': True},
+                      2: {'position_transformed': [20.0, 60.0], 'team': 2, 'in_calibrated_area': True},
+                      # Extrapolated next to team 1's player, would otherwise take its cells
+                      3: {'position_transformed': [-2.0, 10.0], 'team': 2, 'in_calibrated_area': False}}]
+    windows, frame_share = analyzer.analyze_pitch_control(player_tracks)
+    assert windows.shape == (1, 68, 24)
+    assert windows[0, 10, 5] == 1
+    assert windows[0, 60, 20] == 0
+    assert 0.4 < frame_share[0] < 0.6
@@ -0,0 +1,104 @@
+import copy
+import numpy as np
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from track_store import TrackStore
+from utils import measure_distance
+
+
+def reference_speed_and_distance(tracks, frame_window=3, frame_rate=24, min_time_elapsed=0.1):
+    # The per-window loop the vectorized estimator replaced
+    total_distance = {}
+    for object, object_tracks in tracks.items():
+        if object == "referees":
+            continue
+        number_of_frames = len(object_tracks)
+        for frame_num in range(5, number_of_frames, frame_window):
+            last_frame = min(frame_num + frame_window, number_of_frames - 1)
+            for track_id in object_tracks[frame_num]:
+                if track_id not in object_tracks[last_frame]:
+                    continue
+                start_position = object_tracks[frame_num][track_id]['position_transformed']
+                end_position = object_tracks[last_frame][track_id]['position_transformed']
+                if start_position is None or end_position is None:
+                    continue
+                distance_covered = measure_distance(start_position, end_position)
+                time_elapsed = (last_frame - frame_num) / frame_rate
+                if time_elapsed < min_time_elapsed:
+                    continue
+                total_distance.setdefault(object, {}).setdefault(track_id, 0)
+                total_distance[object][track_id] += distance_covered
+                for frame_num_batch in range(frame_num, last_frame):
+                    if track_id not in object_tracks[frame_num_batch]:
+                        continue
+                    object_tracks[frame_num_batch][track_id]['speed'] = distance_covered / time_elapsed * 3.6
+                    object_tracks[frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
+
+
+def make_tracks(num_frames=62, num_players=6, seed=0):
+    rng = np.random.default_rng(seed)
+    tracks = {'players': [{} for _ in range(num_frames)], 'referees': [{} for _ in range(num_frames)],
+              'ball': [{} for _ in range(num_frames)]}
+    for object, track_ids in (('players', range(1, num_players + 1)), ('referees', [50]), ('ball', [1])):
+        for track_id in track_ids:
+            walk = np.cumsum(rng.normal(0, 0.3, size=(num_frames, 2)), axis=0) + rng.uniform(0, 20, size=2)
+            for frame_num in range(num_frames):
+                tracks[object][frame_num][track_id] = {'position_transformed': walk[frame_num].tolist()}
+    # A track without a transformed position (outside the calibrated area) for a few frames
+    for frame_num in range(20, 26):
+        tracks['players'][frame_num][3]['position_transformed'] = None
+    return tracks
+
+
+def assert_same_speed_and_distance(tracks, expected):
+    for object in tracks:
+        for frame, expected_frame in zip(tracks[object], expected[object]):
+            assert frame.keys() == expected_frame.keys()
+            for track_id, info in frame.items():
+                expected_info = expected_frame[track_id]
+                assert ('speed' in info) == ('speed' in expected_info)
+                if 'speed' in info:
+                    assert np.isclose(info['speed'], expected_info['speed'], rtol=0, atol=1e-9)
+                    assert np.isclose(info['distance'], expected_info['distance'], rtol=0, atol=1e-9)
+
+
+def test_matches_reference_loop_without_gaps():
+    tracks = make_tracks()
+    expected = copy.deepcopy(tracks)
+    reference_speed_and_distance(expected)
+
+    SpeedAndDistance_Estimator(frame_rate=24).add_speed_and_distance_to_tracks(tracks)
+    assert_same_speed_and_distance(tracks, expected)
+    assert any('speed' in info for frame in tracks['players'] for info in frame.values())
+
+
+def test_track_store_variant_matches_dict_tracks():
+    tracks = make_tracks(seed=1)
+    store = TrackStore.from_tracks(tracks)
+    estimator = SpeedAndDistance_Estimator(frame_rate=24)
+    estimator.add_speed_and_distance_to_tracks(tracks)
+    estimator.add_speed_and_distance_to_track_store(store)
+
+    restored = store.to_tracks()
+    for object in tracks:
+        for frame, restored_frame in zip(tracks[object], restored[object]):
+            for track_id, info in frame.items():
+                assert ('speed' in info) == ('speed' in restored_frame[track_id])
+                if 'speed' in info:
+                    # Positions are float32 columns in the store
+                    assert np.isclose(info['speed'], restored_frame[track_id]['speed'], rtol=1e-4, atol=1e-3)
+
+
+def test_gap_is_measured_over_the_frames_seen():
+    # Seen at frames 5 and 7 of the window [5, 8) only; 1 m in 2 frames at 10 fps
+    tracks = {'players': [{} for _ in range(12)]}
+    tracks['players'][5][9] = {'position_transformed': [0.0, 0.0]}
+    tracks['players'][7][9] = {'position_transformed': [1.0, 0.0]}
+    SpeedAndDistance_Estimator(frame_rate=10).add_speed_and_distance_to_tracks(tracks)
+
+    assert np.isclose(tracks['players'][5][9]['speed'], 1.0 / 0.2 * 3.6)
+    assert tracks['players'][7][9]['distance'] == 1.0
+
+
+def test_default_window_covers_min_time_elapsed_at_high_frame_rates():
+    assert SpeedAndDistance_Estimator(frame_rate=24).frame_window == 3
+    assert SpeedAndDistance_Estimator(frame_rate=50).frame_window / 50 >= 0.1
@@ -0,0 +1,82 @@
+import json
+import os
+import numpy as np
+import pytest
+from stage_cache import StageCache
+from stage_cache import stage_cache as stage_cache_module
+
+
+def make_tracks():
+    return {
+        'players': [{3: {'bbox': [1.0, 2.0, 3.0, 4.0]}, 4: {'bbox': [5.0, 6.0, 7.0, 8.0]}}, {4: {'bbox': [5.5, 6.0, 7.5, 8.0]}}],
+        'referees': [{}, {}],
+        'ball': [{}, {1: {'bbox': [10.0, 10.0, 12.0, 12.0]}}],
+    }
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_tracks_and_camera_movement_round_trip(tmp_path, compress):
+    cache = StageCache(str(tmp_path), compress=compress)
+    tracks_key, camera_key = cache.make_key('tracks', conf=0.1), cache.make_key('camera_movement')
+
+    assert cache.load_tracks(tracks_key) is None
+    cache.save_tracks(tracks_key, make_tracks())
+    cache.save_camera_movement(camera_key, [[0.0, 0.0], [1.5, -2.0]])
+
+    assert cache.load_tracks(tracks_key) == make_tracks()
+    assert cache.load_camera_movement(camera_key) == [[0.0, 0.0], [1.5, -2.0]]
+    assert cache.report()['hits'] == 2 and cache.report()['misses'] == 1
+
+
+def test_key_depends_on_file_content_and_params(tmp_path):
+    video_path = tmp_path / 'video.bin'
+    video_path.write_bytes(b'first')
+    cache = StageCache(str(tmp_path / 'cache'))
+    key = cache.make_key('tracks', str(video_path), conf=0.1)
+
+    assert cache.make_key('tracks', str(video_path), conf=0.1) == key
+    assert cache.make_key('tracks', str(video_path), conf=0.2) != key
+    video_path.write_bytes(b'second')
+    os.utime(video_path, ns=(0, 0))
+    assert cache.make_key('tracks', str(video_path), conf=0.1) != key
+
+
+def test_old_schema_entry_is_dropped(tmp_path, monkeypatch):
+    cache = StageCache(str(tmp_path))
+    key = cache.make_key('camera_movement')
+    cache.save_camera_movement(key, [[1.0, 1.0]])
+    monkeypatch.setattr(stage_cache_module, 'SCHEMA_VERSION', stage_cache_module.SCHEMA_VERSION + 1)
+
+    assert cache.load_camera_movement(key) is None
+    assert not os.path.exists(cache.entry_dir(key))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes=None)
+    arrays = {'values': np.zeros(1000)}
+    for name in ('a', 'b', 'c'):
+        cache.save(name, arrays)
+    # 'a' is used most recently, so 'b' goes first
+    for name, last_access in (('a', 3.0), ('b', 1.0), ('c', 2.0)):
+        meta = cache.read_meta(name)
+        meta['last_access'] = last_access
+        with open(os.path.join(cache.entry_dir(name), 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    # meta.json sizes differ by the digits of the timestamps, so budget exactly two entries
+    cache.max_bytes = cache.entry_size('a') + cache.entry_size('c')
+    cache.evict()
+    assert sorted(cache.entries()) == ['a', 'c']
+
+
+def test_truncated_meta_is_a_miss(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes=10 ** 9)
+    key = cache.make_key('camera_movement')
+    cache.save_camera_movement(key, [[1.0, 1.0]])
+    with open(os.path.join(cache.entry_dir(key), 'meta.json'), 'w') as f:
+        f.write('{"schema_version": 1, "form')
+
+    assert cache.load_camera_movement(key) is None
+    cache.save_camera_movement(key, [[2.0, 2.0]])
+    assert cache.load_camera_movement(key) == [[2.0, 2.0]]
+    assert not any(name.endswith('.tmp') for name in os.listdir(cache.entry_dir(key)))
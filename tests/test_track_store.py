@@ -0,0 +1,38 @@
+import numpy as np
+from track_store import TrackStore
+
+
+def make_tracks():
+    # Values exactly representable in float32, so the round trip is exact
+    return {
+        'players': [
+            {1: {'bbox': [10.0, 20.0, 30.0, 60.0], 'team': 1, 'has_ball': True, 'speed': None},
+             7: {'bbox': [100.0, 20.0, 120.0, 70.0], 'team': 2, 'position': [110, 70]}},
+            {},
+            {7: {'bbox': [101.5, 21.0, 121.5, 71.0], 'team': 2, 'team_color': [0.5, 128.0, 255.0], 'jersey': '10'}},
+        ],
+        'ball': [{1: {'bbox': [50.0, 50.0, 58.0, 58.0]}}, {}, {}],
+    }
+
+
+def test_tracks_round_trip():
+    tracks = make_tracks()
+    assert TrackStore.from_tracks(tracks).to_tracks() == tracks
+
+
+def test_dict_view_reads_and_writes_columns():
+    store = TrackStore.from_tracks(make_tracks())
+    view = store.as_tracks()
+    assert len(view['players']) == 3
+    assert set(view['players'][0]) == {1, 7}
+    assert view['players'][0][1]['speed'] is None
+    view['players'][2][7]['speed'] = 4.5
+    assert store['players'].get('speed')[store['players'].frame_rows(2)].tolist() == [4.5]
+
+
+def test_arrays_round_trip_drops_extras_only():
+    tracks = make_tracks()
+    restored = TrackStore.from_arrays(TrackStore.from_tracks(tracks).to_arrays()).to_tracks()
+    del tracks['players'][2][7]['jersey']
+    assert restored == tracks
+    assert all(isinstance(array, np.ndarray) for array in TrackStore.from_tracks(tracks).to_arrays().values())
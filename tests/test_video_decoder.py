@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+from utils import VideoDecoder
+from utils import video_decoder
+from camera_movement_estimator import CameraMovementEstimator
+from team_assigner import TeamAssigner
+
+
+def make_frames(num_frames=30, size=(64, 48)):
+    # Every frame filled with its own index, so a decoded frame tells where it came from
+    return [np.full((size[1], size[0], 3), frame_num * 8, dtype=np.uint8) for frame_num in range(num_frames)]
+
+
+def write_video(path, frames, fps=24):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (frames[0].shape[1], frames[0].shape[0]))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+class KeyframeSeekCapture:
+    """Capture whose seeks land on the previous keyframe while reporting the requested frame."""
+    def __init__(self, frames, fps=24, keyframe_interval=10):
+        self.frames = frames
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.position = 0
+        self.requested = 0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.requested = int(value)
+            self.position = int(value) // self.keyframe_interval * self.keyframe_interval
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_POS_FRAMES: self.requested, cv2.CAP_PROP_POS_MSEC: (self.position - 1) * 1000 / self.fps,
+                cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: len(self.frames),
+                cv2.CAP_PROP_FRAME_WIDTH: self.frames[0].shape[1], cv2.CAP_PROP_FRAME_HEIGHT: self.frames[0].shape[0]}[prop]
+
+    def grab(self):
+        if self.position >= len(self.frames):
+            return False
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        return True, self.frames[self.position - 1].copy()
+
+    def read(self):
+        return self.retrieve() if self.grab() else (False, None)
+
+    def release(self):
+        pass
+
+
+def test_frames_from_a_start_frame_match_sequential_decoding(tmp_path):
+    frames = make_frames()
+    write_video(tmp_path / 'video.avi', frames)
+    decoder = VideoDecoder(str(tmp_path / 'video.avi'), read_ahead=4)
+    sequential = decoder.read()
+    assert len(sequential) == len(frames)
+    for start_frame in (1, 13, 29):
+        decoded = decoder.read(start_frame, start_frame + 3)
+        assert len(decoded) == min(3, len(frames) - start_frame)
+        for offset, frame in enumerate(decoded):
+            assert np.array_equal(frame, sequential[start_frame + offset])
+
+
+def test_inexact_seek_falls_back_to_skipping_frames(monkeypatch):
+    frames = make_frames()
+    monkeypatch.setattr(video_decoder.cv2, 'VideoCapture', lambda path: KeyframeSeekCapture(frames))
+    decoder = VideoDecoder('keyframes.mp4')
+    decoded = decoder.read(13, 16, view=None)
+    assert [frame.frame_num for frame in decoded] == [13, 14, 15]
+    assert [int(frame.bgr[0, 0, 0]) for frame in decoded] == [13 * 8, 14 * 8, 15 * 8]
+    # A seek to a keyframe is exact and is kept
+    assert [int(frame[0, 0, 0]) for frame in decoder.read(20, 21)] == [20 * 8]
+
+
+def test_small_views_are_downscaled_on_the_decoder_thread(tmp_path):
+    frames = make_frames(4, size=(90, 54))
+    write_video(tmp_path / 'video.avi', frames)
+    decoder = VideoDecoder(str(tmp_path / 'video.avi'), views=('small_bgr', 'small_gray'), scale=0.5)
+    assert decoder.frame_size == (90, 54) and decoder.small_size == (45, 27)
+    for decoded in decoder.frames():
+        # Built before the frame is handed over
+        assert decoded._small_bgr is not None and decoded._small_gray is not None
+        assert decoded.small_bgr.shape == (27, 45, 3) and decoded.small_gray.shape == (27, 45)
+        assert abs(int(decoded.small_gray[5, 5]) - int(decoded.gray[10, 10])) <= 2
+
+    # max_size caps the longest side, but never upscales
+    assert VideoDecoder(str(tmp_path / 'video.avi'), max_size=45).small_size == (45, 27)
+    assert VideoDecoder(str(tmp_path / 'video.avi'), scale=0.5, max_size=640).small_size == (45, 27)
+
+
+def test_fast_camera_movement_takes_the_small_gray_view(tmp_path):
+    # Textured background shifted by 12 pixels per frame
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (600, 1400), dtype=np.uint8), (5, 5), 0)
+    frames = [cv2.cvtColor(background[:, 200 - 12 * i:1400 - 12 * i], cv2.COLOR_GRAY2BGR) for i in range(4)]
+    decoded = [video_decoder.DecodedFrame(frame_num, frame, scale=0.5) for frame_num, frame in enumerate(frames)]
+
+    full, small = CameraMovementEstimator(frames[0], fast=True), CameraMovementEstimator(frames[0], fast=True)
+    movements = [small.update_camera_movement(frame.small_gray) for frame in decoded]
+    assert movements == [full.update_camera_movement(frame.bgr) for frame in decoded]
+    assert [round(movement[0]) for movement in movements] == [0, -12, -12, -12]
+
+
+def test_team_colours_from_the_small_view_match_full_resolution():
+    frame = np.zeros((400, 600, 3), dtype=np.uint8)
+    frame[100:140, 200:220] = (0, 0, 255)
+    frame[200:240, 400:420] = (255, 0, 0)
+    bboxes = [[190, 100, 230, 180], [390, 200, 430, 280]]
+    decoded = video_decoder.DecodedFrame(0, frame, scale=0.5)
+
+    team_assigner = TeamAssigner()
+    full = team_assigner.get_player_colors(decoded.bgr, bboxes)
+    small = team_assigner.get_player_colors(decoded.small_bgr, bboxes, frame_scale=0.5)
+    assert np.allclose(full, small, atol=8)
+    assert np.argmax(small[0]) == 2 and np.argmax(small[1]) == 0
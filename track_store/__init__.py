@@ -0,0 +1 @@
+from .track_store import TrackStore, TrackTable
\ No newline at end of file
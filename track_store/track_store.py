@@ -0,0 +1,266 @@
+from collections.abc import Mapping, MutableMapping, Sequence
+import numpy as np
+
+# Known per-object keys stored as columns: name -> (dtype, width, fill value)
+COLUMNS = {
+    'bbox': (np.float32, 4, np.nan),
+    'position': (np.float32, 2, np.nan),
+    'position_adjusted': (np.float32, 2, np.nan),
+    'position_transformed': (np.float32, 2, np.nan),
+    'in_calibrated_area': (np.bool_, 1, False),
+    'team': (np.int8, 1, 0),
+    'team_color': (np.float32, 3, np.nan),
+    'speed': (np.float32, 1, np.nan),
+    'distance': (np.float32, 1, np.nan),
+    'has_ball': (np.bool_, 1, False),
+}
+
+
+class TrackTable:
+    """
+    Columnar storage for one object class ("players", "referees", "ball").
+    Rows are sorted by frame; frame_offsets[f]:frame_offsets[f+1] are the rows of frame f.
+    Each column has a presence mask so that missing keys and keys set to None
+    keep the same meaning they have in the dict-based tracks.
+    Keys that are not known columns are kept per row in `extras`.
+    """
+    def __init__(self, num_frames, frame, track_id, columns=None, present=None, extras=None):
+        self.num_frames = num_frames
+        self.frame = np.asarray(frame, dtype=np.int32)
+        self.track_id = np.asarray(track_id, dtype=np.int64)
+        self.columns = {}
+        self.present = {}
+        for name, (dtype, width, fill) in COLUMNS.items():
+            shape = (len(self.frame), width) if width > 1 else (len(self.frame),)
+            if columns is not None and name in columns:
+                self.columns[name] = np.asarray(columns[name], dtype=dtype).reshape(shape)
+            else:
+                self.columns[name] = np.full(shape, fill, dtype=dtype)
+            if present is not None and name in present:
+                self.present[name] = np.asarray(present[name], dtype=bool)
+            else:
+                self.present[name] = np.zeros(len(self.frame), dtype=bool)
+        self.extras = extras if extras is not None else {}
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(num_frames + 1)).astype(np.int64)
+        self._track_index = None
+
+    @classmethod
+    def from_frames(cls, object_tracks):
+        frame, track_id, rows = [], [], []
+        for frame_num, track in enumerate(object_tracks):
+            for tid, track_info in track.items():
+                frame.append(frame_num)
+                track_id.append(tid)
+                rows.append(track_info)
+
+        table = cls(len(object_tracks), frame, track_id)
+        for row, track_info in enumerate(rows):
+            for key, value in track_info.items():
+                table.set_row(row, key, value)
+        return table
+
+    def __len__(self):
+        return len(self.frame)
+
+    def frame_rows(self, frame_num):
+        return slice(int(self.frame_offsets[frame_num]), int(self.frame_offsets[frame_num + 1]))
+
+    def _build_track_index(self):
+        # Rows grouped by track id, each group ordered by frame
+        order = np.lexsort((self.frame, self.track_id))
+        ids, starts = np.unique(self.track_id[order], return_index=True)
+        offsets = np.append(starts, len(order)).astype(np.int64)
+        self._track_index = (order, ids, offsets)
+        return self._track_index
+
+    def track_index(self):
+        return self._track_index if self._track_index is not None else self._build_track_index()
+
+    def track_ids(self):
+        return self.track_index()[1]
+
+    def track_rows(self, track_id):
+        order, ids, offsets = self.track_index()
+        i = np.searchsorted(ids, track_id)
+        if i >= len(ids) or ids[i] != track_id:
+            return order[:0]
+        return order[offsets[i]:offsets[i + 1]]
+
+    def get(self, name, rows=slice(None)):
+        return self.columns[name][rows]
+
+    def set(self, name, values, rows=slice(None)):
+        # Bulk write of a column; NaN rows of float columns count as missing
+        self.columns[name][rows] = values
+        self.present[name][rows] = True
+
+    def set_row(self, row, key, value):
+        if key not in COLUMNS:
+            self.extras.setdefault(row, {})[key] = value
+            return
+        dtype, width, fill = COLUMNS[key]
+        self.present[key][row] = True
+        if value is None:
+            self.columns[key][row] = fill
+        elif width > 1:
+            self.columns[key][row] = np.asarray(value, dtype=dtype).ravel()[:width]
+        else:
+            self.columns[key][row] = value
+
+    def get_row(self, row, key):
+        if key not in COLUMNS:
+            return self.extras[row][key]
+        if not self.present[key][row]:
+            raise KeyError(key)
+        dtype, width, fill = COLUMNS[key]
+        value = self.columns[key][row]
+        if width > 1:
+            if np.isnan(value).all():
+                return None
+            return value.tolist()
+        if dtype == np.float32 and np.isnan(value):
+            return None
+        return value.item()
+
+    def row_keys(self, row):
+        keys = [name for name in COLUMNS if self.present[name][row]]
+        return keys + list(self.extras.get(row, {}))
+
+    def to_frames(self):
+        object_tracks = []
+        for frame_num in range(self.num_frames):
+            rows = self.frame_rows(frame_num)
+            object_tracks.append({
+                int(self.track_id[row]): {key: self.get_row(row, key) for key in self.row_keys(row)}
+                for row in range(rows.start, rows.stop)
+            })
+        return object_tracks
+
+
+class TrackStore:
+    """
+    Columnar replacement for the `tracks[object][frame][track_id][key]` structure.
+
+    `as_tracks()` returns a view with the same indexing as the dict-based tracks
+    so existing stages can run on top of the store while they are migrated.
+    """
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        return cls({object: TrackTable.from_frames(object_tracks) for object, object_tracks in tracks.items()})
+
+    def to_tracks(self):
+        return {object: table.to_frames() for object, table in self.tables.items()}
+
+    def to_arrays(self):
+        # Flat {name: array} form for saving; per-row extras are not included
+        arrays = {}
+        for object, table in self.tables.items():
+            arrays[f'{object}.num_frames'] = np.array(table.num_frames)
+            arrays[f'{object}.frame'] = table.frame
+            arrays[f'{object}.track_id'] = table.track_id
+            for name in COLUMNS:
+                if table.present[name].any():
+                    arrays[f'{object}.column.{name}'] = table.columns[name]
+                    arrays[f'{object}.present.{name}'] = table.present[name]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        objects = [name[:-len('.num_frames')] for name in arrays if name.endswith('.num_frames')]
+        tables = {}
+        for object in objects:
+            columns = {name: arrays[f'{object}.column.{name}'] for name in COLUMNS if f'{object}.column.{name}' in arrays}
+            present = {name: arrays[f'{object}.present.{name}'] for name in COLUMNS if f'{object}.present.{name}' in arrays}
+            tables[object] = TrackTable(int(arrays[f'{object}.num_frames']), arrays[f'{object}.frame'],
+                                        arrays[f'{object}.track_id'], columns, present)
+        return cls(tables)
+
+    def as_tracks(self):
+        return {object: TrackFramesView(table) for object, table in self.tables.items()}
+
+    def __getitem__(self, object):
+        return self.tables[object]
+
+    def __contains__(self, object):
+        return object in self.tables
+
+    def items(self):
+        return self.tables.items()
+
+    @property
+    def num_frames(self):
+        return max((table.num_frames for table in self.tables.values()), default=0)
+
+
+class TrackFramesView(Sequence):
+    # tracks[object] -> list-like of frames
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_frames
+
+    def __getitem__(self, frame_num):
+        if isinstance(frame_num, slice):
+            return [TrackFrameView(self.table, f) for f in range(*frame_num.indices(len(self)))]
+        if frame_num < 0:
+            frame_num += len(self)
+        if not 0 <= frame_num < len(self):
+            raise IndexError(frame_num)
+        return TrackFrameView(self.table, frame_num)
+
+
+class TrackFrameView(Mapping):
+    # tracks[object][frame] -> {track_id: row}
+    def __init__(self, table, frame_num):
+        self.table = table
+        self.rows = table.frame_rows(frame_num)
+
+    def _row(self, track_id):
+        ids = self.table.track_id[self.rows]
+        match = np.flatnonzero(ids == track_id)
+        if len(match) == 0:
+            raise KeyError(track_id)
+        return self.rows.start + int(match[0])
+
+    def __getitem__(self, track_id):
+        return TrackRowView(self.table, self._row(track_id))
+
+    def __contains__(self, track_id):
+        return bool((self.table.track_id[self.rows] == track_id).any())
+
+    def __iter__(self):
+        return iter(self.table.track_id[self.rows].tolist())
+
+    def __len__(self):
+        return self.rows.stop - self.rows.start
+
+
+class TrackRowView(MutableMapping):
+    # tracks[object][frame][track_id] -> {key: value}, reads and writes go to the columns
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.get_row(self.row, key)
+
+    def __setitem__(self, key, value):
+        self.table.set_row(self.row, key, value)
+
+    def __delitem__(self, key):
+        if key in COLUMNS:
+            if not self.table.present[key][self.row]:
+                raise KeyError(key)
+            self.table.present[key][self.row] = False
+        else:
+            del self.table.extras[self.row][key]
+
+    def __iter__(self):
+        return iter(self.table.row_keys(self.row))
+
+    def __len__(self):
+        return len(self.table.row_keys(self.row))
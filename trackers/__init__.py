@@ -1 +1,4 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .ball_smoother import BallSmoother
+from .adaptive_stride import AdaptiveStride, measure_tracking_drift
+from .ball_roi_detector import BallROIDetector
\ No newline at end of file
@@ -0,0 +1,272 @@
+from collections import Counter
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_iou_matrix
+from kalman_filter import KalmanFilterBank
+
+
+class AdaptiveStride:
+    """
+    Decides on which frames the detector runs and propagates the tracks of the
+    previous frame to the others.
+
+    Players and referees are moved by the median Lucas-Kanade flow of a grid of
+    points inside their box; when too few points are tracked, and always for the
+    ball, the box follows the constant-velocity prediction of a KalmanFilterBank
+    fed with every box centre. Detection runs when:
+    - stride frames have passed since the last keyframe (the stride grows by one up
+      to max_stride while keyframes agree with the propagated boxes, mean IoU of at
+      least agreement_iou, and drops back to 1 when they do not),
+    - the median flow exceeds motion_threshold pixels per frame,
+    - more than lost_threshold of the boxes could not be followed by the flow,
+    - the mean confidence of the last keyframe was below min_confidence.
+    Every keyframe compares the propagated boxes with the detected ones, which is
+    the drift against full-rate detection at the end of each propagated run.
+    """
+    def __init__(self, max_stride=4, motion_threshold=8.0, lost_threshold=0.3, min_confidence=0.4,
+                 agreement_iou=0.7, flow_scale=0.5, grid_size=3, min_flow_points=3, max_track_age=48):
+        self.max_stride = max_stride
+        self.motion_threshold = motion_threshold
+        self.lost_threshold = lost_threshold
+        self.min_confidence = min_confidence
+        self.agreement_iou = agreement_iou
+        self.flow_scale = flow_scale
+        self.grid_size = grid_size
+        self.min_flow_points = min_flow_points
+        self.max_track_age = max_track_age
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.reset()
+
+    def reset(self):
+        self.previous_gray = None
+        self.previous_tracks = None
+        self.kalman_filter_banks = {}
+        self.observations = Counter()
+        self.stride = 1
+        self.since_keyframe = 0
+        self.confidence = 1.0
+        self.frames = 0
+        self.keyframes = 0
+        self.triggers = Counter()
+        self.drift_iou = []
+        self.drift_center_error = []
+
+    def get_cache_params(self):
+        return {'max_stride': self.max_stride, 'motion_threshold': self.motion_threshold, 'lost_threshold': self.lost_threshold,
+                'min_confidence': self.min_confidence, 'agreement_iou': self.agreement_iou, 'flow_scale': self.flow_scale,
+                'grid_size': self.grid_size, 'min_flow_points': self.min_flow_points, 'max_track_age': self.max_track_age}
+
+    def to_gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.flow_scale != 1:
+            gray = cv2.resize(gray, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def get_flow_points(self, bboxes):
+        # grid_size x grid_size points over the central part of every box, in flow image coordinates
+        steps = (np.arange(self.grid_size) + 1) / (self.grid_size + 1)
+        fx, fy = np.meshgrid(0.2 + 0.6 * steps, 0.2 + 0.6 * steps)
+        fx, fy = fx.ravel(), fy.ravel()
+        x = bboxes[:, None, 0] + (bboxes[:, None, 2] - bboxes[:, None, 0]) * fx
+        y = bboxes[:, None, 1] + (bboxes[:, None, 3] - bboxes[:, None, 1]) * fy
+        return (np.stack([x, y], axis=-1) * self.flow_scale).astype(np.float32)
+
+    def get_box_motion(self, gray, bboxes):
+        # (N,2) median displacement in full-resolution pixels and (N,) whether enough points were tracked
+        if len(bboxes) == 0:
+            return np.zeros((0, 2)), np.zeros(0, dtype=bool)
+        points = self.get_flow_points(bboxes)
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, gray, points.reshape(-1, 1, 2), None, **self.lk_params)
+        status = status.reshape(len(bboxes), -1).astype(bool)
+        displacement = (new_points.reshape(points.shape) - points) / self.flow_scale
+        displacement = np.where(status[..., None], displacement, np.nan)
+        tracked = status.sum(axis=1) >= self.min_flow_points
+        motion = np.where(tracked[:, None], np.nanmedian(np.where(tracked[:, None, None], displacement, 0), axis=1), 0)
+        return motion, tracked
+
+    def update_kalman(self, object, frame_tracks, frame_num):
+        # Feed every box centre of the frame to the object's filter bank
+        if not frame_tracks:
+            return
+        bank = self.kalman_filter_banks.setdefault(object, KalmanFilterBank(process_noise=1.0, measurement_noise=1.0))
+        track_ids = list(frame_tracks)
+        bboxes = np.array([frame_tracks[track_id]['bbox'] for track_id in track_ids], dtype=np.float64)
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+        # New tracks start at their first centre with an uncertain velocity instead of at the origin
+        new = [i for i, track_id in enumerate(track_ids) if track_id not in bank.slot_of]
+        if new:
+            slots = bank.get_slots([track_ids[i] for i in new])
+            bank.state[slots] = np.hstack([centers[new], np.zeros((len(new), 2))])
+            bank.cov[slots] = np.eye(4) * 10
+        bank.step(track_ids, centers, frame_num)
+        bank.drop_stale(frame_num, self.max_track_age)
+        self.observations.update((object, track_id) for track_id in track_ids)
+
+    def predict_kalman(self, object, track_id):
+        # Next centre from the constant-velocity state, None until the track has a velocity
+        bank = self.kalman_filter_banks.get(object)
+        if bank is None or self.observations[(object, track_id)] < 2 or track_id not in bank.slot_of:
+            return None
+        state = bank.state[bank.slot_of[track_id]]
+        return state[:2] + state[2:]
+
+    def propagate(self, gray):
+        # Tracks of the current frame predicted from the previous one; returns (tracks, median motion, lost fraction)
+        rows = [(object, track_id, track_info['bbox']) for object, frame_tracks in self.previous_tracks.items()
+                for track_id, track_info in frame_tracks.items()]
+        bboxes = np.array([bbox for _, _, bbox in rows], dtype=np.float64).reshape(-1, 4)
+        is_ball = np.array([object == "ball" for object, _, _ in rows], dtype=bool)
+
+        # One flow call for every player and referee box; the ball is too small to carry flow points
+        motion, tracked = np.zeros((len(rows), 2)), np.zeros(len(rows), dtype=bool)
+        motion[~is_ball], tracked[~is_ball] = self.get_box_motion(gray, bboxes[~is_ball])
+
+        propagated = {object: {} for object in self.previous_tracks}
+        for i, (object, track_id, _) in enumerate(rows):
+            shift = motion[i]
+            if not tracked[i]:
+                center = self.predict_kalman(object, track_id)
+                if center is None:
+                    continue
+                shift = center - (bboxes[i, :2] + bboxes[i, 2:]) / 2
+            propagated[object][track_id] = {'bbox': (bboxes[i] + np.tile(shift, 2)).tolist(), 'propagated': True}
+
+        num_boxes = (~is_ball).sum()
+        median_motion = float(np.median(np.linalg.norm(motion[tracked], axis=1))) if tracked.any() else 0.0
+        lost = (~tracked[~is_ball]).sum() / num_boxes if num_boxes else 0.0
+        return propagated, median_motion, float(lost)
+
+    def step(self, frame):
+        """
+        Start a frame. Returns (detect, propagated tracks): when detect is True the
+        caller runs the detector and passes the detected tracks to keyframe();
+        otherwise it uses the propagated tracks (and calls keyframe() with them too).
+        """
+        gray = self.to_gray(frame)
+        self.frames += 1
+        propagated, motion, lost = None, 0.0, 0.0
+        if self.previous_tracks is not None:
+            propagated, motion, lost = self.propagate(gray)
+        self.current_gray = gray
+
+        if propagated is None:
+            trigger = 'first_frame'
+        elif self.since_keyframe + 1 >= self.stride:
+            trigger = 'stride'
+        elif motion > self.motion_threshold:
+            trigger = 'motion'
+        elif lost > self.lost_threshold:
+            trigger = 'track_loss'
+        elif self.confidence < self.min_confidence:
+            trigger = 'low_confidence'
+        else:
+            trigger = None
+        if trigger is not None:
+            self.triggers[trigger] += 1
+        return trigger is not None, propagated
+
+    def keyframe(self, frame_tracks, propagated=None, confidence=None):
+        """
+        Finish the frame started by step() with its tracks: the detected ones on a
+        keyframe (then propagated and confidence are the step() prediction and the
+        mean detection confidence), the propagated ones otherwise.
+        """
+        frame_num = self.frames - 1
+        if confidence is not None:
+            self.keyframes += 1
+            self.since_keyframe = 0
+            self.confidence = confidence
+            if propagated is not None:
+                agreement = self.measure_drift(propagated, frame_tracks)
+                self.stride = min(self.stride + 1, self.max_stride) if agreement >= self.agreement_iou else 1
+        else:
+            self.since_keyframe += 1
+        for object, object_tracks in frame_tracks.items():
+            self.update_kalman(object, object_tracks, frame_num)
+        self.previous_tracks = frame_tracks
+        self.previous_gray = self.current_gray
+
+    def measure_drift(self, propagated, detected):
+        # Mean best IoU of the detected player/referee boxes with the propagated ones; records centre errors too
+        ious = []
+        for object in ("players", "referees"):
+            detected_boxes = [track_info['bbox'] for track_info in detected.get(object, {}).values()]
+            propagated_boxes = [track_info['bbox'] for track_info in propagated.get(object, {}).values()]
+            if not detected_boxes:
+                continue
+            if not propagated_boxes:
+                ious.extend([0.0] * len(detected_boxes))
+                continue
+            iou = get_iou_matrix(detected_boxes, propagated_boxes)
+            best = iou.argmax(axis=1)
+            ious.extend(iou.max(axis=1).tolist())
+            detected_boxes, propagated_boxes = np.array(detected_boxes), np.array(propagated_boxes)[best]
+            centers = (detected_boxes[:, :2] + detected_boxes[:, 2:]) / 2 - (propagated_boxes[:, :2] + propagated_boxes[:, 2:]) / 2
+            self.drift_center_error.extend(np.linalg.norm(centers, axis=1).tolist())
+        self.drift_iou.extend(ious)
+        return float(np.mean(ious)) if ious else 1.0
+
+    def report(self):
+        return {
+            'frames': self.frames,
+            'keyframes': self.keyframes,
+            'duty_cycle': self.keyframes / self.frames if self.frames else 0.0,
+            'triggers': dict(self.triggers),
+            'keyframe_mean_iou': float(np.mean(self.drift_iou)) if self.drift_iou else None,
+            'keyframe_mean_center_error': float(np.mean(self.drift_center_error)) if self.drift_center_error else None,
+        }
+
+    def print_report(self):
+        report = self.report()
+        print(f"Detector ran on {report['keyframes']}/{report['frames']} frames (duty cycle {report['duty_cycle']:.0%}), "
+              f"triggers: {report['triggers']}")
+        if report['keyframe_mean_iou'] is not None:
+            print(f"Drift at keyframes: mean IoU {report['keyframe_mean_iou']:.3f}, "
+                  f"mean centre error {report['keyframe_mean_center_error']:.1f} px")
+
+
+def measure_tracking_drift(tracks, reference_tracks, objects=("players", "referees")):
+    """
+    Drift of tracks (e.g. from an adaptive-stride run) against reference_tracks
+    from full-rate detection, over every frame. Boxes are matched by best IoU, so
+    the two runs do not need the same track ids. Returns mean IoU, mean centre
+    error in pixels, recall (reference boxes matched with IoU >= 0.5) and
+    id_switches: how often the track matched to a reference track changed id.
+    ByteTrack only sees the keyframes of a strided run, so its lost-track buffer
+    and motion model span stride times more frames; the id switches show whether
+    that breaks the identities the box metrics cannot see.
+    """
+    ious, center_errors = [], []
+    id_switches = 0
+    for object in objects:
+        matched_ids = {}  # reference track id -> last track id matched to it
+        for frame, reference in zip(tracks[object], reference_tracks[object]):
+            reference_ids, reference_boxes = list(reference), [track_info['bbox'] for track_info in reference.values()]
+            track_ids, boxes = list(frame), [track_info['bbox'] for track_info in frame.values()]
+            if not reference_boxes:
+                continue
+            if not boxes:
+                ious.extend([0.0] * len(reference_boxes))
+                continue
+            iou = get_iou_matrix(reference_boxes, boxes)
+            best = iou.argmax(axis=1)
+            ious.extend(iou.max(axis=1).tolist())
+            for i, j in enumerate(best):
+                if iou[i, j] < 0.5:
+                    continue
+                previous_id = matched_ids.get(reference_ids[i])
+                if previous_id is not None and previous_id != track_ids[j]:
+                    id_switches += 1
+                matched_ids[reference_ids[i]] = track_ids[j]
+            reference_boxes, boxes = np.array(reference_boxes), np.array(boxes)[best]
+            center_errors.extend(np.linalg.norm((reference_boxes[:, :2] + reference_boxes[:, 2:]) / 2 - (boxes[:, :2] + boxes[:, 2:]) / 2, axis=1).tolist())
+    ious = np.array(ious)
+    return {
+        'mean_iou': float(ious.mean()) if len(ious) else None,
+        'mean_center_error': float(np.mean(center_errors)) if center_errors else None,
+        'recall': float((ious >= 0.5).mean()) if len(ious) else None,
+        'id_switches': id_switches,
+    }
@@ -0,0 +1,134 @@
+from collections import Counter
+import numpy as np
+import supervision as sv
+import sys
+sys.path.append('../')
+from utils import get_center_of_bbox
+from kalman_filter import KalmanFilterBank
+
+
+class BallROIDetector:
+    """
+    Second detector pass for the ball on a small full-resolution window.
+
+    The full-frame pass sees the ball after the frame has been downscaled to the
+    model input size (full_imgsz), where it is only a few pixels wide. Once the
+    ball is locked, every frame is cropped to a roi_size window around the
+    position predicted by a constant-velocity KalmanFilterBank and only that crop
+    goes through the model, at imgsz=roi_size so without downscaling:
+    - the most confident ball in the crop replaces the full-frame ball,
+    - without one, a full-frame ball within gate_distance pixels (per missed frame)
+      of the prediction is kept and any other full-frame ball is dropped,
+    - after max_misses frames in a row without a ball the lock is lost.
+    While the ball is not locked this falls back to the full-frame search: the
+    full-frame ball is kept as it is and locks the filter again.
+    """
+    def __init__(self, model, roi_size=320, conf=0.1, max_misses=5, gate_distance=80, full_imgsz=640):
+        self.model = model
+        self.roi_size = roi_size
+        self.conf = conf
+        self.max_misses = max_misses
+        self.gate_distance = gate_distance
+        self.full_imgsz = full_imgsz
+        self.reset()
+
+    def reset(self):
+        self.frame_num = 0
+        self.kalman_filter_bank = None  # None while the ball is not locked
+        self.misses = 0
+        self.sources = Counter()
+        self.roi_passes = 0
+
+    def get_cache_params(self):
+        return {'roi_size': self.roi_size, 'conf': self.conf, 'max_misses': self.max_misses,
+                'gate_distance': self.gate_distance}
+
+    def lock(self, bbox):
+        # Start a filter at the ball centre, at rest and with a loose covariance
+        self.kalman_filter_bank = KalmanFilterBank(process_noise=1.0, measurement_noise=1.0)
+        slots = self.kalman_filter_bank.get_slots([1])
+        self.kalman_filter_bank.state[slots] = [*get_center_of_bbox(bbox), 0, 0]
+        self.kalman_filter_bank.cov[slots] = np.eye(4) * 10
+        self.misses = 0
+
+    def predict(self):
+        if self.kalman_filter_bank is None:
+            return None
+        return self.kalman_filter_bank.predict(self.kalman_filter_bank.get_slots([1]))[0]
+
+    def correct(self, bbox):
+        self.kalman_filter_bank.correct(self.kalman_filter_bank.get_slots([1]), [get_center_of_bbox(bbox)])
+        self.misses = 0
+
+    def get_roi(self, frame, center):
+        # Top-left corner and size of the window around center, shifted to stay inside the frame
+        height, width = frame.shape[:2]
+        size_x, size_y = min(self.roi_size, width), min(self.roi_size, height)
+        x1 = int(np.clip(center[0] - size_x / 2, 0, width - size_x))
+        y1 = int(np.clip(center[1] - size_y / 2, 0, height - size_y))
+        return x1, y1, size_x, size_y
+
+    def detect_roi(self, frame, center):
+        # Most confident ball in the window around center, in frame coordinates, or None
+        x1, y1, size_x, size_y = self.get_roi(frame, center)
+        result = self.model.predict(frame[y1:y1 + size_y, x1:x1 + size_x], imgsz=self.roi_size, conf=self.conf, verbose=False)[0]
+        self.roi_passes += 1
+
+        detections = sv.Detections.from_ultralytics(result)
+        cls_names_inv = {v: k for k, v in result.names.items()}
+        detections = detections[detections.class_id == cls_names_inv['ball']]
+        if len(detections) == 0:
+            return None
+        bbox = detections.xyxy[np.argmax(detections.confidence)] + [x1, y1, x1, y1]
+        return bbox.astype(np.float64).tolist()
+
+    def update(self, frame, ball_frame):
+        # Refine one frame's ball dict ({1: {...}} or {}) from the full-frame pass, in place
+        self.frame_num += 1
+        full_frame_ball = ball_frame.get(1)
+        prediction = self.predict()
+
+        if prediction is None:
+            if full_frame_ball is not None:
+                self.lock(full_frame_ball['bbox'])
+                self.sources['full_frame'] += 1
+            else:
+                self.sources['none'] += 1
+            return ball_frame
+
+        bbox = self.detect_roi(frame, prediction)
+        if bbox is not None:
+            self.sources['roi'] += 1
+        elif full_frame_ball is not None and np.linalg.norm(np.subtract(get_center_of_bbox(full_frame_ball['bbox']), prediction)) \
+                <= self.gate_distance * (self.misses + 1):
+            bbox = full_frame_ball['bbox']
+            self.sources['gated_full_frame'] += 1
+
+        if bbox is None:
+            self.sources['none'] += 1
+            ball_frame.pop(1, None)
+            self.misses += 1
+            if self.misses > self.max_misses:
+                self.kalman_filter_bank = None
+            return ball_frame
+
+        ball_frame[1] = {'bbox': bbox}
+        self.correct(bbox)
+        return ball_frame
+
+    def refine(self, frames, ball_tracks):
+        # ball_tracks[i] belongs to frames[i]; the lock carries over between calls, so chunks can be passed in order
+        for frame, ball_frame in zip(frames, ball_tracks):
+            self.update(frame, ball_frame)
+        return ball_tracks
+
+    def report(self):
+        # roi_compute: pixels through the model in ROI passes, relative to one full-frame pass per frame
+        return {'frames': self.frame_num, 'roi_passes': self.roi_passes, 'sources': dict(self.sources),
+                'ball_frames': self.frame_num - self.sources['none'],
+                'roi_compute': self.roi_passes * self.roi_size ** 2 / max(self.frame_num * self.full_imgsz ** 2, 1)}
+
+    def print_report(self):
+        report = self.report()
+        print(f"Ball found on {report['ball_frames']}/{report['frames']} frames, sources: {report['sources']}")
+        print(f"ROI passes: {report['roi_passes']} ({report['roi_compute']:.0%} of the full-frame detector compute)")
@@ -0,0 +1,117 @@
+import collections
+import numpy as np
+
+
+class BallSmoother:
+    """
+    Streaming replacement for whole-video ball interpolation.
+
+    Frames go in one at a time (update) as the per-frame ball dicts of
+    tracks['ball'] ({1: {...}} or {}), which are edited in place:
+    - a detection that jumps further than max_pixel_speed pixels per frame from the
+      last accepted ball is rejected (removed), unless max_rejections detections in
+      a row were rejected, in which case the ball has really moved and is re-locked;
+    - a gap of at most max_gap frames between two accepted balls is filled by linear
+      interpolation of every numeric key the two share (bbox, position,
+      position_adjusted, position_transformed, ...), marked interpolated=True;
+      longer gaps stay empty. A gap at the start is filled with the first ball and a
+      gap at the end (flush) with the last one.
+    Other keys of detected frames are kept. Only the frames of the current gap are
+    buffered, so a frame is final at most max_gap frames after it was pushed.
+    """
+    def __init__(self, max_gap=24, max_pixel_speed=60, max_rejections=3):
+        self.max_gap = max_gap
+        self.max_pixel_speed = max_pixel_speed
+        self.max_rejections = max_rejections
+        self.reset()
+
+    def reset(self):
+        self.last_ball = None  # (frame_num, ball) of the last accepted ball
+        self.pending = collections.deque()  # (frame_num, ball frame) of the open gap
+        self.rejections = 0
+        # Set once a gap grew past max_gap: it is released frame by frame until the ball is back
+        self.gap_released = False
+
+    def get_center(self, ball):
+        x1, y1, x2, y2 = ball['bbox']
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+
+    def is_plausible(self, frame_num, ball):
+        if self.last_ball is None:
+            return True
+        last_frame_num, last_ball = self.last_ball
+        gap = max(frame_num - last_frame_num, 1)
+        return np.linalg.norm(self.get_center(ball) - self.get_center(last_ball)) <= self.max_pixel_speed * gap
+
+    def interpolate(self, start, end, weight):
+        # Every numeric key both balls have, blended between start (weight 0) and end (weight 1)
+        ball = {}
+        for key, start_value in start.items():
+            end_value = end.get(key)
+            if end_value is None or start_value is None or isinstance(start_value, (bool, np.bool_, str)):
+                continue
+            try:
+                start_array, end_array = np.asarray(start_value, dtype=np.float64), np.asarray(end_value, dtype=np.float64)
+            except (TypeError, ValueError):
+                continue
+            if start_array.shape != end_array.shape:
+                continue
+            value = start_array + (end_array - start_array) * weight
+            ball[key] = value.tolist() if value.ndim else float(value)
+        ball['interpolated'] = True
+        return ball
+
+    def fill(self, ball, frame_num=None):
+        # Close the open gap: interpolate up to the ball at frame_num, or hold ball when frame_num is None
+        for pending_frame_num, ball_frame in self.pending:
+            if frame_num is None:
+                ball_frame[1] = self.interpolate(ball, ball, 0)
+            else:
+                last_frame_num, last_ball = self.last_ball if self.last_ball is not None else (None, ball)
+                weight = 0 if last_frame_num is None else (pending_frame_num - last_frame_num) / (frame_num - last_frame_num)
+                ball_frame[1] = self.interpolate(last_ball, ball, weight)
+
+    def update(self, frame_num, ball_frame):
+        # Push the next frame; returns the (frame_num, ball frame) pairs that are final now
+        ball = ball_frame.get(1)
+        if ball is not None and 'bbox' in ball and not self.is_plausible(frame_num, ball):
+            self.rejections += 1
+            if self.rejections < self.max_rejections:
+                del ball_frame[1]
+                ball = None
+        if ball is None or 'bbox' not in ball:
+            if self.gap_released:
+                return [(frame_num, ball_frame)]
+            self.pending.append((frame_num, ball_frame))
+            if frame_num - self.pending[0][0] < self.max_gap:
+                return []
+            # The gap is too long to be filled; release it as it is and forget the last ball
+            released = list(self.pending)
+            self.pending.clear()
+            self.gap_released = True
+            self.last_ball = None
+            return released
+
+        self.rejections = 0
+        self.gap_released = False
+        if self.pending:
+            self.fill(ball, frame_num)
+        released = list(self.pending) + [(frame_num, ball_frame)]
+        self.pending.clear()
+        self.last_ball = (frame_num, ball)
+        return released
+
+    def flush(self):
+        # End of the video: hold the last ball over a trailing gap of at most max_gap frames
+        if self.pending and self.last_ball is not None:
+            self.fill(self.last_ball[1])
+        released = list(self.pending)
+        self.pending.clear()
+        return released
+
+    def smooth(self, ball_tracks, start_frame=0):
+        # Whole list at once (in place); frame_num of ball_tracks[i] is start_frame + i
+        for frame_num, ball_frame in enumerate(ball_tracks, start=start_frame):
+            self.update(frame_num, ball_frame)
+        self.flush()
+        return ball_tracks
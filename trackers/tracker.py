@@ -3,18 +3,29 @@ import supervision as sv
 import pickle
 import os
 import numpy as np
-import pandas as pd
 import cv2
+import queue
+import threading
 import sys 
 sys.path.append('../')
-from utils import get_center_of_bbox, get_bbox_width, get_foot_position
-from kalman_filter import KalmanFilter
+from utils import get_center_of_bbox, get_bbox_width, get_foot_position, draw_transparent_rect
+from kalman_filter import KalmanFilter, KalmanFilterBank
+from .ball_smoother import BallSmoother
 
 class Tracker:
     def __init__(self, model_path):
-        self.model = YOLO(model_path) 
+        # No model (model_path=None) when only replaying stubs or cached tracks
+        self.model = YOLO(model_path) if model_path is not None else None
         self.tracker = sv.ByteTrack()
+        self.batch_size = 20
         self.kalman_filters = {}
+        self.kalman_filter_banks = {}
+        # Drop filters of tracks unseen for this many frames (None keeps them for the whole video)
+        self.kalman_max_age = None
+        # AdaptiveStride: run the detector on keyframes only and propagate the tracks in between
+        self.adaptive_stride = None
+        # BallROIDetector: second ball pass on a full-resolution window around the predicted ball
+        self.ball_roi_detector = None
 
     def add_kalman_filter(self, object, track_id):
         if object not in self.kalman_filters:
@@ -33,99 +44,259 @@ class Tracker:
 
         return pred.tolist()
 
-    def add_position_to_tracks(self,tracks):
-        for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    bbox = track_info['bbox']
-                    position = self.update_with_kalman_filter(object, frame_num, track_id, bbox)
-                    tracks[object][frame_num][track_id]['position'] = position
-
-    def interpolate_ball_positions(self, ball_positions):
-        ball_positions_bbox = [x.get(1, {}).get('bbox', []) for x in ball_positions]
-        ball_positions_transformed = [
-            x.get(1, {}).get('position_transformed', [None, None]) for x in ball_positions
-        ]
-
-        df_ball_positions_bbox = pd.DataFrame(ball_positions_bbox, columns=['x1', 'y1', 'x2', 'y2']).interpolate().bfill()
-        df_ball_positions_transformed = pd.DataFrame(ball_positions_transformed, columns=['x_trans', 'y_trans']).interpolate().bfill()
-
-        ball_positions = [
-            {
-                1: {
-                    "bbox": bbox_row.tolist(),
-                    "position_transformed": transformed_row.tolist()
-                }
-            }
-            for bbox_row, transformed_row in zip(df_ball_positions_bbox.to_numpy(), df_ball_positions_transformed.to_numpy())
-        ]
+    def get_kalman_measurements(self, object, bboxes):
+        # Vectorized get_center_of_bbox / get_foot_position for an (N,4) array of boxes
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        x = ((bboxes[:, 0] + bboxes[:, 2]) / 2).astype(int)
+        y = ((bboxes[:, 1] + bboxes[:, 3]) / 2).astype(int) if object == "ball" else bboxes[:, 3].astype(int)
+        return np.stack([x, y], axis=1)
 
-        return ball_positions
+    def add_position_to_tracks(self,tracks, start_frame=0):
+        # One filter bank per object class; every track of a frame is predicted and corrected at once.
+        # The banks persist, so frames can also be added incrementally from start_frame on
+        for object, object_tracks in tracks.items():
+            bank = self.kalman_filter_banks.setdefault(object, KalmanFilterBank())
+            for frame_num, track in enumerate(object_tracks[start_frame:], start=start_frame):
+                if self.kalman_max_age is not None:
+                    bank.drop_stale(frame_num, self.kalman_max_age)
+                if len(track) == 0:
+                    continue
+                track_ids = list(track.keys())
+                measurements = self.get_kalman_measurements(object, [track[track_id]['bbox'] for track_id in track_ids])
+                positions = bank.step(track_ids, measurements, frame_num).tolist()
+                for track_id, position in zip(track_ids, positions):
+                    track[track_id]['position'] = position
+
+    def add_position_to_track_store(self, track_store):
+        # Same as add_position_to_tracks, reading and writing TrackStore columns directly
+        for object, table in track_store.items():
+            bank = self.kalman_filter_banks.setdefault(object, KalmanFilterBank())
+            positions = np.full((len(table), 2), np.nan, dtype=np.float32)
+            for frame_num in range(table.num_frames):
+                if self.kalman_max_age is not None:
+                    bank.drop_stale(frame_num, self.kalman_max_age)
+                rows = table.frame_rows(frame_num)
+                if rows.start == rows.stop:
+                    continue
+                measurements = self.get_kalman_measurements(object, table.get('bbox', rows))
+                positions[rows] = bank.step(table.track_id[rows].tolist(), measurements, frame_num)
+            table.set('position', positions)
+
+    def interpolate_ball_positions(self, ball_positions, max_gap=24):
+        # Fills gaps of up to max_gap frames and drops implausible jumps, in place and keeping every key
+        return BallSmoother(max_gap=max_gap).smooth(ball_positions)
 
 
     def detect_frames(self, frames):
-        batch_size=20 
+        batch_size=self.batch_size
         detections = [] 
         for i in range(0,len(frames),batch_size):
             detections_batch = self.model.predict(frames[i:i+batch_size],conf=0.1)
             detections += detections_batch
         return detections
 
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
+    def add_detection_to_tracks(self, tracks, detection):
+        # Run ByteTrack on one frame's detections and append the frame to tracks
+        frame_num = len(tracks["players"])
+        cls_names = detection.names
+        cls_names_inv = {v:k for k,v in cls_names.items()}
+
+        # Covert to supervision Detection format
+        detection_supervision = sv.Detections.from_ultralytics(detection)
+
+        # Convert GoalKeeper to player object
+        for object_ind , class_id in enumerate(detection_supervision.class_id):
+            if cls_names[class_id] == "goalkeeper":
+                detection_supervision.class_id[object_ind] = cls_names_inv["player"]
+
+        # Track Objects
+        detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
+
+        tracks["players"].append({})
+        tracks["referees"].append({})
+        tracks["ball"].append({})
+
+        for frame_detection in detection_with_tracks:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+            track_id = frame_detection[4]
+
+            if cls_id == cls_names_inv['player']:
+                tracks["players"][frame_num][track_id] = {"bbox":bbox}
+            
+            if cls_id == cls_names_inv['referee']:
+                tracks["referees"][frame_num][track_id] = {"bbox":bbox}
+        
+        for frame_detection in detection_supervision:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+
+            if cls_id == cls_names_inv['ball']:
+                tracks["ball"][frame_num][1] = {"bbox":bbox}
+
+        return tracks
+
+    def get_cache_params(self):
+        # Everything besides the video and model file that changes the tracks
+        params = {'conf': 0.1, 'tracker': 'bytetrack', 'goalkeeper_as_player': True}
+        if self.adaptive_stride is not None:
+            params['adaptive_stride'] = self.adaptive_stride.get_cache_params()
+        if self.ball_roi_detector is not None:
+            params['ball_roi'] = self.ball_roi_detector.get_cache_params()
+        return params
+
+    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None, cache=None, cache_key=None):
         
+        if cache is not None and cache_key is not None:
+            tracks = cache.load_tracks(cache_key)
+            if tracks is not None:
+                return tracks
+
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             with open(stub_path,'rb') as f:
                 tracks = pickle.load(f)
             return tracks
 
-        detections = self.detect_frames(frames)
+        if self.adaptive_stride is not None:
+            tracks = self.get_object_tracks_adaptive(frames)
+        else:
+            detections = self.detect_frames(frames)
 
-        tracks={
-            "players":[],
-            "referees":[],
-            "ball":[]
-        }
+            tracks={
+                "players":[],
+                "referees":[],
+                "ball":[]
+            }
 
-        for frame_num, detection in enumerate(detections):
-            cls_names = detection.names
-            cls_names_inv = {v:k for k,v in cls_names.items()}
+            for detection in detections:
+                self.add_detection_to_tracks(tracks, detection)
 
-            # Covert to supervision Detection format
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+        if self.ball_roi_detector is not None:
+            self.ball_roi_detector.refine(frames, tracks["ball"])
 
-            # Convert GoalKeeper to player object
-            for object_ind , class_id in enumerate(detection_supervision.class_id):
-                if cls_names[class_id] == "goalkeeper":
-                    detection_supervision.class_id[object_ind] = cls_names_inv["player"]
+        if cache is not None and cache_key is not None:
+            cache.save_tracks(cache_key, tracks)
 
-            # Track Objects
-            detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
+        if stub_path is not None:
+            with open(stub_path,'wb') as f:
+                pickle.dump(tracks,f)
 
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
+        return tracks
 
-            for frame_detection in detection_with_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
+    def detect_and_track_frame(self, frame, tracks):
+        # Detect and track one frame; returns the mean detection confidence
+        detection = self.model.predict([frame], conf=0.1, verbose=False)[0]
+        self.add_detection_to_tracks(tracks, detection)
+        confidences = detection.boxes.conf
+        return float(confidences.mean()) if len(confidences) else 0.0
+
+    def get_object_tracks_adaptive(self, frames):
+        # Detector on the keyframes chosen by self.adaptive_stride, propagated tracks on the other frames.
+        # The stride state carries over between calls, so chunks of one video can be passed in order
+        tracks = {"players": [], "referees": [], "ball": []}
+        for frame in frames:
+            detect, propagated = self.adaptive_stride.step(frame)
+            if detect:
+                confidence = self.detect_and_track_frame(frame, tracks)
+                self.adaptive_stride.keyframe({object: object_tracks[-1] for object, object_tracks in tracks.items()}, propagated, confidence)
+            else:
+                for object, object_tracks in tracks.items():
+                    object_tracks.append(propagated.get(object, {}))
+                self.adaptive_stride.keyframe(propagated)
+        return tracks
 
-                if cls_id == cls_names_inv['player']:
-                    tracks["players"][frame_num][track_id] = {"bbox":bbox}
-                
-                if cls_id == cls_names_inv['referee']:
-                    tracks["referees"][frame_num][track_id] = {"bbox":bbox}
-            
-            for frame_detection in detection_supervision:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
+    def get_object_tracks_pipelined(self, frame_source, batch_size=None, queue_size=64, frame_callback=None):
+        """
+        Overlapped version of get_object_tracks for an iterable of frames.
+        A decoder thread fills a bounded frame queue, the calling thread runs
+        inference in batches and a tracking thread runs ByteTrack as detections
+        arrive. The bounded queues give backpressure: a slow stage blocks the
+        stage feeding it instead of letting frames pile up.
+        frame_callback(frame_num, frame, tracks) runs in the tracking thread
+        right after the frame has been tracked.
+        """
+        batch_size = batch_size or self.batch_size
+        end = object()
+        errors = []
+        frame_queue = queue.Queue(maxsize=queue_size)
+        detection_queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
 
-                if cls_id == cls_names_inv['ball']:
-                    tracks["ball"][frame_num][1] = {"bbox":bbox}
+        tracks={
+            "players":[],
+            "referees":[],
+            "ball":[]
+        }
 
-        if stub_path is not None:
-            with open(stub_path,'wb') as f:
-                pickle.dump(tracks,f)
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def decode():
+            try:
+                for frame in frame_source:
+                    if stop.is_set():
+                        break
+                    put(frame_queue, frame)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            put(frame_queue, end)
+
+        def track():
+            try:
+                while True:
+                    item = detection_queue.get()
+                    if item is end:
+                        break
+                    frame, detection = item
+                    self.add_detection_to_tracks(tracks, detection)
+                    if frame_callback is not None:
+                        frame_callback(len(tracks["players"]) - 1, frame, tracks)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                # Keep draining so the inference thread never blocks on a full queue
+                while detection_queue.get() is not end:
+                    pass
+
+        decoder = threading.Thread(target=decode, daemon=True)
+        tracker = threading.Thread(target=track, daemon=True)
+        decoder.start()
+        tracker.start()
+
+        try:
+            finished = False
+            while not finished and not stop.is_set():
+                batch = []
+                while len(batch) < batch_size and not stop.is_set():
+                    try:
+                        frame = frame_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if frame is end:
+                        finished = True
+                        break
+                    batch.append(frame)
+                if not batch:
+                    break
+                for frame, detection in zip(batch, self.model.predict(batch,conf=0.1)):
+                    detection_queue.put((frame, detection))
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            detection_queue.put(end)
+            tracker.join()
+            stop.set()
+            decoder.join()
+
+        if errors:
+            raise errors[0]
 
         return tracks
     
@@ -190,55 +361,51 @@ class Tracker:
 
         return frame
 
-    def draw_team_ball_control(self,frame,frame_num,team_ball_control):
+    def draw_team_ball_control(self,frame,frame_num,match_stats):
         # Draw a semi-transparent rectaggle 
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (1350, 850), (1900,970), (255,255,255), -1 )
-        alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        draw_transparent_rect(frame, (1350, 850), (1900,970), (255,255,255), 0.4)
 
-        team_ball_control_till_frame = team_ball_control[:frame_num+1]
-        # Get the number of time each team had ball control
-        team_1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==1].shape[0]
-        team_2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame==2].shape[0]
-        team_1 = team_1_num_frames/(team_1_num_frames+team_2_num_frames)
-        team_2 = team_2_num_frames/(team_1_num_frames+team_2_num_frames)
+        # Ball control up to this frame, from the running counts of MatchStats
+        possession = match_stats.possession(frame_num)
 
-        cv2.putText(frame, f"Team 1 Ball Control: {team_1*100:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
-        cv2.putText(frame, f"Team 2 Ball Control: {team_2*100:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        cv2.putText(frame, f"Team 1 Ball Control: {possession[1]:.2f}%",(1400,900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
+        cv2.putText(frame, f"Team 2 Ball Control: {possession[2]:.2f}%",(1400,950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
 
         return frame
 
-    def draw_annotations(self,video_frames, tracks,team_ball_control):
-        output_video_frames= []
-        for frame_num, frame in enumerate(video_frames):
-            frame = frame.copy()
+    def draw_frame_annotations(self, frame, frame_num, tracks, match_stats):
+        # Draw the tracks of one frame in place
+        player_dict = tracks["players"][frame_num]
+        ball_dict = tracks["ball"][frame_num]
+        referee_dict = tracks["referees"][frame_num]
 
-            player_dict = tracks["players"][frame_num]
-            ball_dict = tracks["ball"][frame_num]
-            referee_dict = tracks["referees"][frame_num]
+        # Draw Players
+        for track_id, player in player_dict.items():
+            color = player.get("team_color",(0,0,255))
+            frame = self.draw_ellipse(frame, player["bbox"],color, track_id)
 
-            # Draw Players
-            for track_id, player in player_dict.items():
-                color = player.get("team_color",(0,0,255))
-                frame = self.draw_ellipse(frame, player["bbox"],color, track_id)
+            if player.get('has_ball',False):
+                frame = self.draw_traingle(frame, player["bbox"],(0,0,255))
 
-                if player.get('has_ball',False):
-                    frame = self.draw_traingle(frame, player["bbox"],(0,0,255))
+        # Draw Referee
+        for _, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["bbox"],(0,255,255))
+        
+        # Draw ball 
+        for track_id, ball in ball_dict.items():
+            frame = self.draw_traingle(frame, ball["bbox"],(0,255,0))
 
-            # Draw Referee
-            for _, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["bbox"],(0,255,255))
-            
-            # Draw ball 
-            for track_id, ball in ball_dict.items():
-                frame = self.draw_traingle(frame, ball["bbox"],(0,255,0))
 
+        # Draw Team Ball Control
+        frame = self.draw_team_ball_control(frame, frame_num, match_stats)
 
-            # Draw Team Ball Control
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+        return frame
 
+    def draw_annotations(self,video_frames, tracks,match_stats, start_frame=0):
+        output_video_frames= []
+        for frame_num, frame in enumerate(video_frames, start=start_frame):
+            frame = self.draw_frame_annotations(frame.copy(), frame_num, tracks, match_stats)
             output_video_frames.append(frame)
 
         return output_video_frames
-    
\ No newline at end of file
+    
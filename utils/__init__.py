@@ -1,2 +1,5 @@
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position, get_bbox_height
\ No newline at end of file
+from .video_utils import read_video, read_video_chunks, get_video_fps, get_video_frame_count, save_video, VideoSink
+from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position, get_bbox_height, get_iou_matrix
+from .draw_utils import draw_transparent_rect
+from .video_decoder import VideoDecoder, DecodedFrame
+from .frame_buffer import FrameBuffer
\ No newline at end of file
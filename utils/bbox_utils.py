@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_bbox(bbox):
     x1,y1,x2,y2 = bbox
     return int((x1+x2)/2),int((y1+y2)/2)
@@ -17,4 +19,15 @@ def get_foot_position(bbox):
 
 def get_bbox_height(bbox):
     x1,y1,x2,y2 = bbox
-    return int(y2-y1)
\ No newline at end of file
+    return int(y2-y1)
+
+def get_iou_matrix(bboxes_a, bboxes_b):
+    # (N,M) intersection over union of two sets of boxes
+    a = np.asarray(bboxes_a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(bboxes_b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
\ No newline at end of file
@@ -0,0 +1,14 @@
+import cv2
+import numpy as np
+
+def draw_transparent_rect(frame, pt1, pt2, color, alpha):
+    # Alpha-blend a filled rectangle in place, touching only the rectangle's pixels
+    x1, y1 = max(int(pt1[0]), 0), max(int(pt1[1]), 0)
+    x2, y2 = min(int(pt2[0]) + 1, frame.shape[1]), min(int(pt2[1]) + 1, frame.shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return frame
+    roi = frame[y1:y2, x1:x2]
+    color_roi = np.empty_like(roi)
+    color_roi[:] = color
+    cv2.addWeighted(color_roi, alpha, roi, 1 - alpha, 0, roi)
+    return frame
@@ -0,0 +1,54 @@
+import collections
+import itertools
+
+
+class FrameBuffer:
+    """
+    Per-frame list for long live sessions, indexed by absolute frame number like
+    the tracks lists, whose oldest frames can be released.
+
+    len() is the number of frames appended so far and buffer[frame_num] /
+    buffer[start:end] use absolute frame numbers, so stages written for plain
+    lists work unchanged on the retained frames. Indexing a released frame raises
+    IndexError; a slice without a start begins at the first retained frame.
+    """
+    def __init__(self, items=()):
+        self.items = collections.deque(items)
+        self.offset = 0  # Absolute frame number of items[0]
+
+    def __len__(self):
+        return self.offset + len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def append(self, item):
+        self.items.append(item)
+
+    def position(self, frame_num):
+        if frame_num < 0:
+            frame_num += len(self)
+        if frame_num < self.offset or frame_num >= len(self):
+            raise IndexError(f"frame {frame_num} is not retained (frames {self.offset} to {len(self) - 1})")
+        return frame_num - self.offset
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if key.start is None:
+                start = self.offset
+            elif start < self.offset:
+                raise IndexError(f"frame {start} is not retained (frames {self.offset} to {len(self) - 1})")
+            if step < 1:
+                raise ValueError("FrameBuffer slices need a positive step")
+            return list(itertools.islice(self.items, start - self.offset, max(stop - self.offset, start - self.offset), step))
+        return self.items[self.position(key)]
+
+    def __setitem__(self, frame_num, item):
+        self.items[self.position(frame_num)] = item
+
+    def release_before(self, frame_num):
+        # Drop every frame before frame_num
+        while self.items and self.offset < frame_num:
+            self.items.popleft()
+            self.offset += 1
@@ -0,0 +1,182 @@
+import math
+import queue
+import threading
+import cv2
+
+
+def downscale_size(frame_size, scale):
+    # (width, height) of a frame downscaled by scale, rounded up like cv2.pyrDown
+    return tuple(max(math.ceil(side * scale), 1) for side in frame_size)
+
+
+def downscale(frame, scale):
+    if scale == 1.0:
+        return frame
+    size = downscale_size((frame.shape[1], frame.shape[0]), scale)
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+
+class DecodedFrame:
+    """
+    One decoded frame and the views built from it.
+
+    bgr is the decoded frame; gray, small_bgr and small_gray (bgr and gray
+    downscaled by scale) are built on first access and kept, so every stage
+    asking for the same view of a frame shares one conversion. Multiply full
+    resolution coordinates by scale to get small view coordinates.
+    """
+    __slots__ = ('frame_num', 'bgr', 'scale', '_gray', '_small_bgr', '_small_gray')
+
+    def __init__(self, frame_num, bgr, scale=1.0):
+        self.frame_num = frame_num
+        self.bgr = bgr
+        self.scale = scale
+        self._gray = None
+        self._small_bgr = None
+        self._small_gray = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def small_bgr(self):
+        if self._small_bgr is None:
+            self._small_bgr = downscale(self.bgr, self.scale)
+        return self._small_bgr
+
+    @property
+    def small_gray(self):
+        if self._small_gray is None:
+            self._small_gray = downscale(self.gray, self.scale)
+        return self._small_gray
+
+    def view(self, name):
+        return getattr(self, name)
+
+
+class VideoDecoder:
+    """
+    Threaded video reader.
+
+    A decoder thread reads ahead up to read_ahead frames into a bounded queue,
+    so decoding overlaps with whatever the caller does with the frames (OpenCV
+    releases the GIL while decoding and converting). The views listed in views
+    ('gray', 'small_bgr', 'small_gray') are built on the decoder thread as well;
+    the small views are downscaled by scale, or to fit max_size (longest side in
+    pixels) when that is given. frames() and chunks() decode any
+    [start_frame, end_frame) range; stopping the iteration early stops the thread.
+    """
+    def __init__(self, video_path, read_ahead=64, views=(), scale=1.0, max_size=None):
+        self.video_path = video_path
+        self.read_ahead = read_ahead
+        self.views = tuple(views)
+
+        cap = cv2.VideoCapture(video_path)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        if max_size is not None and max(self.frame_size) > 0:
+            scale = min(scale, max_size / max(self.frame_size))
+        self.scale = scale
+        self.small_size = downscale_size(self.frame_size, scale)
+
+    def __len__(self):
+        return self.frame_count
+
+    def __iter__(self):
+        return self.frames()
+
+    def seek(self, cap, start_frame):
+        """
+        Position cap on start_frame. Some containers seek to the previous keyframe
+        while still reporting the requested CAP_PROP_POS_FRAMES, so the seek is
+        checked on the timestamp of the first frame it lands on; when that is not
+        start_frame, frames are skipped from the start instead.
+        Returns True when the frame at start_frame is grabbed and only needs retrieve().
+        """
+        if start_frame <= 0:
+            return False
+        if self.fps > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            if cap.grab() and abs(cap.get(cv2.CAP_PROP_POS_MSEC) * self.fps / 1000 - start_frame) < 0.5:
+                return True
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(start_frame):
+            if not cap.grab():
+                break
+        return False
+
+    def decode(self, cap, frame_num, grabbed=False):
+        ret, frame = cap.retrieve() if grabbed else cap.read()
+        if not ret:
+            return None
+        decoded = DecodedFrame(frame_num, frame, self.scale)
+        for name in self.views:
+            decoded.view(name)
+        return decoded
+
+    def frames(self, start_frame=0, end_frame=None):
+        # Yield DecodedFrames of [start_frame, end_frame) as the decoder thread produces them
+        end = object()
+        errors = []
+        frame_queue = queue.Queue(maxsize=self.read_ahead)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    frame_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def run():
+            cap = cv2.VideoCapture(self.video_path)
+            try:
+                grabbed = self.seek(cap, start_frame)
+                frame_num = start_frame
+                while not stop.is_set() and (end_frame is None or frame_num < end_frame):
+                    decoded = self.decode(cap, frame_num, grabbed)
+                    grabbed = False
+                    if decoded is None:
+                        break
+                    put(decoded)
+                    frame_num += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                cap.release()
+                put(end)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                decoded = frame_queue.get()
+                if decoded is end:
+                    break
+                yield decoded
+        finally:
+            stop.set()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def chunks(self, chunk_size=100, start_frame=0, end_frame=None, view='bgr'):
+        # Lists of at most chunk_size frames as the given view, or as DecodedFrames with view=None
+        chunk = []
+        for decoded in self.frames(start_frame, end_frame):
+            chunk.append(decoded if view is None else decoded.view(view))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def read(self, start_frame=0, end_frame=None, view='bgr'):
+        return [decoded if view is None else decoded.view(view) for decoded in self.frames(start_frame, end_frame)]
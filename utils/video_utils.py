@@ -1,18 +1,55 @@
 import cv2
+from .video_decoder import VideoDecoder
 
 def read_video(video_path):
+    return VideoDecoder(video_path).read()
+
+def read_video_chunks(video_path, chunk_size=100, start_frame=0, end_frame=None):
+    # Yield lists of at most chunk_size frames so only one chunk is held in memory;
+    # start_frame/end_frame restrict decoding to [start_frame, end_frame)
+    yield from VideoDecoder(video_path, read_ahead=chunk_size).chunks(chunk_size, start_frame, end_frame)
+
+def get_video_fps(video_path, default_fps=24):
     cap = cv2.VideoCapture(video_path)
-    frames = []
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-    return frames
-
-def save_video(ouput_video_frames,output_video_path):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default_fps
+
+def get_video_frame_count(video_path):
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
+
+def save_video(ouput_video_frames,output_video_path, fps=24):
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (ouput_video_frames[0].shape[1], ouput_video_frames[0].shape[0]))
+    out = cv2.VideoWriter(output_video_path, fourcc, fps, (ouput_video_frames[0].shape[1], ouput_video_frames[0].shape[0]))
     for frame in ouput_video_frames:
         out.write(frame)
     out.release()
+
+class VideoSink:
+    # Incremental writer: frames are encoded as they arrive instead of being collected in a list
+    def __init__(self, output_video_path, fps=24):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.out = None
+        self.frame_count = 0
+
+    def write(self, frame):
+        if self.out is None:
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            self.out = cv2.VideoWriter(self.output_video_path, fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+        self.out.write(frame)
+        self.frame_count += 1
+
+    def release(self):
+        if self.out is not None:
+            self.out.release()
+            self.out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -5,6 +5,9 @@ class ViewTransformer():
     def __init__(self):
         court_width = 68
         court_length = 23.32
+        # Size in metres of the calibrated area position_transformed is expressed in
+        self.court_width = court_width
+        self.court_length = court_length
 
         self.pixel_vertices = np.array([[110, 1035], 
                                [265, 275], 
@@ -30,13 +33,46 @@ class ViewTransformer():
         return tranform_point.reshape(-1, 2) if tranform_point is not None else None
 
 
-    def add_transformed_position_to_tracks(self,tracks):
+    def transform_points(self, points):
+        # Transform an (N,2) array of pixel positions with a single OpenCV call
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        if len(points) == 0:
+            return np.zeros((0, 2), dtype=np.float32)
+        return cv2.perspectiveTransform(points, self.persepctive_trasnformer).reshape(-1, 2)
+
+    def is_inside_calibration(self, points):
+        # Even-odd ray casting of (N,2) points against the pixel_vertices polygon
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        px, py = points[:, 0], points[:, 1]
+        inside = np.zeros(len(points), dtype=bool)
+        vertices = self.pixel_vertices
+        for (xi, yi), (xj, yj) in zip(vertices, np.roll(vertices, 1, axis=0)):
+            crosses = (yi > py) != (yj > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_intersect = (xj - xi) * (py - yi) / (yj - yi) + xi
+            inside ^= crosses & (px < x_intersect)
+        return inside
+
+    def add_transformed_position_to_tracks(self,tracks, start_frame=0, end_frame=None):
+        # Gather every adjusted position of the frame range, transform them in one call and write back
+        track_infos = []
+        positions = []
         for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info.get('position_adjusted')
-                    position = np.array(position)
-                    position_trasnformed = self.transform_point(position)
-                    if position_trasnformed is not None:
-                        position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+            for track in object_tracks[start_frame:end_frame]:
+                for track_info in track.values():
+                    track_infos.append(track_info)
+                    positions.append(track_info.get('position_adjusted'))
+
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        positions_transformed = self.transform_points(positions).tolist()
+        inside = self.is_inside_calibration(positions).tolist()
+
+        for track_info, position_transformed, in_calibrated_area in zip(track_infos, positions_transformed, inside):
+            track_info['position_transformed'] = position_transformed
+            track_info['in_calibrated_area'] = in_calibrated_area
+
+    def add_transformed_position_to_track_store(self, track_store):
+        for object, table in track_store.items():
+            positions = table.get('position_adjusted')
+            table.set('position_transformed', self.transform_points(positions))
+            table.set('in_calibrated_area', self.is_inside_calibration(positions))